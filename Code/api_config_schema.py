@@ -0,0 +1,618 @@
+# api_config_schema.py
+import copy
+from dataclasses import dataclass, field, fields, is_dataclass, asdict
+from typing import Optional
+
+# Version of the configuration file layout, bump it together with a new entry in MIGRATIONS
+SCHEMA_VERSION = 10
+
+
+def _set(obj, name, value):
+    """Assign to a frozen dataclass field (only used while validating in __post_init__)"""
+    object.__setattr__(obj, name, value)
+
+def _check_int(obj, name, low, high):
+    value = getattr(obj, name)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or int(value) != value:
+        raise ValueError(f"{type(obj).__name__}.{name} must be an integer, got {value!r}")
+    value = int(value)
+    if not low <= value <= high:
+        raise ValueError(f"{type(obj).__name__}.{name} must be between {low} and {high}, got {value}")
+    _set(obj, name, value)
+
+def _check_float(obj, name, low, high):
+    value = getattr(obj, name)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{type(obj).__name__}.{name} must be a number, got {value!r}")
+    value = float(value)
+    if not low <= value <= high:
+        raise ValueError(f"{type(obj).__name__}.{name} must be between {low} and {high}, got {value}")
+    _set(obj, name, value)
+
+def _check_bool(obj, name):
+    value = getattr(obj, name)
+    if not isinstance(value, bool):
+        raise ValueError(f"{type(obj).__name__}.{name} must be true or false, got {value!r}")
+
+def _check_choice(obj, name, choices):
+    value = getattr(obj, name)
+    if value not in choices:
+        raise ValueError(f"{type(obj).__name__}.{name} must be one of {', '.join(map(repr, choices))}, got {value!r}")
+
+
+@dataclass(frozen=True, slots=True)
+class GeneralConfig:
+    kit_type: Optional[int] = None             # 1: FNK0108, 2: FNK0113, None: not detected yet
+    kit_type_source: Optional[str] = None      # How kit_type was decided (env, device-tree, i2c, user, default)
+    config_generation: int = 0                 # Incremented by every ConfigManager transaction
+    schema_version: int = SCHEMA_VERSION       # Layout version of the file, see MIGRATIONS
+
+    def __post_init__(self):
+        if self.kit_type is not None:
+            _check_int(self, 'kit_type', 1, 2)
+        _check_int(self, 'schema_version', 0, 2**31 - 1)   # Newer versions are kept, see migrate_config
+        _check_int(self, 'config_generation', 0, 2**63 - 1)
+
+
+@dataclass(frozen=True, slots=True)
+class MonitorConfig:
+    screen_orientation: int = 0
+
+    def __post_init__(self):
+        _check_int(self, 'screen_orientation', 0, 3)
+
+
+@dataclass(frozen=True, slots=True)
+class LedConfig:
+    mode: int = 0                  # 0-8, see LED_TASK.run_led_loop
+    red_value: int = 0
+    green_value: int = 0
+    blue_value: int = 255
+    brightness: int = 255
+
+    def __post_init__(self):
+        _check_int(self, 'mode', 0, 9)
+        for name in ('red_value', 'green_value', 'blue_value', 'brightness'):
+            _check_int(self, name, 0, 255)
+
+    @property
+    def color(self):
+        """(red, green, blue) tuple"""
+        return (self.red_value, self.green_value, self.blue_value)
+
+
+def _check_curve(curve, max_points=32):
+    """Validate fan curve points, returns them as a tuple of (float °C, int duty) tuples"""
+    if not isinstance(curve, (list, tuple)):
+        raise ValueError(f"fan_curve must be a list of [temperature, duty] points, got {curve!r}")
+    points = []
+    for point in curve:
+        if not isinstance(point, (list, tuple)) or len(point) != 2:
+            raise ValueError(f"fan_curve point must be [temperature, duty], got {point!r}")
+        temp, duty = point
+        if isinstance(temp, bool) or not isinstance(temp, (int, float)) or not 0 <= temp <= 120:
+            raise ValueError(f"fan_curve temperature must be between 0 and 120, got {temp!r}")
+        if isinstance(duty, bool) or not isinstance(duty, (int, float)) or int(duty) != duty or not 0 <= duty <= 255:
+            raise ValueError(f"fan_curve duty must be an integer between 0 and 255, got {duty!r}")
+        points.append((float(temp), int(duty)))
+    if len(points) == 1 or len(points) > max_points:
+        raise ValueError(f"fan_curve needs 2 to {max_points} points, got {len(points)}")
+    for previous, point in zip(points, points[1:]):
+        if point[0] < previous[0]:
+            raise ValueError("fan_curve temperatures must not decrease")
+    return tuple(points)
+
+
+@dataclass(frozen=True, slots=True)
+class FanTempModeConfig:
+    fan_temp_threshold_low: int = 45       # °C, fan starts at this temperature
+    fan_temp_threshold_high: int = 80      # °C, fan runs at full speed from this temperature
+    fan_temp_threshold_hyst: int = 3       # °C, hysteresis applied to both thresholds
+    fan_temp_mode_duty_low: int = 50       # Duty at the low threshold
+    fan_temp_mode_duty_high: int = 200     # Duty at the high threshold
+    fan_curve: tuple = ()                  # ((°C, duty), ...) points, empty: curve from the thresholds above
+
+    def __post_init__(self):
+        _check_int(self, 'fan_temp_threshold_low', 0, 120)
+        _check_int(self, 'fan_temp_threshold_high', 0, 120)
+        _check_int(self, 'fan_temp_threshold_hyst', 0, 20)
+        _check_int(self, 'fan_temp_mode_duty_low', 0, 255)
+        _check_int(self, 'fan_temp_mode_duty_high', 0, 255)
+        if self.fan_temp_threshold_low >= self.fan_temp_threshold_high:
+            raise ValueError("fan_temp_threshold_low must be lower than fan_temp_threshold_high")
+        if self.fan_temp_mode_duty_low > self.fan_temp_mode_duty_high:
+            raise ValueError("fan_temp_mode_duty_low must not be higher than fan_temp_mode_duty_high")
+        _set(self, 'fan_curve', _check_curve(self.fan_curve))
+
+    @property
+    def curve_points(self):
+        """
+        Points of the effective fan curve
+
+        Returns:
+            tuple: ((°C, duty), ...), fan_curve if set, otherwise low/high threshold duties and full speed from the high threshold
+        """
+        if self.fan_curve:
+            return self.fan_curve
+        return ((float(self.fan_temp_threshold_low), self.fan_temp_mode_duty_low),
+                (float(self.fan_temp_threshold_high), self.fan_temp_mode_duty_high),
+                (float(self.fan_temp_threshold_high), 255))
+
+
+@dataclass(frozen=True, slots=True)
+class FanPidModeConfig:
+    setpoint: float = 55.0                 # °C, temperature the PID loop holds
+    kp: float = 12.0                       # Duty per °C above the setpoint
+    ki: float = 0.4                        # Duty per °C and second
+    kd: float = 30.0                       # Duty per °C/s of temperature rise
+    derivative_filter_time: float = 5.0    # s, low-pass time constant of the derivative, 0: unfiltered
+    feed_forward_gain: float = 60.0        # Duty added at 100% CPU load, 0: no feed-forward
+    min_duty: int = 0
+    max_duty: int = 255
+
+    def __post_init__(self):
+        _check_float(self, 'setpoint', 20.0, 100.0)
+        _check_float(self, 'kp', 0.0, 255.0)
+        _check_float(self, 'ki', 0.0, 50.0)
+        _check_float(self, 'kd', 0.0, 1000.0)
+        _check_float(self, 'derivative_filter_time', 0.0, 60.0)
+        _check_float(self, 'feed_forward_gain', 0.0, 255.0)
+        _check_int(self, 'min_duty', 0, 255)
+        _check_int(self, 'max_duty', 0, 255)
+        if self.min_duty > self.max_duty:
+            raise ValueError("min_duty must not be higher than max_duty")
+
+
+@dataclass(frozen=True, slots=True)
+class FanFilterConfig:
+    filter_type: str = 'ema'               # Temperature filter: none, ema, median or kalman
+    ema_time_constant: float = 4.0         # s, EMA time constant
+    median_window: int = 5                 # Samples of the median filter
+    kalman_process_noise: float = 0.01     # (°C/s)² per second, how fast the temperature trend may change
+    kalman_measurement_noise: float = 0.5  # °C², variance of a single temperature read
+    duty_deadband: int = 4                 # Duty changes smaller than this are not written to the PWM
+
+    def __post_init__(self):
+        _check_choice(self, 'filter_type', ('none', 'ema', 'median', 'kalman'))
+        _check_float(self, 'ema_time_constant', 0.0, 120.0)
+        _check_int(self, 'median_window', 1, 31)
+        _check_float(self, 'kalman_process_noise', 1e-6, 100.0)
+        _check_float(self, 'kalman_measurement_noise', 1e-6, 100.0)
+        _check_int(self, 'duty_deadband', 0, 64)
+
+
+@dataclass(frozen=True, slots=True)
+class FanOutputConfig:
+    slew_rate: float = 40.0                # Largest duty change per second between running duties, 0: no limit
+    kick_duty: int = 180                   # Duty a stopped fan starts with when its duty is lower, 0: no kick-start
+    kick_time: float = 1.0                 # s of the kick-start pulse
+
+    def __post_init__(self):
+        _check_float(self, 'slew_rate', 0.0, 1000.0)
+        _check_int(self, 'kick_duty', 0, 255)
+        _check_float(self, 'kick_time', 0.0, 10.0)
+
+
+@dataclass(frozen=True, slots=True)
+class FanPredictionConfig:
+    horizon: float = 10.0                  # s the temperature is projected ahead in temperature mode, 0: no prediction
+    slope_window: float = 8.0              # s of filtered samples the temperature slope is fitted over
+    max_lead: float = 8.0                  # °C the projection may be above the measured temperature
+
+    def __post_init__(self):
+        _check_float(self, 'horizon', 0.0, 120.0)
+        _check_float(self, 'slope_window', 4.0, 120.0)
+        _check_float(self, 'max_lead', 0.0, 30.0)
+
+
+@dataclass(frozen=True, slots=True)
+class FanHealthConfig:
+    rpm_compensation: bool = True          # Raise the duty until the fan reaches its learned RPM again
+    stall_duty: int = 80                   # Duty from which a standing fan counts as stalled, even before learning
+    stall_time: float = 5.0                # s without tachometer pulses before a fan counts as stalled
+    degraded_ratio: float = 0.7            # Fraction of the learned RPM below which a fan counts as degraded
+    settle_time: float = 3.0               # s after a duty change before the RPM is evaluated
+
+    def __post_init__(self):
+        _check_bool(self, 'rpm_compensation')
+        _check_int(self, 'stall_duty', 1, 255)
+        _check_float(self, 'stall_time', 1.0, 120.0)
+        _check_float(self, 'degraded_ratio', 0.1, 1.0)
+        _check_float(self, 'settle_time', 0.0, 60.0)
+
+
+@dataclass(frozen=True, slots=True)
+class FanThrottleConfig:
+    boost_duty: int = 255                  # Minimum duty while the firmware throttles the CPU for temperature, 0: no boost
+    boost_time: float = 30.0               # s the boost is held after the throttling ended
+
+    def __post_init__(self):
+        _check_int(self, 'boost_duty', 0, 255)
+        _check_float(self, 'boost_time', 0.0, 3600.0)
+
+
+@dataclass(frozen=True, slots=True)
+class FanSensorEntry:
+    sensor: str = 'thermal_zone0'          # Sensor id, see api_sensors.discover_sensors
+    weight: float = 1.0                    # Share in the weighted aggregation
+    fan_curve: tuple = ()                  # ((°C, duty), ...) curve of this sensor in temperature mode, empty: temperature mode curve
+
+    def __post_init__(self):
+        if not isinstance(self.sensor, str) or not self.sensor:
+            raise ValueError(f"FanSensorEntry.sensor must be a sensor id, got {self.sensor!r}")
+        _check_float(self, 'weight', 0.0, 100.0)
+        _set(self, 'fan_curve', _check_curve(self.fan_curve))
+
+
+@dataclass(frozen=True, slots=True)
+class FanSensorConfig:
+    aggregation: str = 'cpu'               # cpu: thermal_zone0 only, max: hottest sensor, weighted: weighted mean
+    sensors: tuple = ()                    # FanSensorEntry per sensor, empty: all discovered sensors with weight 1
+
+    def __post_init__(self):
+        _check_choice(self, 'aggregation', ('cpu', 'max', 'weighted'))
+        if not isinstance(self.sensors, (list, tuple)):
+            raise ValueError(f"FanSensorConfig.sensors must be a list, got {self.sensors!r}")
+        _set(self, 'sensors', tuple(from_dict(FanSensorEntry, entry) for entry in self.sensors))
+        if self.aggregation == 'weighted' and self.sensors and sum(entry.weight for entry in self.sensors) <= 0:
+            raise ValueError("FanSensorConfig weights must not all be 0")
+
+
+@dataclass(frozen=True, slots=True)
+class FanConfig:
+    mode: int = 2                  # 0: temperature, 1: manual, 2: kernel thermal control, 3: PID
+    manual_mode_duty: int = 255
+    temp_mode_config: FanTempModeConfig = field(default_factory=FanTempModeConfig)
+    pid_mode_config: FanPidModeConfig = field(default_factory=FanPidModeConfig)
+    filter_config: FanFilterConfig = field(default_factory=FanFilterConfig)
+    prediction_config: FanPredictionConfig = field(default_factory=FanPredictionConfig)
+    output_config: FanOutputConfig = field(default_factory=FanOutputConfig)
+    health_config: FanHealthConfig = field(default_factory=FanHealthConfig)
+    sensor_config: FanSensorConfig = field(default_factory=FanSensorConfig)
+    throttle_config: FanThrottleConfig = field(default_factory=FanThrottleConfig)
+
+    def __post_init__(self):
+        _check_int(self, 'mode', 0, 3)
+        _check_int(self, 'manual_mode_duty', 0, 255)
+
+
+@dataclass(frozen=True, slots=True)
+class OledClockScreenConfig:
+    data_format: int = 0           # 0: Y-M-D, 1: M-D-Y, 2: D-M-Y
+    time_format: int = 0           # 0: 24-hour, 1: 12-hour
+    display_time: float = 3.0
+    is_run_on_oled: bool = True
+
+    def __post_init__(self):
+        _check_int(self, 'data_format', 0, 2)
+        _check_int(self, 'time_format', 0, 1)
+        _check_float(self, 'display_time', 0.5, 3600.0)
+        _check_bool(self, 'is_run_on_oled')
+
+
+@dataclass(frozen=True, slots=True)
+class OledScreenConfig:
+    interchange: int = 0           # Layout variant of the screen
+    display_time: float = 3.0
+    is_run_on_oled: bool = True
+
+    def __post_init__(self):
+        _check_int(self, 'interchange', 0, 5)
+        _check_float(self, 'display_time', 0.5, 3600.0)
+        _check_bool(self, 'is_run_on_oled')
+
+
+@dataclass(frozen=True, slots=True)
+class OledConfig:
+    screen1: OledClockScreenConfig = field(default_factory=OledClockScreenConfig)
+    screen2: OledScreenConfig = field(default_factory=OledScreenConfig)
+    screen3: OledScreenConfig = field(default_factory=OledScreenConfig)
+
+
+@dataclass(frozen=True, slots=True)
+class SchedulingProfile:
+    policy: str = 'other'                  # CPUSchedulingPolicy: other, batch, idle, fifo or rr
+    priority: int = 0                      # CPUSchedulingPriority, 1-99 for fifo/rr
+    nice: int = 0                          # Nice, -20 to 19
+    cpu_affinity: str = ''                 # CPUAffinity, e.g. "1" or "0-1", empty for all CPUs
+    cpu_quota: str = ''                    # CPUQuota, e.g. "50%", empty for no limit
+    io_scheduling_class: str = ''          # IOSchedulingClass: realtime, best-effort, idle, empty for default
+    limit_memlock: str = ''                # LimitMEMLOCK, e.g. "infinity" or "64M", empty for default
+    mlockall: bool = False                 # Lock all current and future pages in the process (needs limit_memlock)
+
+    def __post_init__(self):
+        _check_choice(self, 'policy', ('other', 'batch', 'idle', 'fifo', 'rr'))
+        if self.policy in ('fifo', 'rr'):
+            _check_int(self, 'priority', 1, 99)
+        else:
+            _check_int(self, 'priority', 0, 0)
+        _check_int(self, 'nice', -20, 19)
+        _check_choice(self, 'io_scheduling_class', ('', 'realtime', 'best-effort', 'idle'))
+        for name in ('cpu_affinity', 'cpu_quota', 'limit_memlock'):
+            if not isinstance(getattr(self, name), str):
+                raise ValueError(f"SchedulingProfile.{name} must be a string")
+        _check_bool(self, 'mlockall')
+        if self.mlockall and not self.limit_memlock:
+            raise ValueError("SchedulingProfile.mlockall needs limit_memlock, the default limit is too small")
+
+
+def _default_scheduling_profiles():
+    return {
+        # Frame timing of the LED strip is the most visible, keep it on its own CPU
+        'led': SchedulingProfile('rr', 80, -19, cpu_affinity='1', limit_memlock='infinity', mlockall=True),
+        'fan': SchedulingProfile('rr', 60, -10, cpu_affinity='0', limit_memlock='infinity', mlockall=True),
+        'display': SchedulingProfile('rr', 50, -15, cpu_affinity='0'),
+        'default': SchedulingProfile(),
+    }
+
+def _default_scheduling_services():
+    return {
+        'task_led.service': 'led',
+        'task_fan.service': 'fan',
+        'task_oled.service': 'display',
+    }
+
+
+@dataclass(frozen=True, slots=True)
+class SchedulingConfig:
+    profiles: dict = field(default_factory=_default_scheduling_profiles)    # Profile name -> SchedulingProfile
+    services: dict = field(default_factory=_default_scheduling_services)    # Unit name -> profile name
+
+    def __post_init__(self):
+        profiles = {name: from_dict(SchedulingProfile, profile) for name, profile in dict(self.profiles).items()}
+        _set(self, 'profiles', profiles)
+        _set(self, 'services', dict(self.services))
+        for service, profile in self.services.items():
+            if profile not in profiles:
+                raise ValueError(f"Service {service} uses unknown scheduling profile {profile!r}")
+
+    def get_profile(self, service_name):
+        """
+        Get the scheduling profile of a unit
+
+        Args:
+            service_name (str): Unit name such as "task_led.service"
+
+        Returns:
+            SchedulingProfile: Assigned profile, the "default" profile (or plain defaults) otherwise
+        """
+        name = self.services.get(service_name, 'default')
+        return self.profiles.get(name) or SchedulingProfile()
+
+
+# Configuration file section name -> schema class
+SECTIONS = {
+    'General': GeneralConfig,
+    'Monitor': MonitorConfig,
+    'LED': LedConfig,
+    'Fan': FanConfig,
+    'OLED': OledConfig,
+    'Scheduling': SchedulingConfig,
+}
+
+
+def from_dict(cls, data):
+    """
+    Build a validated schema object from a configuration dict
+
+    Missing keys take their defaults and unknown keys are ignored.
+
+    Args:
+        cls: Schema class
+        data (dict): Section data, may be partial or None
+
+    Returns:
+        Instance of cls
+
+    Raises:
+        ValueError: If a value has the wrong type or is out of range
+    """
+    if isinstance(data, cls):
+        return data
+    kwargs = {}
+    for f in fields(cls):
+        if not data or f.name not in data:
+            continue
+        value = data[f.name]
+        if is_dataclass(f.type):
+            value = from_dict(f.type, value)
+        kwargs[f.name] = value
+    return cls(**kwargs)
+
+def _from_dict_or_defaults(cls, data, path):
+    """
+    Build a schema object like from_dict(), replacing only the invalid fields by their defaults
+
+    Nested objects are repaired on their own, so an error in one of them never touches the
+    fields next to it. Fields are accepted one at a time against the ones accepted before,
+    repeated until nothing changes, so a pair that is only valid together (low/high) is kept.
+
+    Args:
+        cls: Schema class
+        data (dict): Section data, may be partial or None
+        path (str): Name of the object in the messages, e.g. "Fan.temp_mode_config"
+
+    Returns:
+        Instance of cls
+    """
+    if data is not None and not isinstance(data, (dict, cls)):
+        print(f"Invalid {path} configuration, using defaults: expected an object, got {data!r}")
+        return cls()
+    try:
+        return from_dict(cls, data)
+    except (ValueError, TypeError):
+        pass
+    accepted = {}
+    pending = {}
+    for f in fields(cls):
+        if f.name not in data:
+            continue
+        if is_dataclass(f.type):
+            accepted[f.name] = _from_dict_or_defaults(f.type, data[f.name], f"{path}.{f.name}")
+        else:
+            pending[f.name] = data[f.name]
+    errors = {}
+    while pending:
+        errors = {}
+        for name, value in pending.items():
+            try:
+                cls(**accepted, **{name: value})
+            except (ValueError, TypeError) as e:
+                errors[name] = e
+            else:
+                accepted[name] = value
+        if len(errors) == len(pending):
+            break
+        pending = {name: pending[name] for name in errors}
+    for name, e in errors.items():
+        print(f"Invalid {path}.{name}, using the default: {e}")
+    try:
+        return cls(**accepted)
+    except (ValueError, TypeError) as e:
+        print(f"Invalid {path} configuration, using defaults: {e}")
+        return cls()
+
+def compile_section(section, data):
+    """
+    Compile one configuration section, replacing invalid fields by their defaults
+
+    Only the invalid fields are replaced, e.g. a broken PID setting leaves the fan mode,
+    manual duty and curve as they are. Every replaced field is logged.
+
+    Args:
+        section (str): Section name, one of SECTIONS
+        data (dict): Section data
+
+    Returns:
+        Frozen schema object
+    """
+    return _from_dict_or_defaults(SECTIONS[section], data, section)
+
+def _plain(value):
+    """Turn tuples into lists, so the dicts compare equal to what is read back from the JSON file"""
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    return value
+
+def to_dict(config):
+    """Convert a schema object back to plain dicts, as stored in the JSON file"""
+    return _plain(asdict(config))
+
+def default_config_dict():
+    """
+    Get the complete default configuration
+
+    Returns:
+        dict: Section name -> default section data
+    """
+    return {section: to_dict(cls()) for section, cls in SECTIONS.items()}
+
+
+def _fill_defaults(data, defaults):
+    """Add missing keys from defaults (recursively), existing values are kept"""
+    for key, value in defaults.items():
+        if key not in data:
+            data[key] = copy.deepcopy(value)
+        elif isinstance(value, dict) and isinstance(data[key], dict):
+            _fill_defaults(data[key], value)
+
+def _migrate_to_v1(data):
+    """Unversioned files: fill missing sections and keys, drop the never written OLED screen4"""
+    _fill_defaults(data, default_config_dict())
+    oled = data.get('OLED')
+    if isinstance(oled, dict):
+        oled.pop('screen4', None)
+
+def _migrate_to_v2(data):
+    """Add the Scheduling section, the profiles used to be hardcoded in ServiceGenerator"""
+    _fill_defaults(data, {'Scheduling': default_config_dict()['Scheduling']})
+
+def _migrate_to_v3(data):
+    """Add the PID mode parameters to the Fan section"""
+    _fill_defaults(data, {'Fan': {'pid_mode_config': to_dict(FanPidModeConfig())}})
+
+def _migrate_to_v4(data):
+    """Add an empty multi-point fan curve, temperature mode keeps using the two thresholds until one is set"""
+    _fill_defaults(data, {'Fan': {'temp_mode_config': {'fan_curve': []}}})
+
+def _migrate_to_v5(data):
+    """Add the temperature filter and PWM deadband settings to the Fan section"""
+    _fill_defaults(data, {'Fan': {'filter_config': to_dict(FanFilterConfig())}})
+
+def _migrate_to_v6(data):
+    """Add the tachometer based fan health settings to the Fan section"""
+    _fill_defaults(data, {'Fan': {'health_config': to_dict(FanHealthConfig())}})
+
+def _migrate_to_v7(data):
+    """Add the sensor aggregation settings to the Fan section, 'cpu' keeps reading thermal_zone0 only"""
+    _fill_defaults(data, {'Fan': {'sensor_config': to_dict(FanSensorConfig())}})
+
+def _migrate_to_v8(data):
+    """Add the fan boost on firmware throttling to the Fan section"""
+    _fill_defaults(data, {'Fan': {'throttle_config': to_dict(FanThrottleConfig())}})
+
+def _migrate_to_v9(data):
+    """Add the temperature slope prediction of temperature mode to the Fan section"""
+    _fill_defaults(data, {'Fan': {'prediction_config': to_dict(FanPredictionConfig())}})
+
+def _migrate_to_v10(data):
+    """Add the slew-rate limit and kick-start of the fan output to the Fan section"""
+    _fill_defaults(data, {'Fan': {'output_config': to_dict(FanOutputConfig())}})
+
+# MIGRATIONS[n] upgrades a file from schema version n to n + 1, in place
+MIGRATIONS = [
+    _migrate_to_v1,
+    _migrate_to_v2,
+    _migrate_to_v3,
+    _migrate_to_v4,
+    _migrate_to_v5,
+    _migrate_to_v6,
+    _migrate_to_v7,
+    _migrate_to_v8,
+    _migrate_to_v9,
+    _migrate_to_v10,
+]
+
+def get_schema_version(data):
+    """Get the schema version stored in a configuration dict, 0 for unversioned files"""
+    general = data.get('General')
+    if isinstance(general, dict):
+        version = general.get('schema_version')
+        if isinstance(version, int) and not isinstance(version, bool):
+            return version
+    return 0
+
+def migrate_config(data):
+    """
+    Upgrade a configuration dict to SCHEMA_VERSION in a single pass
+
+    A file from a newer version is left as it is: its version is never lowered and the keys
+    this version knows are read from it as usual.
+
+    Args:
+        data (dict): Configuration as read from the file, modified in place
+
+    Returns:
+        bool: True if anything was migrated and the file should be rewritten
+    """
+    version = get_schema_version(data)
+    if version > SCHEMA_VERSION:
+        print(f"Configuration schema version {version} is newer than {SCHEMA_VERSION}, keeping it unchanged")
+        return False
+    if version == SCHEMA_VERSION:
+        return False
+    for migration in MIGRATIONS[version:]:
+        migration(data)
+    data.setdefault('General', {})['schema_version'] = SCHEMA_VERSION
+    return True
+
+
+if __name__ == "__main__":
+    import json
+    print(json.dumps(default_config_dict(), indent=2))
+    try:
+        from_dict(FanConfig, {'temp_mode_config': {'fan_temp_threshold_low': 80, 'fan_temp_threshold_high': 45}})
+    except ValueError as e:
+        print(f"Rejected as expected: {e}")
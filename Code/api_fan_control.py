@@ -0,0 +1,877 @@
+# api_fan_control.py
+import os
+import json
+import time
+from collections import deque
+from api_sensors import CPU_SENSOR
+
+
+class CpuLoadSampler:
+    def __init__(self, stat_file='/proc/stat'):
+        """
+        CPU utilization between two calls, read from the kernel counters in /proc/stat
+
+        Uses the same counters as psutil.cpu_percent(), without importing psutil into the fan task.
+        """
+        self.stat_file = stat_file
+        self.last_total = None
+        self.last_idle = None
+
+    def sample(self):
+        """
+        Get the utilization of all CPUs since the previous call
+
+        Returns:
+            float: 0.0-1.0, None on the first call or if /proc/stat cannot be read
+        """
+        try:
+            with open(self.stat_file, 'r') as f:
+                values = [int(value) for value in f.readline().split()[1:]]
+        except (OSError, ValueError) as e:
+            print(f"Error reading CPU load: {e}")
+            return None
+        total = sum(values[:8])        # user nice system idle iowait irq softirq steal (guest is part of user)
+        idle = values[3] + values[4]   # idle + iowait
+        last_total, last_idle = self.last_total, self.last_idle
+        self.last_total, self.last_idle = total, idle
+        if last_total is None or total <= last_total:
+            return None
+        return max(0.0, min(1.0, 1.0 - (idle - last_idle) / (total - last_total)))
+
+
+class EmaFilter:
+    def __init__(self, time_constant):
+        """
+        Exponential moving average with a time constant, correct for irregular sample intervals
+
+        Args:
+            time_constant: Seconds for the output to follow 63% of a step
+        """
+        self.time_constant = time_constant
+        self.reset()
+
+    def reset(self):
+        self.value = None
+        self.last_time = None
+
+    def update(self, value, now=None):
+        now = time.monotonic() if now is None else now
+        if self.value is None or self.time_constant <= 0:
+            self.value = value
+        else:
+            dt = max(0.0, now - self.last_time)
+            self.value += dt / (self.time_constant + dt) * (value - self.value)
+        self.last_time = now
+        return self.value
+
+
+class MedianFilter:
+    def __init__(self, window):
+        """
+        Median of the last window samples, removes single-read spikes without smoothing steps
+
+        Args:
+            window: Number of samples
+        """
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self.samples = deque(maxlen=self.window)
+
+    def update(self, value, now=None):
+        self.samples.append(value)
+        ordered = sorted(self.samples)
+        middle = len(ordered) // 2
+        if len(ordered) % 2:
+            return ordered[middle]
+        return (ordered[middle - 1] + ordered[middle]) / 2
+
+
+class KalmanFilter:
+    def __init__(self, process_noise, measurement_noise):
+        """
+        Kalman filter on temperature and its rate of change (constant rate model)
+
+        Follows a steady rise without the lag of an EMA, while read jitter is averaged out.
+
+        Args:
+            process_noise: Variance of the rate change, (°C/s)² per second
+            measurement_noise: Variance of a single read, °C²
+        """
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.reset()
+
+    def reset(self):
+        self.temperature = None
+        self.rate = 0.0
+        self.covariance = None    # [[p00, p01], [p01, p11]]
+        self.last_time = None
+
+    def update(self, value, now=None):
+        now = time.monotonic() if now is None else now
+        if self.temperature is None:
+            self.temperature = value
+            self.rate = 0.0
+            self.covariance = [[self.measurement_noise, 0.0], [0.0, 1.0]]
+            self.last_time = now
+            return value
+        dt = max(0.0, now - self.last_time)
+        self.last_time = now
+
+        # Predict
+        (p00, p01), (_, p11) = self.covariance
+        q = self.process_noise
+        temperature = self.temperature + self.rate * dt
+        p00 = p00 + 2 * dt * p01 + dt * dt * p11 + q * dt ** 3 / 3
+        p01 = p01 + dt * p11 + q * dt ** 2 / 2
+        p11 = p11 + q * dt
+
+        # Correct with the measured temperature
+        innovation = value - temperature
+        s = p00 + self.measurement_noise
+        k0, k1 = p00 / s, p01 / s
+        self.temperature = temperature + k0 * innovation
+        self.rate += k1 * innovation
+        self.covariance = [[(1 - k0) * p00, (1 - k0) * p01], [(1 - k0) * p01, p11 - k1 * p01]]
+        return self.temperature
+
+
+def create_temperature_filter(config):
+    """
+    Create the temperature filter selected in a FanFilterConfig
+
+    Returns:
+        EmaFilter, MedianFilter, KalmanFilter, or None for unfiltered reads
+    """
+    if config.filter_type == 'ema':
+        return EmaFilter(config.ema_time_constant)
+    if config.filter_type == 'median':
+        return MedianFilter(config.median_window)
+    if config.filter_type == 'kalman':
+        return KalmanFilter(config.kalman_process_noise, config.kalman_measurement_noise)
+    return None
+
+
+class SlopePredictor:
+    MAX_SAMPLES = 128   # Ring buffer size, enough for a 2 minute window at one sample per second
+
+    def __init__(self, window, horizon, max_lead):
+        """
+        Project the temperature ahead from its recent slope
+
+        The slope is a least-squares fit over the filtered samples of the last window seconds.
+        Only rising slopes are projected: the fan spins up before the curve is reached, while
+        ramping down is left to the hysteresis, so the average duty stays where it was.
+
+        Args:
+            window: Seconds of samples the slope is fitted over
+            horizon: Seconds the temperature is projected ahead, 0 to return the temperature unchanged
+            max_lead: Largest °C the projection may be above the temperature
+        """
+        self.window = window
+        self.horizon = horizon
+        self.max_lead = max_lead
+        self.samples = deque(maxlen=self.MAX_SAMPLES)
+        self.slope = 0.0    # °C/s of the last update
+
+    def reset(self):
+        self.samples.clear()
+        self.slope = 0.0
+
+    def update(self, temp, now=None):
+        """
+        Add a sample and project it
+
+        Args:
+            temp: Filtered temperature in °C
+            now: Monotonic time of the sample, None for now
+
+        Returns:
+            float: Projected temperature in °C, never below temp
+        """
+        now = time.monotonic() if now is None else now
+        samples = self.samples
+        samples.append((now, temp))
+        while now - samples[0][0] > self.window:
+            samples.popleft()
+        # A slope from a fraction of the window (startup, after a mode change) is mostly noise
+        if len(samples) < 3 or now - samples[0][0] < self.window / 2:
+            self.slope = 0.0
+            return temp
+
+        count = len(samples)
+        mean_t = sum(t for t, _ in samples) / count
+        mean_temp = sum(value for _, value in samples) / count
+        variance = sum((t - mean_t) ** 2 for t, _ in samples)
+        covariance = sum((t - mean_t) * (value - mean_temp) for t, value in samples)
+        self.slope = covariance / variance if variance > 0 else 0.0
+        return temp + min(self.max_lead, max(0.0, self.slope * self.horizon))
+
+
+def create_slope_predictor(config):
+    """
+    Create the predictor of a FanPredictionConfig
+
+    Returns:
+        SlopePredictor, or None if the prediction is switched off
+    """
+    if config.horizon <= 0:
+        return None
+    return SlopePredictor(config.slope_window, config.horizon, config.max_lead)
+
+
+class FanOutput:
+    STEP_INTERVAL = 0.5   # Seconds between two slew steps, every PWM write starts a sudo process
+
+    def __init__(self, system_information, deadband=0, slew_rate=0.0, kick_duty=0, kick_time=0.0):
+        """
+        Output stage of the fan loops: deadband, slew-rate limit and kick-start
+
+        Every write to pwm1 is a privileged sysfs write, so a duty change smaller than the deadband
+        is not written. Between two running duties the written duty moves at most slew_rate per
+        second, so the fan noise changes gradually. A fan that starts from 0 with a duty below
+        kick_duty first gets kick_duty for kick_time, so it spins up, then slews down to its duty.
+        Stopping (0) is always immediate.
+
+        The output never sleeps: write() and update() do one step, and next_update_time() tells
+        the fan scheduler when the next step is due.
+
+        Args:
+            system_information: SystemInformation used for the PWM writes
+            deadband: Minimum duty change that is written
+            slew_rate: Largest duty change per second, 0 for no limit
+            kick_duty: Duty of the kick-start pulse, 0 for no kick-start
+            kick_time: Seconds of the kick-start pulse
+        """
+        self.system_information = system_information
+        self.deadband = deadband
+        self.slew_rate = slew_rate
+        self.kick_duty = kick_duty
+        self.kick_time = kick_time
+        self.duty = None                 # Last written duty, None if unknown
+        self.target = None               # Duty the output moves to, None if unknown
+        self.kick_until = None           # Monotonic end of the running kick-start pulse
+        self.last_write = 0.0
+        self.write_times = deque()       # Monotonic times of the writes in the last hour
+        self.writes_total = 0
+        self.writes_skipped = 0
+        self.kicks = 0
+
+    def reset(self):
+        """Forget the last written duty, e.g. after the kernel controlled the fan"""
+        self.duty = None
+        self.target = None
+        self.kick_until = None
+
+    def write(self, duty, exact=False, now=None):
+        """
+        Set the duty to move to, unless it is within the deadband of the current one
+
+        Args:
+            duty: Requested duty, 0-255
+            exact: Accept any change regardless of the deadband, e.g. a duty set by hand
+            now: Monotonic time, None for now
+
+        Returns:
+            int: Duty the fan runs at
+        """
+        duty = max(0, min(255, int(round(duty))))
+        current = self.target if self.target is not None else self.duty
+        if current is not None and duty != current:
+            if not exact and abs(duty - current) < self.deadband and duty not in (0, 255):
+                self.writes_skipped += 1
+                return self.duty
+        self.target = duty
+        return self.update(now)
+
+    def update(self, now=None):
+        """
+        Do the next step towards the target duty: end of the kick-start pulse or one slew step
+
+        Returns:
+            int: Duty the fan runs at
+        """
+        now = time.monotonic() if now is None else now
+        target = self.target
+        if target is None or target == self.duty:
+            self.kick_until = None  # Target reached, e.g. kick_duty requested during the kick
+            return self.duty
+        if self.kick_until is not None:
+            if target != 0 and now < self.kick_until:
+                return self.duty
+            self.kick_until = None  # Slew down from the kick duty
+        if self.duty not in (None, 0) and target != 0 and self.slew_rate > 0:
+            if now - self.last_write < self.STEP_INTERVAL:
+                return self.duty    # The scheduler calls again at next_update_time()
+            step = self.slew_rate * self.STEP_INTERVAL
+            return self._set(self.duty + max(-step, min(step, target - self.duty)), now)
+
+        if self.duty == 0 and 0 < target < self.kick_duty and self.kick_time > 0:
+            self.kick_until = now + self.kick_time
+            self.kicks += 1
+            return self._set(self.kick_duty, now)
+        return self._set(target, now)
+
+    def _set(self, duty, now):
+        duty = int(round(duty))
+        self.system_information.set_pi_pwm_duty(duty)
+        self.duty = duty
+        self.last_write = now
+        self.writes_total += 1
+        self.write_times.append(now)
+        return duty
+
+    def next_update_time(self):
+        """
+        Returns:
+            float: Monotonic time update() has the next step to do, None if the target is reached
+        """
+        if self.target is None or self.duty is None or self.target == self.duty:
+            return None
+        if self.kick_until is not None:
+            return self.kick_until
+        return self.last_write + self.STEP_INTERVAL
+
+    def get_writes_per_hour(self):
+        """Number of PWM writes in the last hour"""
+        limit = time.monotonic() - 3600
+        while self.write_times and self.write_times[0] < limit:
+            self.write_times.popleft()
+        return len(self.write_times)
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: duty, duty_target, duty_writes_per_hour, duty_writes_total, duty_writes_skipped, fan_kicks
+        """
+        return {
+            'duty': self.duty,
+            'duty_target': self.target,
+            'duty_writes_per_hour': self.get_writes_per_hour(),
+            'duty_writes_total': self.writes_total,
+            'duty_writes_skipped': self.writes_skipped,
+            'fan_kicks': self.kicks,
+        }
+
+
+class TickHistogram:
+    BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+    def __init__(self):
+        """Histograms of how long each scheduler tick ran and how late it started"""
+        self.duration_counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.lateness_counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.ticks = 0
+        self.duration_max = 0.0
+        self.lateness_max = 0.0
+
+    def _bucket(self, seconds):
+        milliseconds = seconds * 1000
+        for index, bound in enumerate(self.BOUNDS_MS):
+            if milliseconds <= bound:
+                return index
+        return len(self.BOUNDS_MS)
+
+    def record(self, duration, lateness):
+        """
+        Count one tick
+
+        Args:
+            duration: Seconds the tick ran
+            lateness: Seconds between the planned and the actual start of the tick
+        """
+        lateness = max(0.0, lateness)
+        self.ticks += 1
+        self.duration_counts[self._bucket(duration)] += 1
+        self.lateness_counts[self._bucket(lateness)] += 1
+        self.duration_max = max(self.duration_max, duration)
+        self.lateness_max = max(self.lateness_max, lateness)
+
+    def _labels(self):
+        return [f"<={bound}ms" for bound in self.BOUNDS_MS] + [f">{self.BOUNDS_MS[-1]}ms"]
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: tick_count, tick_duration_max_ms, tick_lateness_max_ms and both histograms (label -> count)
+        """
+        labels = self._labels()
+        return {
+            'tick_count': self.ticks,
+            'tick_duration_max_ms': round(self.duration_max * 1000, 3),
+            'tick_lateness_max_ms': round(self.lateness_max * 1000, 3),
+            'tick_duration_histogram': dict(zip(labels, self.duration_counts)),
+            'tick_lateness_histogram': dict(zip(labels, self.lateness_counts)),
+        }
+
+    def format(self):
+        """Printable table of both histograms"""
+        lines = [f"{self.ticks} ticks, duration max {self.duration_max * 1000:.1f} ms, lateness max {self.lateness_max * 1000:.1f} ms",
+                 f"{'':>9} {'duration':>9} {'lateness':>9}"]
+        for label, duration, lateness in zip(self._labels(), self.duration_counts, self.lateness_counts):
+            lines.append(f"{label:>9} {duration:>9} {lateness:>9}")
+        return "\n".join(lines)
+
+
+class FanHealthMonitor:
+    BUCKETS = 16          # Duty ranges with their own RPM baseline (16 duty steps each)
+    LEARN_SAMPLES = 30    # Steady samples averaged into a baseline
+    DEGRADED_SAMPLES = 5  # Consecutive slow samples before a fan counts as degraded
+    SAVE_INTERVAL = 600   # Seconds between writes of the learned baselines
+
+    def __init__(self, config, state_file=None):
+        """
+        Learn the duty -> RPM curve from the tachometer and detect stalled or degraded fans
+
+        RPM is only sampled once the duty has been steady for settle_time, so spin-up is not learned.
+        Every duty range keeps a baseline, the mean RPM of its first steady samples. A fan that later
+        turns slower than degraded_ratio x baseline (clogged, worn bearing) is degraded, a fan that stands
+        still at a duty it used to spin at (or at stall_duty and above) is stalled.
+
+        Args:
+            config: FanHealthConfig
+            state_file: JSON file that keeps the baselines across restarts, None to not persist them
+        """
+        self.config = config
+        self.state_file = state_file
+        self.baseline = [0.0] * self.BUCKETS
+        self.samples = [0] * self.BUCKETS
+        self.status = 'unknown'          # unknown (no tachometer), learning, ok, degraded, stalled
+        self.rpm = -1
+        self.duty = None
+        self.duty_since = 0.0
+        self.stall_since = None
+        self.degraded_count = 0
+        self.correction = 0              # Duty added to reach the learned RPM
+        self.requested_duty = None       # Duty of the control loop, before the correction
+        self.last_save = time.monotonic()
+        self.unsaved = False
+        self.load()
+
+    def load(self):
+        """Read the learned baselines from state_file"""
+        if self.state_file is None:
+            return
+        try:
+            with open(self.state_file, 'r') as f:
+                state = json.load(f)
+            baseline = [float(value) for value in state['baseline']]
+            samples = [int(value) for value in state['samples']]
+            if len(baseline) == len(samples) == self.BUCKETS:
+                self.baseline, self.samples = baseline, samples
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Ignoring fan health state {self.state_file}: {e}")
+
+    def save(self):
+        """Write the learned baselines to state_file (atomic replace)"""
+        self.last_save = time.monotonic()
+        if self.state_file is None or not self.unsaved:
+            return
+        try:
+            temp_file = f"{self.state_file}.{os.getpid()}.tmp"
+            with open(temp_file, 'w') as f:
+                json.dump({'baseline': self.baseline, 'samples': self.samples}, f)
+            os.replace(temp_file, self.state_file)
+            self.unsaved = False
+        except OSError as e:
+            print(f"Error saving fan health state: {e}")
+
+    def _bucket(self, duty):
+        return max(0, min(self.BUCKETS - 1, int(duty) * self.BUCKETS // 256))
+
+    def _learned(self, bucket):
+        return self.samples[bucket] >= self.LEARN_SAMPLES
+
+    def expected_rpm(self, duty):
+        """
+        RPM the fan reached at this duty while it was healthy
+
+        Returns:
+            float: Learned RPM, None if the duty range is not learned yet
+        """
+        bucket = self._bucket(duty)
+        return self.baseline[bucket] if self._learned(bucket) else None
+
+    def get_max_rpm(self):
+        """Highest learned RPM, 0 if nothing is learned yet"""
+        return max((rpm for bucket, rpm in enumerate(self.baseline) if self._learned(bucket)), default=0.0)
+
+    def update(self, duty, rpm, now=None):
+        """
+        Feed one tachometer reading
+
+        Args:
+            duty: Duty the fan runs at (last written), None if unknown
+            rpm: Measured RPM, negative if the fan has no tachometer
+
+        Returns:
+            str: Health status
+        """
+        now = time.monotonic() if now is None else now
+        self.rpm = rpm
+        if rpm < 0:
+            self.status = 'unknown'
+            return self.status
+        if duty != self.duty:
+            self.duty = duty
+            self.duty_since = now
+        if duty is None:
+            return self.status
+
+        bucket = self._bucket(duty)
+        learned = self._learned(bucket)
+        baseline = self.baseline[bucket]
+        # A fan that should turn but gives no pulses, timed across duty changes
+        if duty > 0 and rpm == 0 and (duty >= self.config.stall_duty or (learned and baseline > 0)):
+            if self.stall_since is None:
+                self.stall_since = now
+            if now - self.stall_since >= self.config.stall_time:
+                self.status = 'stalled'
+            return self.status
+        self.stall_since = None
+        if self.status == 'stalled':
+            self.status = 'degraded'  # Turns again, suspect until it is checked at a learned duty
+        if now - self.duty_since < self.config.settle_time:
+            return self.status
+
+        if self.correction > 0:
+            pass  # Compensating a degraded fan, the duty is not the one the fan was learned at
+        elif learned:
+            if rpm < baseline * self.config.degraded_ratio:
+                self.degraded_count += 1
+                if self.degraded_count >= self.DEGRADED_SAMPLES:
+                    self.status = 'degraded'
+            else:
+                self.degraded_count = 0
+                self.status = 'ok'
+        elif self.status != 'degraded':
+            # Only a healthy fan is learned
+            self.samples[bucket] += 1
+            self.baseline[bucket] += (rpm - baseline) / self.samples[bucket]
+            self.unsaved = True
+            if self._learned(bucket):
+                self.save()
+            self.status = 'ok' if any(map(self._learned, range(self.BUCKETS))) else 'learning'
+
+        if self.unsaved and now - self.last_save >= self.SAVE_INTERVAL:
+            self.save()
+        return self.status
+
+    def adjust_duty(self, duty, now=None):
+        """
+        Raise the duty of a degraded fan until it reaches the RPM it used to reach at the requested duty
+
+        The correction moves in small steps, one per settled reading, so it never fights the control loop.
+        A stalled fan gets full duty, which gives a stuck rotor the best chance to start again.
+
+        Args:
+            duty: Duty requested by the control loop
+
+        Returns:
+            int: Duty to write
+        """
+        now = time.monotonic() if now is None else now
+        self.requested_duty = duty
+        if not self.config.rpm_compensation or duty <= 0 or self.rpm < 0:
+            self.correction = 0
+            return duty
+        if self.status == 'stalled':
+            return 255
+        if self.status != 'degraded':
+            self.correction = 0
+            return duty
+        target = self.expected_rpm(duty)
+        if target and now - self.duty_since >= self.config.settle_time:
+            if self.rpm < target * 0.95:
+                self.correction += 4
+            elif self.rpm > target:
+                self.correction -= 4
+        self.correction = max(0, min(255 - int(duty), self.correction))
+        return duty + self.correction
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: rpm, rpm_expected, rpm_max, fan_health, duty_correction
+        """
+        return {
+            'rpm': self.rpm,
+            'rpm_expected': None if self.requested_duty is None else self.expected_rpm(self.requested_duty),
+            'rpm_max': self.get_max_rpm(),
+            'fan_health': self.status,
+            'duty_correction': self.correction,
+        }
+
+
+class FanCurve:
+    RESOLUTION = 10     # Table entries per °C (0.1 °C steps)
+
+    def __init__(self, points):
+        """
+        Piecewise-linear fan curve compiled into a lookup table
+
+        The table is built once per configuration, so a control tick only rounds the
+        temperature to a table index. Below the first point the fan is off, above the
+        last point it keeps the last duty. Points with the same temperature make a step,
+        the later point applies from that temperature on.
+
+        Args:
+            points: ((°C, duty), ...) with non-decreasing temperatures, at least 2 points
+        """
+        steps = [(int(round(temp * self.RESOLUTION)), int(duty)) for temp, duty in points]
+        self.start = steps[0][0]
+        self.last_duty = steps[-1][1]
+        table = bytearray(steps[-1][0] - self.start + 1)
+        segment = 0
+        for index in range(len(table)):
+            step = self.start + index
+            # Last point at or below this temperature
+            while segment + 1 < len(steps) and steps[segment + 1][0] <= step:
+                segment += 1
+            if segment + 1 == len(steps):
+                table[index] = steps[segment][1]
+            else:
+                (step0, duty0), (step1, duty1) = steps[segment], steps[segment + 1]
+                table[index] = int(round(duty0 + (duty1 - duty0) * (step - step0) / (step1 - step0)))
+        self.table = bytes(table)
+
+    def lookup(self, temp):
+        """
+        Duty of the curve at a temperature
+
+        Args:
+            temp: Temperature in °C
+
+        Returns:
+            int: 0-255
+        """
+        index = int(temp * self.RESOLUTION + 0.5) - self.start
+        if index < 0:
+            return 0
+        if index >= len(self.table):
+            return self.last_duty
+        return self.table[index]
+
+    def get_duty(self, temp, current_duty, hysteresis):
+        """
+        Duty to apply, with hysteresis on the curve output
+
+        The duty follows the curve up immediately, but only comes down once the curve
+        hysteresis °C above the current temperature is lower than the current duty.
+
+        Args:
+            temp: Temperature in °C
+            current_duty: Duty that is applied now
+            hysteresis: Hysteresis in °C
+
+        Returns:
+            int: 0-255
+        """
+        return max(self.lookup(temp), min(current_duty, self.lookup(temp + hysteresis)))
+
+
+class SensorPolicy:
+    def __init__(self, sensor_config, default_points):
+        """
+        Combine several temperature sensors into one fan decision
+
+        cpu uses thermal_zone0 only. max takes the hottest sensor, weighted the weighted mean.
+        In temperature mode every sensor maps to a duty through its own curve (or the temperature
+        mode curve) and the duties are combined the same way, so an NVMe drive can have a curve
+        that starts at 50 °C while the CPU curve starts at 45 °C.
+
+        Args:
+            sensor_config: FanSensorConfig
+            default_points: Curve points of sensors without their own curve, FanTempModeConfig.curve_points
+        """
+        self.aggregation = sensor_config.aggregation
+        self.weights = {entry.sensor: entry.weight for entry in sensor_config.sensors}
+        self.default_curve = FanCurve(default_points)
+        self.curves = {entry.sensor: FanCurve(entry.fan_curve) for entry in sensor_config.sensors if entry.fan_curve}
+        if self.aggregation == 'cpu':
+            self.sensor_ids = [CPU_SENSOR]
+        else:
+            self.sensor_ids = [entry.sensor for entry in sensor_config.sensors] or None  # None: every discovered sensor
+
+    def _combine(self, values):
+        if self.aggregation == 'cpu':
+            return values.get(CPU_SENSOR, max(values.values()))
+        if self.aggregation == 'max':
+            return max(values.values())
+        total = sum(self.weights.get(sensor_id, 1.0) for sensor_id in values)
+        if total <= 0:
+            return max(values.values())
+        return sum(value * self.weights.get(sensor_id, 1.0) for sensor_id, value in values.items()) / total
+
+    def temperature(self, temperatures):
+        """
+        Args:
+            temperatures (dict): Sensor id -> °C, at least one sensor
+
+        Returns:
+            float: Aggregated temperature in °C, used by PID mode
+        """
+        return self._combine(temperatures)
+
+    def get_duty(self, temperatures, current_duty, hysteresis):
+        """
+        Duty of temperature mode, see FanCurve.get_duty
+
+        Args:
+            temperatures (dict): Sensor id -> °C, at least one sensor
+            current_duty: Duty that is applied now
+            hysteresis: Hysteresis in °C
+
+        Returns:
+            int: 0-255
+        """
+        duties = {sensor_id: self.curves.get(sensor_id, self.default_curve).get_duty(temp, current_duty, hysteresis)
+                  for sensor_id, temp in temperatures.items()}
+        return int(round(self._combine(duties)))
+
+
+class PIDController:
+    def __init__(self, setpoint, kp, ki, kd, output_min=0, output_max=255, derivative_filter_time=0.0):
+        """
+        Discrete PID controller for a cooling loop, the output rises while the temperature is above the setpoint
+
+        The integral only grows while the output is not saturated in the same direction (conditional
+        integration), so a long period at full speed or with the fan off does not wind it up. The derivative
+        acts on the low-pass filtered measurement instead of the error, so sensor noise and setpoint changes
+        do not kick the fan. The integral is kept in output units, so gain changes are bumpless.
+
+        Args:
+            setpoint: Target temperature in °C
+            kp: Duty per °C of error
+            ki: Duty per °C of error and second
+            kd: Duty per °C/s of temperature change
+            output_min: Lowest output duty
+            output_max: Highest output duty
+            derivative_filter_time: Time constant of the derivative filter in seconds, 0 disables the filter
+        """
+        self.setpoint = setpoint
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.output_min = output_min
+        self.output_max = output_max
+        self.derivative_filter_time = derivative_filter_time
+        self.reset()
+
+    @classmethod
+    def from_config(cls, config):
+        """Create a controller from a FanPidModeConfig"""
+        controller = cls(0, 0, 0, 0)
+        controller.configure(config)
+        return controller
+
+    def configure(self, config):
+        """
+        Take over new parameters from a FanPidModeConfig, keeping the integral and filter state
+
+        Args:
+            config: FanPidModeConfig
+        """
+        self.setpoint = config.setpoint
+        self.kp = config.kp
+        self.ki = config.ki
+        self.kd = config.kd
+        self.output_min = config.min_duty
+        self.output_max = config.max_duty
+        self.derivative_filter_time = config.derivative_filter_time
+        self.integral = max(self.output_min, min(self.output_max, self.integral))
+
+    def reset(self):
+        """Forget the integral and the previous measurement, e.g. when the mode is entered again"""
+        self.integral = 0.0
+        self.derivative = 0.0
+        self.last_measurement = None
+        self.last_time = None
+        self.output = self.output_min
+
+    def update(self, measurement, feed_forward=0.0, now=None):
+        """
+        Compute the next output
+
+        Args:
+            measurement: Current temperature in °C
+            feed_forward: Duty added before the limits, e.g. from the CPU load
+            now: Time of the measurement in seconds (time.monotonic() if None)
+
+        Returns:
+            float: Output between output_min and output_max
+        """
+        now = time.monotonic() if now is None else now
+        dt = 0.0 if self.last_time is None else max(0.0, now - self.last_time)
+        error = measurement - self.setpoint
+
+        if self.last_measurement is not None and dt > 0:
+            rate = (measurement - self.last_measurement) / dt
+            if self.derivative_filter_time > 0:
+                self.derivative += dt / (self.derivative_filter_time + dt) * (rate - self.derivative)
+            else:
+                self.derivative = rate
+        self.last_measurement = measurement
+        self.last_time = now
+
+        base = self.kp * error + self.kd * self.derivative + feed_forward
+        integral = self.integral + self.ki * error * dt
+        # Anti-windup: integrate only up to the limit the output saturates at, never beyond it.
+        # A step that would overshoot still reaches the limit, so a large ki * dt cannot freeze it.
+        if base + integral > self.output_max and error > 0:
+            integral = max(self.integral, self.output_max - base)
+        elif base + integral < self.output_min and error < 0:
+            integral = min(self.integral, self.output_min - base)
+        self.integral = max(self.output_min - self.output_max, min(self.output_max, integral))
+        self.output = max(self.output_min, min(self.output_max, base + self.integral))
+        return self.output
+
+
+if __name__ == "__main__":
+    # Simulate a first-order thermal model: heating from the CPU, cooling proportional to fan duty
+    controller = PIDController(setpoint=55, kp=12, ki=0.4, kd=30, derivative_filter_time=5.0)
+    temperature = 70.0
+    for second in range(0, 301):
+        load = 1.0 if second < 150 else 0.2
+        duty = controller.update(temperature, feed_forward=60 * load, now=float(second))
+        temperature += 0.02 * (40 + 40 * load - temperature) - 0.0015 * duty * (temperature - 25) / 10
+        if second % 30 == 0:
+            print(f"t={second:3d}s load={load:.1f} temp={temperature:5.1f}°C duty={duty:5.1f}")
+
+    # Load bursts in temperature mode with and without the slope projection
+    for horizon in (0.0, 10.0):
+        predictor = SlopePredictor(8.0, horizon, 8.0)
+        temperature_filter = EmaFilter(4.0)
+        curve = FanCurve(((45.0, 50), (80.0, 200), (80.0, 255)))
+        temperature, duty, peak, duty_sum = 45.0, 0, 0.0, 0
+        for second in range(600):
+            load = 1.0 if second % 200 < 60 else 0.1
+            temperature += 0.02 * (40 + 50 * load - temperature) - 0.02 * duty / 255 * (temperature - 25)
+            filtered = temperature_filter.update(temperature, now=float(second))
+            duty = curve.get_duty(predictor.update(filtered, now=float(second)), duty, 3)
+            peak = max(peak, temperature)
+            duty_sum += duty
+        print(f"horizon {horizon:4.1f}s: peak {peak:.1f}°C, average duty {duty_sum / 600:.1f}")
+
+    # PWM writes in one hour of ±1 °C read jitter around 60 °C, default curve without hysteresis
+    import math
+    import random
+
+    class _CountingPwm:
+        def set_pi_pwm_duty(self, duty):
+            pass
+
+    curve = FanCurve(((45.0, 50), (80.0, 200), (80.0, 255)))
+    readings = [60 + 0.5 * math.sin(second / 300) + random.choice((-1.0, 0.0, 1.0)) for second in range(3600)]
+    for name, temperature_filter, deadband in (('raw', None, 0), ('raw + deadband', None, 4),
+                                               ('ema', EmaFilter(4.0), 4), ('median', MedianFilter(5), 4),
+                                               ('kalman', KalmanFilter(0.01, 0.5), 4)):
+        output = FanOutput(_CountingPwm(), deadband)
+        for second, reading in enumerate(readings):
+            temp = reading if temperature_filter is None else temperature_filter.update(reading, now=float(second))
+            output.write(curve.get_duty(temp, output.duty or 0, 0))
+        print(f"{name:>15}: {output.writes_total} PWM writes per hour, {output.writes_skipped} skipped by the deadband")
@@ -1,63 +1,498 @@
 # api_json.py
 import json
 import os
+import sys
+import errno
 import fcntl
 import threading
 import time
+import atexit
+import copy
+from contextlib import contextmanager
+from types import MappingProxyType
+from api_config_schema import SCHEMA_VERSION, compile_section, default_config_dict, migrate_config
+
+_shared_managers = {}
+_shared_managers_lock = threading.Lock()
+
+def get_config_manager(config_file='app_config.json'):
+    """
+    Get the process-wide ConfigManager for a configuration file
+
+    The file is parsed once; later reads only stat() it and reload when it changed.
+
+    Args:
+        config_file (str): Configuration file path
+
+    Returns:
+        ConfigManager: Shared instance for this file
+    """
+    path = os.path.abspath(config_file)
+    with _shared_managers_lock:
+        manager = _shared_managers.get(path)
+        if manager is None:
+            manager = ConfigManager(config_file)
+            _shared_managers[path] = manager
+        return manager
+
+KIT_TYPE_ENV = 'FREENOVE_KIT_TYPE'
+_I2C_SLAVE = 0x0703          # ioctl request from linux/i2c-dev.h
+_OLED_I2C_ADDRESSES = (0x3C, 0x3D)
+
+def _i2c_device_present(address, bus_number=1):
+    """
+    Check whether a device acknowledges its address on an I2C bus
+
+    Returns:
+        bool: True/False, None if the bus itself cannot be opened
+    """
+    try:
+        fd = os.open(f'/dev/i2c-{bus_number}', os.O_RDWR)
+    except OSError:
+        return None
+    try:
+        fcntl.ioctl(fd, _I2C_SLAVE, address)
+        os.read(fd, 1)
+        return True
+    except OSError as e:
+        if e.errno in (errno.ENXIO, errno.EREMOTEIO, errno.EIO):
+            return False
+        if e.errno == errno.EBUSY:
+            return True   # Address is claimed by a kernel driver
+        return None
+    finally:
+        os.close(fd)
+
+def probe_kit_type():
+    """
+    Decide the kit type from the environment and hardware, without user interaction
+
+    Checked in order: the FREENOVE_KIT_TYPE environment variable, the HAT product string
+    in the device tree, then the FNK0108 case OLED on I2C bus 1.
+
+    Returns:
+        tuple: (kit_type, source), kit_type is None when nothing conclusive was found
+    """
+    value = os.environ.get(KIT_TYPE_ENV, '').strip()
+    if value in ('1', '2'):
+        return int(value), 'env'
+
+    try:
+        with open('/proc/device-tree/hat/product', 'rb') as f:
+            product = f.read().decode('ascii', 'ignore').lower()
+        if '0113' in product or 'tower' in product:
+            return 2, 'device-tree'
+        if '0108' in product or 'case' in product:
+            return 1, 'device-tree'
+    except OSError:
+        pass
+
+    # A missing OLED proves nothing (it may simply not be wired yet), only a present one counts
+    if any(_i2c_device_present(address) for address in _OLED_I2C_ADDRESSES):
+        return 1, 'i2c'
+    return None, None
+
+def _diff_config(old, new):
+    """
+    Compare two configuration dicts key by key (nested values compare as a whole)
+
+    Returns:
+        list: (section, key, old_value, new_value) for every changed key
+    """
+    changes = []
+    for section in sorted(set(old) | set(new)):
+        old_section = old.get(section) or {}
+        new_section = new.get(section) or {}
+        for key in sorted(set(old_section) | set(new_section)):
+            if section == 'General' and key == 'config_generation':
+                continue
+            if old_section.get(key) != new_section.get(key):
+                changes.append((section, key, old_section.get(key), new_section.get(key)))
+    return changes
+
+class ConfigTransaction:
+    """Staged (section, key) -> value updates, applied together by ConfigManager.transaction()"""
+    def __init__(self):
+        self.updates = {}
+
+    def set_value(self, section, key, value):
+        """
+        Stage a configuration value
+
+        Args:
+            section (str): Configuration section name
+            key (str): Configuration item name
+            value: Value to set
+        """
+        self.updates[(section, key)] = value
+
+    def set_section(self, section, data):
+        """
+        Stage every key of a configuration section
+
+        Args:
+            section (str): Configuration section name
+            data (dict): Data to set
+        """
+        for key, value in data.items():
+            self.updates[(section, key)] = value
+
+def _merge_config(base, local, current):
+    """
+    Apply the changes made from base to local on top of current
+
+    Keys this process did not change keep the value in current, so a write of another
+    process that happened in between is not undone.
+
+    Args:
+        base (dict): Data last read from or written to the file
+        local (dict): Data in memory
+        current (dict): Data in the file now
+
+    Returns:
+        dict: Merged data, current is modified
+    """
+    for section, key, old_value, new_value in _diff_config(base, local):
+        local_section = local.get(section)
+        if isinstance(local_section, dict) and key in local_section:
+            section_data = current.get(section)
+            if not isinstance(section_data, dict):
+                section_data = current[section] = {}
+            section_data[key] = copy.deepcopy(new_value)
+        elif isinstance(current.get(section), dict):
+            current[section].pop(key, None)
+    # Every transaction counts, whichever process made it
+    generation = lambda data: (data.get('General') or {}).get('config_generation') or 0
+    added = generation(local) - generation(base)
+    if added > 0:
+        current.setdefault('General', {})['config_generation'] = max(generation(current), generation(base)) + added
+    return current
+
+def _freeze(value):
+    """Return a read-only view of nested dicts and lists"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
 
 class ConfigManager:
-    def __init__(self, config_file='app_config.json'):
+    def __init__(self, config_file='app_config.json', write_delay=0.2):
         """
         Initialize configuration manager
+
+        Args:
+            config_file (str): Configuration file path
+            write_delay (float): Window in seconds in which schedule_save() calls are coalesced into one write
         """
         self.config_file = config_file
+        self.lock_file = config_file + '.lock'
+        self.write_delay = write_delay
         self.config_data = {}
         self.lock = threading.Lock() 
+        self._file_signature = None   # (mtime_ns, size) of the file content in config_data
+        self._file_data = {}          # Copy of the data last read or written, save_config() writes the difference
+        self._section_views = {}      # Read-only section views, rebuilt after changes
+        self._typed_sections = {}     # Compiled schema objects, rebuilt after changes
+        self._dirty = False           # In-memory changes waiting for a scheduled write
+        self._save_timer = None
+        self._subscribers = []        # (callback, sections) pairs notified with change lists
+        self._watch_thread = None
+        self._watch_stop = threading.Event()
         self.load_config()
-        if self.get_kit_type() is None:
-            self.query_kit_type()
+        atexit.register(self.flush)
+        general = self.config_data.get('General') or {}
+        if general.get('kit_type') is None or general.get('kit_type_source') == 'default':
+            self.detect_kit_type()   # Guesses are re-probed, hardware may have been connected since
+
+    def _stat_signature(self):
+        """
+        Get a cheap change signature of the configuration file
+
+        Returns:
+            tuple: (mtime_ns, size), None if the file does not exist
+        """
+        try:
+            st = os.stat(self.config_file)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def revalidate(self):
+        """
+        Reload the configuration only if the file changed since it was last read or written
+
+        Returns:
+            bool: True if the configuration was reloaded
+        """
+        if self._dirty:
+            return False  # Pending local changes win until they are written
+        signature = self._stat_signature()
+        if signature is None or signature == self._file_signature:
+            return False
+        old_data = self.config_data
+        self.load_config()
+        if self._subscribers:
+            self._publish(_diff_config(old_data, self.config_data))
+        return True
+
+    def get_generation(self):
+        """
+        Get the configuration generation, incremented by every transaction that changed something
+
+        Returns:
+            int: Generation number, 0 if no transaction was committed yet
+        """
+        return self.get_value('General', 'config_generation') or 0
+
+    @contextmanager
+    def transaction(self, delay=None):
+        """
+        Apply several updates as one change
+
+        All staged values become visible together, both in memory and in the written file,
+        the generation number is incremented once and subscribers get a single change list.
+
+        Args:
+            delay (float): Write delay passed to schedule_save(), defaults to write_delay
+
+        Yields:
+            ConfigTransaction: Collects the updates, nothing is applied if the block raises
+        """
+        self.revalidate()  # Build on top of changes written by other processes
+        staged = ConfigTransaction()
+        yield staged
+        changes = []
+        with self.lock:
+            for (section, key), value in staged.updates.items():
+                section_data = self.config_data.setdefault(section, {})
+                old_value = section_data.get(key)
+                if key in section_data and old_value == value:
+                    continue
+                section_data[key] = value
+                self._invalidate(section)
+                changes.append((section, key, old_value, value))
+            if changes:
+                general = self.config_data.setdefault('General', {})
+                general['config_generation'] = (general.get('config_generation') or 0) + 1
+                self._invalidate('General')
+        if changes:
+            self.schedule_save(delay)
+            self._publish(changes)
+
+    def subscribe(self, callback, sections=None):
+        """
+        Register a callback for configuration changes
+
+        Args:
+            callback: Called with a list of (section, key, old_value, new_value)
+            sections: Iterable of section names to filter on, None for all sections
+
+        Returns:
+            The callback, so it can be passed to unsubscribe()
+        """
+        self._subscribers.append((callback, frozenset(sections) if sections else None))
+        return callback
+
+    def unsubscribe(self, callback):
+        """Remove a callback registered with subscribe()"""
+        self._subscribers = [(cb, sections) for cb, sections in self._subscribers if cb is not callback]
+
+    def _publish(self, changes):
+        for callback, sections in list(self._subscribers):
+            relevant = [c for c in changes if sections is None or c[0] in sections]
+            if not relevant:
+                continue
+            try:
+                callback(relevant)
+            except Exception as e:
+                print(f"Error in configuration change callback: {e}")
+
+    def watch(self, interval=1.0):
+        """
+        Poll the configuration file in a background thread and notify subscribers of external changes
+
+        Each poll is a single stat() call, the file is only parsed when it changed.
+
+        Args:
+            interval (float): Poll interval in seconds
+        """
+        if self._watch_thread is not None:
+            return
+        self._watch_stop.clear()
+
+        def _run():
+            while not self._watch_stop.wait(interval):
+                try:
+                    self.revalidate()
+                except Exception as e:
+                    print(f"Error watching configuration file: {e}")
+
+        self._watch_thread = threading.Thread(target=_run, name="config-watch", daemon=True)
+        self._watch_thread.start()
+
+    def stop_watch(self):
+        """Stop the background thread started by watch()"""
+        if self._watch_thread is None:
+            return
+        self._watch_stop.set()
+        self._watch_thread.join(timeout=2.0)
+        self._watch_thread = None
+
+    @contextmanager
+    def _file_lock(self, operation):
+        """
+        Hold a flock on the stable lockfile next to the configuration file
+
+        The configuration file itself is replaced on every write, so it cannot carry the lock.
+
+        Args:
+            operation: fcntl.LOCK_SH for readers, fcntl.LOCK_EX for writers
+        """
+        try:
+            fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o666)
+        except PermissionError:
+            # Lockfile created by another user, a read-only descriptor can still be locked
+            fd = os.open(self.lock_file, os.O_RDONLY)
+        try:
+            fcntl.flock(fd, operation)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _invalidate(self, section=None):
+        """Drop cached views and compiled objects of one section, or of all sections"""
+        if section is None:
+            self._section_views = {}
+            self._typed_sections = {}
+        else:
+            self._section_views.pop(section, None)
+            self._typed_sections.pop(section, None)
 
     def load_config(self):
         """
         Load configuration data from JSON file with file locking
         """
+        self._invalidate()
+        if not os.path.exists(self.config_file):
+            self.create_config_file()
+            return
         try:
-            if os.path.exists(self.config_file):
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    try:
-                        fcntl.flock(f.fileno(), fcntl.LOCK_SH)  
-                        content = f.read().strip()
-                        if content:  
-                            self.config_data = json.loads(content)
-                        else:  
-                            print(f"Config file {self.config_file} is empty, creating default config")
-                            self.create_config_file()
-                    finally:
-                        fcntl.flock(f.fileno(), fcntl.LOCK_UN) 
+            with self._file_lock(fcntl.LOCK_SH), open(self.config_file, 'r', encoding='utf-8') as f:
+                signature = os.fstat(f.fileno())
+                self._file_signature = (signature.st_mtime_ns, signature.st_size)
+                content = f.read().strip()
+            if content:
+                data = json.loads(content)
             else:
-                self.create_config_file()
+                print(f"Config file {self.config_file} is empty, writing default config")
+                data = {}
         except json.JSONDecodeError as e:
             print(f"JSON decode error in {self.config_file}: {e}")
-            print("Creating default configuration...")
-            self.create_config_file()
+            print(f"Keeping a copy as {self.config_file}.corrupt and writing default config")
+            try:
+                os.replace(self.config_file, self.config_file + '.corrupt')
+            except OSError:
+                pass
+            data = {}
         except Exception as e:
             print(f"Error loading configuration file: {e}")
-            self.create_config_file()
             self.config_data = {}
+            return
+        if not isinstance(data, dict):
+            print(f"Config file {self.config_file} is not a JSON object, writing default config")
+            data = {}
+        self.config_data = data
+        self._file_data = copy.deepcopy(data)
+        # Older files are upgraded once here and rewritten, never patched up on each access
+        if migrate_config(data):
+            print(f"Migrated {self.config_file} to schema version {SCHEMA_VERSION}")
+            self.save_config()
 
-    def save_config(self):
+    def _read_file_data(self):
+        """
+        Read the file as another process left it, only if it changed since our last read or write
+
+        Returns:
+            dict: File data, None if it is unchanged, missing or unreadable
+        """
+        signature = self._stat_signature()
+        if signature is None or signature == self._file_signature:
+            return None
         try:
-            directory = os.path.dirname(self.config_file)
-            if directory:
+            with open(self.config_file, 'r', encoding='utf-8') as f:
+                data = json.loads(f.read() or '{}')
+        except (OSError, ValueError) as e:
+            print(f"Error re-reading configuration file before saving: {e}")
+            return None
+        return data if isinstance(data, dict) else None
+
+    def save_config(self):
+        """
+        Write configuration data to JSON file immediately (atomic replace, fsync'd)
+
+        The file is re-read under the exclusive lock and only the keys changed in this process
+        are written over it, so a concurrent save of another process is kept.
+        """
+        changes = []
+        with self.lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            self._dirty = False
+            try:
+                directory = os.path.dirname(self.config_file) or '.'
                 os.makedirs(directory, exist_ok=True)
-                
-            temp_file = self.config_file + '.tmp'
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                fcntl.flock(f.fileno(), fcntl.LOCK_EX)  
-                json.dump(self.config_data, f, indent=2, ensure_ascii=False)
-            os.rename(temp_file, self.config_file)
-        except Exception as e:
-            print(f"Error saving configuration file: {e}")
+
+                with self._file_lock(fcntl.LOCK_EX):
+                    current = self._read_file_data()
+                    if current is not None:
+                        old_data = self.config_data
+                        self.config_data = _merge_config(self._file_data, old_data, current)
+                        self._invalidate()
+                        changes = _diff_config(old_data, self.config_data)
+                    content = json.dumps(self.config_data, indent=2, ensure_ascii=False)
+                    temp_file = f"{self.config_file}.{os.getpid()}.tmp"
+                    with open(temp_file, 'w', encoding='utf-8') as f:
+                        f.write(content)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(temp_file, self.config_file)
+                    # Make the rename itself durable
+                    dir_fd = os.open(directory, os.O_RDONLY)
+                    try:
+                        os.fsync(dir_fd)
+                    finally:
+                        os.close(dir_fd)
+                    # Our own write must not trigger a reload
+                    self._file_signature = self._stat_signature()
+                    self._file_data = copy.deepcopy(self.config_data)
+            except Exception as e:
+                print(f"Error saving configuration file: {e}")
+        if changes and self._subscribers:
+            self._publish(changes)
+
+    def schedule_save(self, delay=None):
+        """
+        Write configuration data after a short delay, coalescing all changes made in between
+
+        Args:
+            delay (float): Seconds to wait, defaults to write_delay
+        """
+        with self.lock:
+            self._dirty = True
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(self.write_delay if delay is None else delay, self.flush)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def flush(self):
+        """
+        Write pending scheduled changes now, if there are any
+        """
+        if self._dirty:
+            self.save_config()
 
     def get_value(self, section, key):
         """
@@ -70,6 +505,7 @@ class ConfigManager:
         Returns:
             Configuration item value
         """
+        self.revalidate()
         return self.config_data.get(section, {}).get(key, None)
     
     def set_value(self, section, key, value):
@@ -85,6 +521,7 @@ class ConfigManager:
             if section not in self.config_data:
                 self.config_data[section] = {}
             self.config_data[section][key] = value
+            self._invalidate(section)
     
     def get_section(self, section):
         """
@@ -96,8 +533,45 @@ class ConfigManager:
         Returns:
             dict: Configuration section data
         """
+        self.revalidate()
         return self.config_data.get(section, {})
+
+    def get_section_view(self, section):
+        """
+        Get a read-only view of a configuration section
+
+        Args:
+            section (str): Configuration section name
+
+        Returns:
+            Mapping: Read-only section data (nested dicts and lists are read-only too)
+        """
+        self.revalidate()
+        view = self._section_views.get(section)
+        if view is None:
+            view = _freeze(self.config_data.get(section, {}))
+            self._section_views[section] = view
+        return view
     
+    def get_typed_section(self, section):
+        """
+        Get a configuration section compiled into its frozen, validated schema object
+
+        The object is built once per change, so callers can read plain attributes in hot loops.
+
+        Args:
+            section (str): Configuration section name (General, Monitor, LED, Fan or OLED)
+
+        Returns:
+            Schema object from api_config_schema, defaults if the section is invalid
+        """
+        self.revalidate()
+        typed = self._typed_sections.get(section)
+        if typed is None:
+            typed = compile_section(section, self.config_data.get(section))
+            self._typed_sections[section] = typed
+        return typed
+
     def set_section(self, section, data):
         """
         Set entire configuration section
@@ -106,7 +580,9 @@ class ConfigManager:
             section (str): Configuration section name
             data (dict): Data to set
         """
-        self.config_data[section] = data
+        with self.lock:
+            self.config_data[section] = data
+            self._invalidate(section)
     
     def get_all_config(self):
         """
@@ -115,6 +591,7 @@ class ConfigManager:
         Returns:
             dict: All configuration data
         """
+        self.revalidate()
         return self.config_data
     
     def set_all_config(self, config_data):
@@ -125,6 +602,7 @@ class ConfigManager:
             config_data (dict): All configuration data
         """
         self.config_data = config_data
+        self._invalidate()
  
     def delete_config_file(self):
         """ Delete configuration file """
@@ -152,10 +630,39 @@ class ConfigManager:
         self.set_value('General', 'kit_type', kit_type)
         self.save_config()
 
-    def query_kit_type(self):
+    def detect_kit_type(self):
+        """
+        Determine the kit type once and cache it in the configuration
+
+        Hardware probing never blocks. The user is only asked when the probe is inconclusive
+        and a terminal is attached; daemons fall back to FNK0108.
+
+        Returns:
+            int: Kit type (1 or 2)
+        """
+        kit_type, source = probe_kit_type()
+        if kit_type is None and self.get_kit_type() is not None:
+            return self.get_kit_type()   # Still inconclusive, keep the cached guess
+        if kit_type is None and sys.stdin is not None and sys.stdin.isatty():
+            kit_type, source = self.query_kit_type(save=False), 'user'
+        if kit_type is None:
+            kit_type, source = 1, 'default'
+            print(f"Kit type could not be detected, assuming FNK0108 (set {KIT_TYPE_ENV}=2 for FNK0113)")
+        with self.lock:
+            general = self.config_data.setdefault('General', {})
+            general['kit_type'] = kit_type
+            general['kit_type_source'] = source
+            self._invalidate('General')
+        self.save_config()
+        return kit_type
+
+    def query_kit_type(self, save=True):
         """
         Query user about which kit they have and save to configuration
         
+        Args:
+            save (bool): Save the selection to the configuration file
+
         Returns:
             int: Selected kit type (1 or 2)
         """
@@ -184,60 +691,16 @@ class ConfigManager:
         print(f"You selected: {kit_name}")
         
         # Save the selection to the configuration
-        self.set_kit_type(kit_type)
+        if save:
+            self.set_kit_type(kit_type)
         
         return kit_type
 
     def create_config_file(self):
-        # Initialize default values based on actual usage in app_ui.py
-        led_mode_default = 0
-        fan_mode_default = 2
         try:
             if not os.path.exists(self.config_file):
-                self.config_data = {
-                    "General": {
-                        "kit_type": None  # Add kit type configuration
-                    },
-                    "Monitor": {
-                        "screen_orientation": 0
-                    },
-                    "LED": {
-                        "mode": led_mode_default,
-                        "red_value": 0,
-                        "green_value": 0,
-                        "blue_value": 255,
-                        "brightness": 255
-                    },
-                    "Fan": {
-                        "mode": fan_mode_default,
-                        "manual_mode_duty": 255,
-                        "temp_mode_config": {
-                            "fan_temp_threshold_low": 45,
-                            "fan_temp_threshold_high": 80,
-                            "fan_temp_threshold_hyst": 3,
-                            "fan_temp_mode_duty_low": 50,
-                            "fan_temp_mode_duty_high": 200
-                        }
-                    },
-                    "OLED": {
-                        "screen1": {
-                            "data_format": 0,
-                            "time_format": 0,
-                            "display_time": 3.0,
-                            "is_run_on_oled": True
-                        },
-                        "screen2": {
-                            "interchange": 0,
-                            "display_time": 3.0,
-                            "is_run_on_oled": True
-                        },
-                        "screen3": {
-                            "interchange": 0,
-                            "display_time": 3.0,
-                            "is_run_on_oled": True
-                        }
-                    }
-                }
+                # Defaults are declared once, in api_config_schema
+                self.config_data = default_config_dict()
                 self.save_config()
             else:
                 print(f"Configuration file already exists: {self.config_file}")
@@ -252,7 +715,8 @@ class ConfigManager:
 
     def end(self):
         """End method to clean up resources"""
-        pass
+        self.stop_watch()
+        self.flush()
 
 
 if __name__ == '__main__':
@@ -1,19 +1,196 @@
 from luma.core.interface.serial import i2c
 from luma.oled.device import ssd1306
-from PIL import Image, ImageDraw, ImageFont, ImageSequence
+from PIL import Image, ImageDraw, ImageFont
 import time
 import os
-import shutil
+from collections import OrderedDict
 import math
+import threading
+
+class DisplayWriter:
+    def __init__(self, write_frame):
+        """
+        Background I2C writer with a single-slot mailbox
+        The renderer publishes frames without waiting for the bus; if the bus is slower
+        than the renderer, a pending frame that was never sent is replaced by the newer one.
+        Args:
+            write_frame: Function that transmits one frame to the display
+        """
+        self.write_frame = write_frame
+        self._condition = threading.Condition()
+        self._pending = None
+        self._pending_time = 0.0
+        self._running = False
+        self._thread = None
+        self._write_started = None    # monotonic() start of the transfer in progress, None when idle
+
+        # Statistics
+        self.frames_published = 0
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.write_errors = 0
+        self.last_transfer_time = 0.0
+        self.max_transfer_time = 0.0
+        self.total_transfer_time = 0.0
+        self.max_queue_time = 0.0
+
+    def start(self):
+        """
+        Start the writer thread
+        """
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="oled-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        """
+        Stop the writer thread after the pending frame (if any) is written
+        Args:
+            timeout: Maximum time to wait for the thread, in seconds
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def publish(self, frame):
+        """
+        Publish the latest frame, replacing a pending frame that was not sent yet
+        Args:
+            frame: Frame object passed to write_frame; must not be modified afterwards
+        """
+        with self._condition:
+            if self._pending is not None:
+                self.frames_dropped += 1
+            self._pending = frame
+            self._pending_time = time.monotonic()
+            self.frames_published += 1
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and self._running:
+                    self._condition.wait()
+                if self._pending is None:
+                    return
+                frame = self._pending
+                published_time = self._pending_time
+                self._pending = None
+
+            start = time.monotonic()
+            self._write_started = start
+            try:
+                self.write_frame(frame)
+                self.frames_written += 1
+            except Exception as e:
+                self.write_errors += 1
+                print(f"OLED write error: {e}")
+            end = time.monotonic()
+            self._write_started = None
+
+            self.last_transfer_time = end - start
+            self.total_transfer_time += self.last_transfer_time
+            self.max_transfer_time = max(self.max_transfer_time, self.last_transfer_time)
+            self.max_queue_time = max(self.max_queue_time, start - published_time)
+
+    def get_busy_time(self):
+        """
+        Get how long the transfer in progress has been running
+        Returns:
+            float: Seconds, 0.0 when the writer is idle
+        """
+        started = self._write_started
+        return 0.0 if started is None else time.monotonic() - started
+
+    def get_stats(self):
+        """
+        Get writer statistics
+        Returns:
+            dict: Frame counters and transfer latencies in milliseconds
+        """
+        average = self.total_transfer_time / self.frames_written if self.frames_written else 0.0
+        return {
+            "frames_published": self.frames_published,
+            "frames_written": self.frames_written,
+            "frames_dropped": self.frames_dropped,
+            "write_errors": self.write_errors,
+            "last_transfer_ms": round(self.last_transfer_time * 1000, 3),
+            "avg_transfer_ms": round(average * 1000, 3),
+            "max_transfer_ms": round(self.max_transfer_time * 1000, 3),
+            "max_queue_ms": round(self.max_queue_time * 1000, 3)
+        }
+
+class AnimationCache:
+    def __init__(self, max_bytes=512 * 1024):
+        """
+        LRU cache of decoded animations, bounded by the size of their packed frame data
+        Args:
+            max_bytes: Byte budget for all cached frames, default is 512 KB
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def _entry_size(self, frames):
+        return sum(len(frame[0]) for frame in frames)
+
+    def get(self, key):
+        """
+        Get cached frames
+        Args:
+            key: Cache key
+        Returns:
+            Cached frames, None if not cached
+        """
+        frames = self._entries.get(key)
+        if frames is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return frames
+
+    def put(self, key, frames):
+        """
+        Cache frames, evicting the least recently used animations to stay within the budget
+        Args:
+            key: Cache key
+            frames: List of (packed_bytes, size, delay)
+        """
+        size = self._entry_size(frames)
+        if size > self.max_bytes:
+            return  # Too large to cache, it will simply be decoded again
+        if key in self._entries:
+            self.current_bytes -= self._entry_size(self._entries.pop(key))
+        while self._entries and self.current_bytes + size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.current_bytes -= self._entry_size(evicted)
+        self._entries[key] = frames
+        self.current_bytes += size
+
+    def clear(self):
+        """
+        Remove all cached animations
+        """
+        self._entries.clear()
+        self.current_bytes = 0
 
 class OLED:
-    def __init__(self, bus_number=1, i2c_address=0x3C, rotate_angle=0):
+    def __init__(self, bus_number=1, i2c_address=0x3C, rotate_angle=0, async_display=False):
         """
         Initialize OLED display
         Args:
             bus_number: I2C bus number, default is 1
             i2c_address: I2C device address, default is 0x3C
             rotate_angle: Rotation angle, optional 0, 90, 180, 270, default is 0
+            async_display: Transfer frames from a background writer thread, default is False
         """
         # Initialize I2C interface and OLED display
         self.bus_number = bus_number
@@ -31,6 +208,15 @@ class OLED:
         self.default_font_size = 16
         self.font = ImageFont.load_default()
 
+        # Decoded GIF frames, reused across playbacks
+        self.animation_cache = AnimationCache()
+
+        # Optional double-buffered display pipeline
+        self.writer = None
+        if async_display:
+            self.writer = DisplayWriter(self._write_frame)
+            self.writer.start()
+
     def _angle_to_rotate_param(self, angle):
         """
         Convert angle to rotation parameter required by luma.oled library
@@ -66,11 +252,41 @@ class OLED:
         # Recreate buffer to match new dimensions
         self._create_buffer()
 
+    def _write_frame(self, frame):
+        """
+        Transmit one frame (PIL image) to the device
+        """
+        self.device.display(frame)
+
     def show(self):
         """
         Display buffer content on OLED screen
         """
-        self.device.display(self.buffer)
+        if self.writer is not None:
+            # Hand a snapshot to the writer thread, drawing may continue on self.buffer
+            self.writer.publish(self.buffer.copy())
+        else:
+            self.device.display(self.buffer)
+
+    def get_display_stats(self):
+        """
+        Get asynchronous display statistics
+        Returns:
+            dict: Writer statistics, None when the display is synchronous
+        """
+        if self.writer is None:
+            return None
+        return self.writer.get_stats()
+
+    def get_display_busy_time(self):
+        """
+        Get how long the current I2C transfer has been running, used to detect a wedged bus
+        Returns:
+            float: Seconds, always 0.0 when the display is synchronous (a stall then blocks the caller)
+        """
+        if self.writer is None:
+            return 0.0
+        return self.writer.get_busy_time()
 
     def clear(self):
         """
@@ -82,7 +298,10 @@ class OLED:
         """
         Close I2C bus
         """
-        pass  # luma.oled library doesn't require explicit I2C bus closing
+        # Let the writer thread finish the last frame; luma.oled doesn't require explicit I2C bus closing
+        if self.writer is not None:
+            self.writer.stop()
+            self.writer = None
 
     def draw_point(self, xy, fill=None):
         """
@@ -221,106 +440,96 @@ class OLED:
         except Exception as e:
             print(f"Error displaying image: {e}")
    
+    def _scaled_size(self, width, height, box):
+        """
+        Scale (width, height) proportionally to fit inside box (width, height)
+        """
+        box_width, box_height = box
+        frame_ratio = width / height
+        box_ratio = box_width / box_height
+        if frame_ratio > box_ratio:
+            # Scale by width
+            return box_width, int(box_width / frame_ratio)
+        # Scale by height
+        return int(box_height * frame_ratio), box_height
+
+    def _decode_gif(self, gif_path, resize, center):
+        """
+        Decode, resize and dither all GIF frames into packed 1-bit buffers
+        Returns:
+            list: (packed_bytes, (width, height), delay) for each frame
+        """
+        from PIL import ImageSequence  # GIF support is only loaded when an animation is played
+        frames = []
+        with Image.open(gif_path) as gif:
+            for frame in ImageSequence.Iterator(gif):
+                delay = frame.info.get('duration', 100) / 1000.0
+                width, height = frame.size
+                frame = frame.convert('L')
+
+                # Process image dimensions - scale proportionally
+                if resize is not None:
+                    frame = frame.resize(self._scaled_size(width, height, resize), Image.LANCZOS)
+                elif not center:
+                    # Only scale to screen size when not centering and no resize specified
+                    frame = frame.resize(self._scaled_size(width, height, (self.device.width, self.device.height)), Image.LANCZOS)
+
+                # Dither after scaling, then keep only the packed bits
+                frame = frame.convert('1')
+                frames.append((frame.tobytes(), frame.size, delay))
+        return frames
+
     def draw_gif(self, gif_path, position=(0, 0), resize=None, center=True):
         """
         Display GIF animation
+        Decoded frames are kept in self.animation_cache, so replaying a GIF does not decode it again
         Args:
             gif_path: GIF file path
             position: GIF display position (x, y)
             resize: Resize GIF (width, height)
             center: Whether to center display
         """
-        temp_folder = "temp"
-        if not os.path.exists(temp_folder):
-            os.makedirs(temp_folder)
         try:
-            gif = Image.open(gif_path)
-            frames = []
-            frame_delays = []
-            for frame in ImageSequence.Iterator(gif):
-                delay = frame.info.get('duration', 100) / 1000.0
-                frame_delays.append(delay)
-                width, height = frame.size
-                
-                # Convert frame to monochrome image
-                frame = frame.convert('L').convert('1')
-                
-                # Process image dimensions - scale proportionally
-                if resize is not None:
-                    # Scale image proportionally
-                    target_width, target_height = resize
-                    frame_ratio = width / height
-                    target_ratio = target_width / target_height
-                    
-                    if frame_ratio > target_ratio:
-                        # Scale by width
-                        new_width = target_width
-                        new_height = int(target_width / frame_ratio)
-                    else:
-                        # Scale by height
-                        new_height = target_height
-                        new_width = int(target_height * frame_ratio)
-                    
-                    frame = frame.resize((new_width, new_height), Image.LANCZOS)
-                elif not center:
-                    # Only scale to screen size when not centering and no resize specified
-                    screen_width, screen_height = self.device.width, self.device.height
-                    frame_ratio = width / height
-                    screen_ratio = screen_width / screen_height
-                    
-                    if frame_ratio > screen_ratio:
-                        # Scale by width
-                        new_width = screen_width
-                        new_height = int(screen_width / frame_ratio)
-                    else:
-                        # Scale by height
-                        new_height = screen_height
-                        new_width = int(screen_height * frame_ratio)
-                    
-                    frame = frame.resize((new_width, new_height), Image.LANCZOS)
-                
-                frame_path = os.path.join(temp_folder, f"frame_{len(frames)}.png")
-                frame.save(frame_path)
-                frames.append(frame_path)
-                
-            # Display each frame
-            for frame_path, delay in zip(frames, frame_delays):
+            stat = os.stat(gif_path)
+            resize_key = tuple(resize) if resize is not None else None
+            key = (os.path.abspath(gif_path), stat.st_mtime_ns, stat.st_size, resize_key, center,
+                   self.device.width, self.device.height)
+            frames = self.animation_cache.get(key)
+            if frames is None:
+                frames = self._decode_gif(gif_path, resize, center)
+                self.animation_cache.put(key, frames)
+
+            # Display each frame on a fixed schedule, so drawing time does not stretch the animation
+            next_frame_time = time.monotonic()
+            for data, size, delay in frames:
                 # Clear buffer
                 self.clear()
-                
-                # Load frame image
-                frame_image = Image.open(frame_path).convert('1')
-                frame_width, frame_height = frame_image.size
-                
+                frame_image = Image.frombytes('1', size, data)
+
                 # Calculate display position
                 if center:
                     # Center display
-                    x = (self.device.width - frame_width) // 2
-                    y = (self.device.height - frame_height) // 2
+                    x = (self.device.width - size[0]) // 2
+                    y = (self.device.height - size[1]) // 2
                     display_position = (x, y)
                 else:
                     # Use specified position
                     display_position = position
-                    
+
                 # Paste image to buffer
                 self.buffer.paste(frame_image, display_position)
-                
+
                 # Display
                 self.show()
-                
-                # Delay
-                if delay > 0.02:  # Minimum delay 0.02 seconds
-                    time.sleep(delay)
-                else:
-                    time.sleep(0.1)
-                    
+
+                # Delay, minimum delay 0.02 seconds
+                next_frame_time += delay if delay > 0.02 else 0.1
+                time.sleep(max(0.0, next_frame_time - time.monotonic()))
+
         except FileNotFoundError:
             print(f"Error: File not found - {gif_path}")
         except Exception as e:
             print(f"Error displaying GIF: {e}")
-        finally:
-            if os.path.exists(temp_folder):
-                shutil.rmtree(temp_folder)
 
     def save_buffer_to_image(self, image_path="saved_image.png"):
         """
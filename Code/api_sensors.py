@@ -0,0 +1,356 @@
+# api_sensors.py
+import os
+import glob
+import json
+import time
+
+THERMAL_ROOT = '/sys/class/thermal'
+HWMON_ROOT = '/sys/class/hwmon'
+CPU_SENSOR = 'thermal_zone0'
+
+# Firmware throttle state (vcgencmd get_throttled), soc:firmware on the Pi 4, soc@107c000000:firmware on the Pi 5
+THROTTLED_PATTERN = '/sys/devices/platform/soc*/soc*:firmware/get_throttled'
+CPUFREQ_DIR = '/sys/devices/system/cpu/cpu0/cpufreq'
+UNDER_VOLTAGE = 0x1      # Under-voltage now
+FREQ_CAPPED = 0x2        # ARM frequency capped now
+THROTTLED = 0x4          # Throttled now
+SOFT_TEMP_LIMIT = 0x8    # Soft temperature limit active now
+
+
+def _read_text(path):
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def _hwmon_device(hwmon):
+    """Resolved device path of a hwmon chip, stable across boots unlike the hwmonN number"""
+    device = os.path.join(hwmon, 'device')
+    return os.path.realpath(device if os.path.exists(device) else hwmon)
+
+def discover_sensors(thermal_root=THERMAL_ROOT, hwmon_root=HWMON_ROOT):
+    """
+    Find every temperature node of the system
+
+    Thermal zones keep their directory name as id (thermal_zone0 is the CPU), hwmon inputs are named
+    after the chip because the hwmon numbering changes between boots (e.g. "nvme/temp1"). Chips with
+    the same name are numbered in the order of their device paths ("nvme#2/temp1"), not of hwmonN.
+
+    Returns:
+        list: One dict per sensor with id, path and label, hwmon sensors also with their device path
+    """
+    sensors = []
+    for zone in sorted(glob.glob(os.path.join(thermal_root, 'thermal_zone*'))):
+        path = os.path.join(zone, 'temp')
+        if os.path.exists(path):
+            zone_name = os.path.basename(zone)
+            sensors.append({'id': zone_name, 'path': path, 'label': _read_text(os.path.join(zone, 'type')) or zone_name})
+
+    ids = {sensor['id'] for sensor in sensors}
+    for hwmon in sorted(glob.glob(os.path.join(hwmon_root, 'hwmon*')), key=_hwmon_device):
+        chip = _read_text(os.path.join(hwmon, 'name')) or os.path.basename(hwmon)
+        device = _hwmon_device(hwmon)
+        for path in sorted(glob.glob(os.path.join(hwmon, 'temp*_input'))):
+            channel = os.path.basename(path)[:-len('_input')]
+            sensor_id = f"{chip}/{channel}"
+            suffix = 2
+            while sensor_id in ids:  # Two chips with the same name, e.g. two NVMe drives
+                sensor_id = f"{chip}#{suffix}/{channel}"
+                suffix += 1
+            ids.add(sensor_id)
+            label = _read_text(os.path.join(hwmon, f"{channel}_label"))
+            sensors.append({'id': sensor_id, 'path': path, 'label': f"{chip} {label}" if label else sensor_id,
+                            'device': device})
+    return sensors
+
+def _cached_sensor_matches(sensor):
+    """
+    Check that a cached path still belongs to the cached sensor
+
+    hwmonN and thermal_zoneN numbers can change between boots, then the cached path opens fine
+    but reads another chip. The chip name and device path of hwmon sensors, and the type of
+    thermal zones, must still be the ones that were discovered.
+    """
+    directory = os.path.dirname(sensor['path'])
+    if '/' not in sensor['id']:
+        return (_read_text(os.path.join(directory, 'type')) or sensor['id']) == sensor['label']
+    chip = sensor['id'].split('/')[0].split('#')[0]
+    return ((_read_text(os.path.join(directory, 'name')) or os.path.basename(directory)) == chip
+            and sensor.get('device') == _hwmon_device(directory))
+
+
+class SensorRegistry:
+    def __init__(self, cache_file=None, thermal_root=THERMAL_ROOT, hwmon_root=HWMON_ROOT):
+        """
+        Temperature sensors of the system with their files kept open
+
+        A read is a single pread() at offset 0 on the open descriptor, sysfs regenerates the
+        value on every read from offset 0, so no open/close per tick. The discovered sensors
+        are cached in cache_file; a restart only rescans when a cached node is gone or now
+        belongs to another chip.
+
+        Args:
+            cache_file: JSON file of the discovered sensors, None to always scan
+            thermal_root: Directory of the thermal zones
+            hwmon_root: Directory of the hwmon chips
+        """
+        self.cache_file = cache_file
+        self.thermal_root = thermal_root
+        self.hwmon_root = hwmon_root
+        self.sensors = {}        # id -> {'path', 'label', 'device' (hwmon only)}
+        self.fds = {}            # id -> open file descriptor
+        self.failed = set()      # Ids whose last read failed, reported once
+        if not self.load_cache():
+            self.rediscover()
+
+    def load_cache(self):
+        """
+        Open the sensors listed in cache_file
+
+        Returns:
+            bool: True if every cached sensor still belongs to its chip and could be opened
+        """
+        if self.cache_file is None:
+            return False
+        try:
+            with open(self.cache_file, 'r') as f:
+                sensors = json.load(f)['sensors']
+            sensors = [dict(s, id=str(s['id']), path=str(s['path']), label=str(s['label'])) for s in sensors]
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Ignoring sensor cache {self.cache_file}: {e}")
+            return False
+        if not sensors or not all(_cached_sensor_matches(sensor) for sensor in sensors):
+            return False
+        return self._open(sensors)
+
+    def save_cache(self):
+        """Write the open sensors to cache_file (atomic replace)"""
+        if self.cache_file is None:
+            return
+        try:
+            temp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+            with open(temp_file, 'w') as f:
+                json.dump({'sensors': [dict(sensor, id=sensor_id) for sensor_id, sensor in self.sensors.items()]}, f)
+            os.replace(temp_file, self.cache_file)
+        except OSError as e:
+            print(f"Error saving sensor cache: {e}")
+
+    def rediscover(self):
+        """Scan sysfs again, e.g. when a configured sensor was not found, and update the cache"""
+        self._open(discover_sensors(self.thermal_root, self.hwmon_root))
+        self.save_cache()
+
+    def _open(self, sensors):
+        self.close()
+        complete = True
+        for sensor in sensors:
+            try:
+                self.fds[sensor['id']] = os.open(sensor['path'], os.O_RDONLY | os.O_CLOEXEC)
+                self.sensors[sensor['id']] = {key: value for key, value in sensor.items() if key != 'id'}
+            except OSError:
+                complete = False
+        return complete
+
+    def read(self, sensor_id):
+        """
+        Read one sensor
+
+        Args:
+            sensor_id: Sensor id, see discover_sensors
+
+        Returns:
+            float: Temperature in °C, None if the sensor is unknown or the read failed
+        """
+        fd = self.fds.get(sensor_id)
+        if fd is None:
+            return None
+        try:
+            value = int(os.pread(fd, 32, 0)) / 1000.0
+            self.failed.discard(sensor_id)
+            return value
+        except (OSError, ValueError) as e:
+            # Drives in standby or unplugged HATs fail reads, keep the descriptor and try again next time
+            if sensor_id not in self.failed:
+                print(f"Error reading sensor {sensor_id}: {e}")
+                self.failed.add(sensor_id)
+            return None
+
+    def read_all(self, sensor_ids=None):
+        """
+        Read several sensors
+
+        Args:
+            sensor_ids: Ids to read, None for every sensor
+
+        Returns:
+            dict: Sensor id -> °C, failed reads are left out
+        """
+        temperatures = {}
+        for sensor_id in (self.fds if sensor_ids is None else sensor_ids):
+            value = self.read(sensor_id)
+            if value is not None:
+                temperatures[sensor_id] = value
+        return temperatures
+
+    def close(self):
+        for fd in self.fds.values():
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self.fds = {}
+        self.sensors = {}
+
+
+def find_throttled_file(pattern=THROTTLED_PATTERN):
+    """Path of the firmware get_throttled node, None if the kernel does not expose it"""
+    paths = sorted(glob.glob(pattern))
+    return paths[0] if paths else None
+
+def find_under_voltage_alarm(hwmon_root=HWMON_ROOT):
+    """Path of the under-voltage alarm of the rpi_volt hwmon chip, None if there is none"""
+    for hwmon in sorted(glob.glob(os.path.join(hwmon_root, 'hwmon*'))):
+        path = os.path.join(hwmon, 'in0_lcrit_alarm')
+        if _read_text(os.path.join(hwmon, 'name')) == 'rpi_volt' and os.path.exists(path):
+            return path
+    return None
+
+def is_thermally_limited(state):
+    """
+    Check whether a throttle state means the cooling is not enough
+
+    Frequency capping and throttling also happen on under-voltage, a faster fan does not help
+    (and draws more current) then, so those bits only count without under-voltage.
+
+    Args:
+        state: get_throttled bit mask
+
+    Returns:
+        bool
+    """
+    if state & SOFT_TEMP_LIMIT:
+        return True
+    return bool(state & (FREQ_CAPPED | THROTTLED)) and not state & UNDER_VOLTAGE
+
+
+class ThrottleMonitor:
+    def __init__(self, throttled_file=None, under_voltage_file=None, cpufreq_dir=CPUFREQ_DIR):
+        """
+        Follow firmware throttling, under-voltage and the CPU frequency
+
+        The nodes are opened once and re-read with pread, an update costs two or three small reads.
+        Without get_throttled, the rpi_volt under-voltage alarm is used and only under-voltage is known.
+
+        Args:
+            throttled_file: get_throttled node, None to search it
+            under_voltage_file: Under-voltage alarm, None to search it (only used without get_throttled)
+            cpufreq_dir: cpufreq directory of a CPU, scaling_cur_freq and cpuinfo_max_freq are read from it
+        """
+        self.throttled_fd = self._open(throttled_file or find_throttled_file())
+        self.under_voltage_fd = None
+        if self.throttled_fd is None:
+            self.under_voltage_fd = self._open(under_voltage_file or find_under_voltage_alarm())
+        self.freq_fd = self._open(os.path.join(cpufreq_dir, 'scaling_cur_freq'))
+        max_freq = _read_text(os.path.join(cpufreq_dir, 'cpuinfo_max_freq'))
+        self.max_freq_mhz = int(max_freq) // 1000 if max_freq and max_freq.isdigit() else None
+        self.state = 0
+        self.freq_mhz = None
+        self.throttle_events = 0        # Onsets of thermal limiting
+        self.under_voltage_events = 0   # Onsets of under-voltage
+        self.limited_at = None          # Monotonic time of the last update that saw thermal limiting
+
+    def _open(self, path):
+        if path is None:
+            return None
+        try:
+            return os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+        except OSError:
+            return None
+
+    def _read_int(self, fd, base=10):
+        try:
+            return int(os.pread(fd, 32, 0), base)
+        except (OSError, ValueError):
+            return None
+
+    @property
+    def available(self):
+        """True if throttling or under-voltage can be read on this system"""
+        return self.throttled_fd is not None or self.under_voltage_fd is not None
+
+    @property
+    def thermally_limited(self):
+        return is_thermally_limited(self.state)
+
+    def update(self, now=None):
+        """
+        Read the current state and count new events
+
+        Returns:
+            bool: True if thermal limiting started with this update
+        """
+        now = time.monotonic() if now is None else now
+        previous = self.state
+        state = None
+        if self.throttled_fd is not None:
+            state = self._read_int(self.throttled_fd, 16)
+        elif self.under_voltage_fd is not None:
+            alarm = self._read_int(self.under_voltage_fd)
+            state = UNDER_VOLTAGE if alarm else 0 if alarm is not None else None
+        if state is not None:
+            self.state = state & 0xF  # Only the "now" bits, the sticky ones are counted here instead
+        if self.freq_fd is not None:
+            freq = self._read_int(self.freq_fd)
+            self.freq_mhz = freq // 1000 if freq is not None else None
+
+        if self.state & UNDER_VOLTAGE and not previous & UNDER_VOLTAGE:
+            self.under_voltage_events += 1
+        onset = self.thermally_limited and not is_thermally_limited(previous)
+        if onset:
+            self.throttle_events += 1
+        if self.thermally_limited:
+            self.limited_at = now
+        return onset
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: throttle_state bit mask, thermally_limited, under_voltage, event counts and CPU frequency in MHz
+        """
+        return {
+            'throttle_state': self.state,
+            'thermally_limited': self.thermally_limited,
+            'under_voltage': bool(self.state & UNDER_VOLTAGE),
+            'throttle_events': self.throttle_events,
+            'under_voltage_events': self.under_voltage_events,
+            'cpu_freq_mhz': self.freq_mhz,
+            'cpu_freq_max_mhz': self.max_freq_mhz,
+        }
+
+    def close(self):
+        for fd in (self.throttled_fd, self.under_voltage_fd, self.freq_fd):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self.throttled_fd = self.under_voltage_fd = self.freq_fd = None
+
+
+if __name__ == "__main__":
+    registry = SensorRegistry()
+    for sensor_id, sensor in registry.sensors.items():
+        print(f"{sensor_id:<24} {sensor['label']:<24} {registry.read(sensor_id)}")
+    start = time.perf_counter()
+    for _ in range(1000):
+        registry.read_all()
+    print(f"read_all: {(time.perf_counter() - start):.3f} ms per call ({len(registry.sensors)} sensors)")
+    registry.close()
+
+    throttle_monitor = ThrottleMonitor()
+    throttle_monitor.update()
+    print(f"Throttle monitor available: {throttle_monitor.available}, {throttle_monitor.get_stats()}")
+    throttle_monitor.close()
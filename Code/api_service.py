@@ -1,13 +1,64 @@
 # api_service.py
 import os
 import sys
-import shutil
+import time
+import glob
+import shlex
 import subprocess
+import threading
+from api_systemd import STATE_DIRECTORY_NAME
+
+PYTHON = '/usr/bin/python3'
+# Root-owned bytecode cache shared by all units (PYTHONPYCACHEPREFIX), nothing is written next to the sources
+PYCACHE_PREFIX = '/var/cache/freenove_computer_case/pycache'
+
+# Module and arguments systemd runs with full privileges ("+") after a unit stopped for any reason,
+# also after SIGKILL, an OOM kill or a watchdog timeout, where the task's own stop() never runs
+STOP_POST_COMMANDS = {
+    'task_fan.service': 'task_fan_watchdog --restore',   # Hand the fan back to the kernel thermal control
+}
+
+# Imports the task and the api_* modules in a child interpreter and prints every Python source that was loaded.
+# Running the imports (instead of static analysis) also covers namespace packages such as luma.
+_IMPORT_CLOSURE_PROBE = """
+import glob, os, sys
+for path in sorted(glob.glob('api_*.py')) + [sys.argv[1]]:
+    try:
+        __import__(os.path.splitext(os.path.basename(path))[0])
+    except BaseException:
+        pass
+for module in list(sys.modules.values()):
+    path = getattr(module, '__file__', None)
+    if path and path.endswith('.py'):
+        print(os.path.abspath(path))
+"""
+
+# Prints the sources whose pyc in PYTHONPYCACHEPREFIX is missing or does not match the source hash.
+# compileall's own skip check compares mtimes, which never matches a checked-hash pyc, so it would rewrite every file.
+_STALE_BYTECODE_PROBE = """
+import importlib.util, sys
+for path in sys.argv[1:]:
+    try:
+        with open(importlib.util.cache_from_source(path, optimization=1), 'rb') as f:
+            header = f.read(16)
+        with open(path, 'rb') as f:
+            source_hash = importlib.util.source_hash(f.read())
+        if (header[:4] == importlib.util.MAGIC_NUMBER and int.from_bytes(header[4:8], 'little') & 1
+                and header[8:16] == source_hash):
+            continue
+    except OSError:
+        pass
+    print(path)
+"""
+
+# Only one compileall run at a time, the fan and its watchdog unit are created by the same click
+_precompile_lock = threading.Lock()
 
 class ServiceGenerator:
-    def __init__(self, filename="task_manager.py", service_name="my_app_running.service"):
+    def __init__(self, filename="task_manager.py", service_name="my_app_running.service", watchdog_sec=10):
         self.filename = filename
         self.service_name = service_name
+        self.watchdog_sec = watchdog_sec  # The task must report progress (WATCHDOG=1) at least this often
         self.current_directory = None
         self.current_username = None
         self.get_current_directory()
@@ -38,35 +89,56 @@ class ServiceGenerator:
             print(f"Error extracting username from directory path: {e}")
             sys.exit(1)
             
-    def create_my_service(self):
-        if "led" in self.service_name.lower():
-            cpu_affinity = 1
-            cpu_priority = 80
-            nice_value = -19
-        elif "fan" in self.service_name.lower():
-            cpu_affinity = 0
-            cpu_priority = 60
-            nice_value = -10
-        else:
-            cpu_affinity = 0
-            cpu_priority = 50
-            nice_value = -15
+    def get_scheduling_directives(self):
+        """
+        Render the [Service] scheduling directives of the profile assigned to this unit (config section Scheduling)
+
+        Returns:
+            str: One directive per line
+        """
+        from api_json import get_config_manager
+        profile = get_config_manager().get_typed_section('Scheduling').get_profile(self.service_name)
+        directives = [f"CPUSchedulingPolicy={profile.policy}", f"Nice={profile.nice}"]
+        if profile.policy in ('fifo', 'rr'):
+            directives.append(f"CPUSchedulingPriority={profile.priority}")
+        if profile.cpu_affinity:
+            directives.append(f"CPUAffinity={profile.cpu_affinity}")
+        if profile.cpu_quota:
+            directives.append(f"CPUQuota={profile.cpu_quota}")
+        if profile.io_scheduling_class:
+            directives.append(f"IOSchedulingClass={profile.io_scheduling_class}")
+        if profile.limit_memlock:
+            directives.append(f"LimitMEMLOCK={profile.limit_memlock}")
+        if profile.mlockall:
+            directives.append("Environment=FREENOVE_MLOCKALL=1")
+        return "\n".join(directives)
 
+    def get_stop_post_directives(self):
+        """Render the ExecStopPost directive of this unit, empty if it has no STOP_POST_COMMANDS entry"""
+        command = STOP_POST_COMMANDS.get(self.service_name)
+        if command is None:
+            return ""
+        return f"ExecStopPost=+{PYTHON} -O -m {command}"
+
+    def create_my_service(self):
         service_content = f"""[Unit]
 Description=My Python Script Service
 
 [Service]
-ExecStart=/usr/bin/python3 {self.current_directory}/{self.filename}
+Type=notify
+NotifyAccess=main
+WatchdogSec={self.watchdog_sec}
+TimeoutStartSec=30
+ExecStart={PYTHON} -O -m {self.get_module_name()}
+{self.get_stop_post_directives()}
 WorkingDirectory={self.current_directory}
+StateDirectory={STATE_DIRECTORY_NAME}
+Environment=PYTHONPYCACHEPREFIX={PYCACHE_PREFIX}
 StandardOutput=inherit
 StandardError=inherit
 Restart=always
 User={self.current_username}
-Nice={nice_value}
-CPUSchedulingPolicy=rr
-CPUSchedulingPriority={cpu_priority}
-MemoryLock=yes
-CPUAffinity={cpu_affinity}
+{self.get_scheduling_directives()}
 
 [Install]
 WantedBy=multi-user.target
@@ -91,7 +163,7 @@ WantedBy=multi-user.target
         service_file_path = os.path.join('/etc/systemd/system/', self.service_name)
         return os.path.exists(service_file_path)
     
-    def run_system_command(self, command):
+    def run_system_command(self, command, timeout=30):
         """Execute system command and return detailed result object"""
         try:
             result = subprocess.run(
@@ -100,7 +172,7 @@ WantedBy=multi-user.target
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 text=True,
-                timeout=30 
+                timeout=timeout
             )
             return result
         except subprocess.TimeoutExpired as e:
@@ -120,23 +192,119 @@ WantedBy=multi-user.target
                     self.args = command
             return MockResult()
             
-    def remove_pycache_folder(self):
-        """Remove __pycache__ folder"""
-        pycache_path = os.path.join(self.current_directory, '__pycache__')
-        if os.path.exists(pycache_path):
-            try:
-                shutil.rmtree(pycache_path)
-            except Exception as e:
-                print(f"Error removing __pycache__ folder: {e}")
-                sys.exit(1)
+    def get_module_name(self):
+        """Get the module name of the target file, the unit runs it with python -m so it is loaded from bytecode too"""
+        return os.path.splitext(os.path.basename(self.filename))[0]
+
+    def get_import_closure(self):
+        """
+        Get the Python source files the task imports (its own modules, third-party packages and stdlib)
+
+        Returns:
+            list: Absolute source paths, empty if the probe failed
+        """
+        result = self.run_system_command(
+            f"{PYTHON} -O -c {shlex.quote(_IMPORT_CLOSURE_PROBE)} {shlex.quote(self.filename)}", timeout=120)
+        if result.returncode != 0:
+            print(f"Error collecting imports of {self.filename}: {result.stderr}")
+            return []
+        return sorted(set(line for line in result.stdout.splitlines() if line.startswith('/')))
+
+    def get_stale_sources(self, paths):
+        """
+        Filter the sources whose pyc in PYCACHE_PREFIX is missing or was compiled from another version of the file
+
+        Args:
+            paths: Absolute source paths
+
+        Returns:
+            list: Paths that need compiling, all of them if the probe failed
+        """
+        if not paths:
+            return []
+        result = self.run_system_command(
+            f"env PYTHONPYCACHEPREFIX={PYCACHE_PREFIX} {PYTHON} -O -c {shlex.quote(_STALE_BYTECODE_PROBE)} "
+            f"{' '.join(shlex.quote(p) for p in paths)}", timeout=120)
+        if result.returncode != 0:
+            print(f"Error checking bytecode of {self.filename}: {result.stderr}")
+            return list(paths)
+        return [line for line in result.stdout.splitlines() if line.startswith('/')]
+
+    def precompile_bytecode(self):
+        """
+        Compile the task, the sources next to it and everything it imports into PYCACHE_PREFIX
+
+        Optimization level 1 matches the units' python -O, and checked-hash pycs are validated
+        against the source on every import, so an edited file can never run from a stale cache.
+        Only files whose pyc does not match the source hash are passed to compileall, so
+        repeated calls cost the import probe and one hash per file.
+
+        Returns:
+            Result of the compileall command, None if every file was up to date
+        """
+        paths = self.get_import_closure()
+        paths += glob.glob(os.path.join(self.current_directory, '*.py'))
+        stale = self.get_stale_sources(sorted(set(paths)))
+        if not stale:
+            return None
+        command = (f"sudo env PYTHONPYCACHEPREFIX={PYCACHE_PREFIX} {PYTHON} -m compileall -q -o 1 "
+                   f"--invalidation-mode checked-hash {' '.join(shlex.quote(p) for p in stale)}")
+        result = self.run_system_command(command, timeout=600)
+        if result.returncode != 0:
+            print(f"Error precompiling bytecode: {result.stderr}")
+        return result
+
+    def precompile_bytecode_in_background(self):
+        """
+        Run precompile_bytecode in a daemon thread, so the UI click handlers that create units return at once
+
+        A unit started before the compile finished imports from source once, the next start uses the cache.
+
+        Returns:
+            threading.Thread: The started thread
+        """
+        def _run():
+            with _precompile_lock:
+                try:
+                    self.precompile_bytecode()
+                except Exception as e:
+                    print(f"Error precompiling bytecode: {e}")
+        thread = threading.Thread(target=_run, name=f"precompile-{self.get_module_name()}", daemon=True)
+        thread.start()
+        return thread
+
+    def benchmark_cold_start(self, runs=5):
+        """
+        Measure how long importing the task takes, without a bytecode cache and with PYCACHE_PREFIX
+
+        Args:
+            runs: Number of interpreter starts per case
+
+        Returns:
+            dict: Median seconds for 'source' (compiled on every start) and 'precompiled'
+        """
+        command = f"{PYTHON} -O -c {shlex.quote('import ' + self.get_module_name())}"
+        cases = {
+            'source': f"PYTHONDONTWRITEBYTECODE=1 PYTHONPYCACHEPREFIX=/nonexistent {command}",
+            'precompiled': f"PYTHONPYCACHEPREFIX={PYCACHE_PREFIX} {command}",
+        }
+        results = {}
+        for name, case in cases.items():
+            samples = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                self.run_system_command(case)
+                samples.append(time.perf_counter() - start)
+            results[name] = sorted(samples)[len(samples) // 2]
+        return results
               
     def create_service_on_rpi(self):
-        """Run service on Raspberry Pi - Optimized version"""
+        """Run service on Raspberry Pi - Optimized version, the bytecode is compiled in the background"""
         self.check_target_py()  
+        self.precompile_bytecode_in_background()
         self.create_my_service()    
         reload_result = self.run_system_command("sudo systemctl daemon-reload")
         enable_result = self.run_system_command(f"sudo systemctl enable --now {self.service_name}")
-        self.remove_pycache_folder()
         return {
             'reload_result': reload_result,
             'enable_result': enable_result
@@ -190,7 +358,8 @@ WantedBy=multi-user.target
         # Step 3: Extract username from directory
         self.get_current_username_from_directory(self.current_directory)
         
-        # Step 4: Create service file
+        # Step 4: Precompile the task and its imports, then create service file
+        self.precompile_bytecode()
         self.create_my_service()
         
         # Step 5: Run systemctl daemon-reload
@@ -199,9 +368,6 @@ WantedBy=multi-user.target
         # Step 6: Enable service with --now flag to also start it
         self.run_system_command(f"sudo systemctl enable --now {self.service_name}")
         
-        # Remove __pycache__ folder
-        self.remove_pycache_folder()
-        
         # Output shortcut command tips
         self.print_shortcut_commands()
         
@@ -219,7 +385,16 @@ WantedBy=multi-user.target
 
 # Usage example
 if __name__ == "__main__":
+    if '--benchmark' in sys.argv:
+        for filename, service_name in (("task_led.py", "task_led.service"), ("task_fan.py", "task_fan.service"), ("task_oled.py", "task_oled.service")):
+            generator = ServiceGenerator(filename, service_name)
+            generator.precompile_bytecode()
+            results = generator.benchmark_cold_start()
+            print(f"{filename}: from source {results['source'] * 1000:.0f} ms, precompiled {results['precompiled'] * 1000:.0f} ms")
+        sys.exit(0)
     generator_led = ServiceGenerator("task_led.py", "task_led.service")
     generator_led.generate_and_run_service()
     generator_fan = ServiceGenerator("task_fan.py", "task_fan.service")
     generator_fan.generate_and_run_service()
+    generator_fan_watchdog = ServiceGenerator("task_fan_watchdog.py", "task_fan_watchdog.service")
+    generator_fan_watchdog.generate_and_run_service()
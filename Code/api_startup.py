@@ -0,0 +1,148 @@
+# api_startup.py
+import os
+import sys
+import time
+
+PROFILE_ENV = 'FREENOVE_STARTUP_PROFILE'
+PROFILE_FLAG = '--profile-startup'
+
+
+def _process_age():
+    """Seconds since the kernel started this process (includes interpreter startup), None if unknown"""
+    try:
+        with open('/proc/self/stat', 'rb') as f:
+            stat = f.read()
+        # Field 22 is the start time in clock ticks after boot; skip the command name, it may contain spaces
+        start_ticks = int(stat[stat.rindex(b')') + 2:].split()[19])
+        return time.clock_gettime(time.CLOCK_BOOTTIME) - start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class _TimingLoader:
+    """Wraps a module loader and records how long executing the module took"""
+    def __init__(self, loader, profiler):
+        self._loader = loader
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._profiler._begin_import(module.__name__)
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler._end_import(module.__name__)
+
+
+class _TimingFinder:
+    """Meta path finder that only wraps the loaders found by the regular finders"""
+    def __init__(self, profiler):
+        self._profiler = profiler
+
+    def find_spec(self, name, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TimingLoader(spec.loader, self._profiler)
+                return spec
+        return None
+
+
+class StartupProfiler:
+    def __init__(self, enabled=False):
+        """
+        Collect import times and milestones from process start to the first output
+
+        Args:
+            enabled: Start recording immediately, otherwise every call is a no-op
+        """
+        self.enabled = False
+        self.imports = []      # (name, self seconds, cumulative seconds, depth) in completion order
+        self.marks = {}        # Milestone name -> seconds since process start
+        self._stack = []       # [name, start time, child seconds] of imports in progress
+        self._finder = None
+        self._reported = False
+        age = _process_age()
+        # Reference point: the moment the process was started, or now if /proc is unavailable
+        self._origin = time.perf_counter() - (age if age is not None else 0.0)
+        if enabled:
+            self.enable()
+
+    def enable(self):
+        """Start timing imports of modules that are not loaded yet"""
+        if self.enabled:
+            return
+        self.enabled = True
+        self._finder = _TimingFinder(self)
+        sys.meta_path.insert(0, self._finder)
+
+    def disable(self):
+        """Stop timing imports"""
+        if self._finder in sys.meta_path:
+            sys.meta_path.remove(self._finder)
+        self._finder = None
+        self.enabled = False
+
+    def _begin_import(self, name):
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def _end_import(self, name):
+        entry_name, start, children = self._stack.pop()
+        total = time.perf_counter() - start
+        self.imports.append((entry_name, total - children, total, len(self._stack)))
+        if self._stack:
+            self._stack[-1][2] += total
+
+    def elapsed(self):
+        """Seconds since process start"""
+        return time.perf_counter() - self._origin
+
+    def mark(self, name):
+        """
+        Record a milestone such as the first frame or the first PWM write (only the first call per name counts)
+
+        Args:
+            name: Milestone name
+        """
+        if not self.enabled or name in self.marks:
+            return
+        self.marks[name] = self.elapsed()
+        print(f"[startup] {name}: {self.marks[name] * 1000:.1f} ms after process start")
+
+    def report(self, top=15):
+        """
+        Print the slowest imports (self and cumulative time, like python -X importtime) and all milestones
+
+        Args:
+            top: Number of imports to list
+        """
+        if not self.enabled or self._reported:
+            return
+        self._reported = True
+        top_level = sum(total for name, own, total, depth in self.imports if depth == 0)
+        print(f"[startup] {len(self.imports)} modules imported in {top_level * 1000:.1f} ms")
+        print("[startup]   self [ms] | cumulative [ms] | module")
+        for name, own, total, depth in sorted(self.imports, key=lambda item: item[2], reverse=True)[:top]:
+            print(f"[startup] {own * 1000:10.1f} | {total * 1000:15.1f} | {'  ' * depth}{name}")
+        for name, seconds in self.marks.items():
+            print(f"[startup] {name}: {seconds * 1000:.1f} ms")
+
+
+# Process-wide profiler. Import this module first so the imports after it are timed.
+startup_profiler = StartupProfiler(enabled=os.environ.get(PROFILE_ENV) == '1' or PROFILE_FLAG in sys.argv)
+
+
+if __name__ == "__main__":
+    profiler = StartupProfiler(enabled=True)
+    import json
+    import xml.dom.minidom
+    profiler.mark('imports_done')
+    profiler.report()
@@ -1,8 +1,8 @@
 import os
 import time
-import psutil
 import datetime
 import socket
+from api_sensors import find_throttled_file, find_under_voltage_alarm, UNDER_VOLTAGE
 
 class SystemInformation:
     def __init__(self):
@@ -29,30 +29,37 @@ class SystemInformation:
         except Exception:
             return "0.0.0.0"
 
-    def get_raspberry_pi_date(self):
-        """Get the current date in YYYY-MM-DD format using native Python datetime"""
+    def _local_datetime(self, timestamp=None):
+        """Convert a time.time() timestamp to local datetime, None means now"""
+        if timestamp is None:
+            return datetime.datetime.now()
+        return datetime.datetime.fromtimestamp(timestamp)
+
+    def get_raspberry_pi_date(self, timestamp=None):
+        """Get the current date (or the date at timestamp) in YYYY-MM-DD format using native Python datetime"""
         try:
-            return datetime.date.today().strftime('%Y-%m-%d')
+            return self._local_datetime(timestamp).strftime('%Y-%m-%d')
         except Exception:
             return "1990-1-1"
 
-    def get_raspberry_pi_weekday(self):
-        """Get the current weekday name using native Python datetime"""
+    def get_raspberry_pi_weekday(self, timestamp=None):
+        """Get the current weekday name (or the weekday at timestamp) using native Python datetime"""
         try:
-            return datetime.date.today().strftime('%A')
+            return self._local_datetime(timestamp).strftime('%A')
         except Exception:
             return "Error"
 
-    def get_raspberry_pi_time(self):
-        """Get the current time in HH:MM:SS format using native Python datetime"""
+    def get_raspberry_pi_time(self, timestamp=None):
+        """Get the current time (or the time at timestamp) in HH:MM:SS format using native Python datetime"""
         try:
-            return datetime.datetime.now().strftime('%H:%M:%S')
+            return self._local_datetime(timestamp).strftime('%H:%M:%S')
         except Exception:
             return '0:0:0'
 
     def get_raspberry_pi_cpu_usage(self):
         """Get the CPU usage percentage"""
         try:
+            import psutil  # Loaded on first use, only the usage readings need it
             return psutil.cpu_percent(interval=0)
         except Exception:
             return 0
@@ -60,6 +67,7 @@ class SystemInformation:
     def get_raspberry_pi_memory_usage(self):
         """Get the memory usage percentage"""
         try:
+            import psutil  # Loaded on first use, only the usage readings need it
             memory = psutil.virtual_memory()
             return [memory.percent,round(memory.used//1024//1024/1024,3),round(memory.total//1024//1024/1024,3)]
         except Exception:
@@ -68,6 +76,7 @@ class SystemInformation:
     def get_raspberry_pi_disk_usage(self, path='/'):
         """Get the disk usage percentage for all disk partitions"""
         try:
+            import psutil  # Loaded on first use, only the usage readings need it
             total_used = 0
             total_size = 0
             
@@ -123,6 +132,19 @@ class SystemInformation:
                 return -1
         return -1
 
+    def get_raspberry_pi_fan_rpm(self):
+        """Get the fan speed measured by the tachometer (fan1_input), -1 if the fan has no tachometer"""
+        try:
+            base_path = '/sys/devices/platform/cooling_fan/hwmon/'
+            hwmon_dirs = [d for d in os.listdir(base_path) if d.startswith('hwmon')]
+            if not hwmon_dirs:
+                raise FileNotFoundError("No hwmon directory found")
+            fan_input_path = os.path.join(base_path, hwmon_dirs[0], 'fan1_input')
+            with open(fan_input_path, 'r') as f:
+                return max(0, int(f.read().strip()))
+        except Exception:
+            return -1
+
     def get_raspberry_pi_cpu_temperature(self):
         """Get the CPU temperature in Celsius using direct file read"""
         try:
@@ -132,6 +154,29 @@ class SystemInformation:
         except Exception:
             return 0
 
+    def get_raspberry_pi_throttled(self):
+        """Get the firmware throttle bits (vcgencmd get_throttled), only the under-voltage bit without get_throttled, -1 if unknown"""
+        try:
+            path = find_throttled_file()
+            if path is not None:
+                with open(path, 'r') as f:
+                    return int(f.read().strip(), 16)
+            path = find_under_voltage_alarm()
+            if path is not None:
+                with open(path, 'r') as f:
+                    return UNDER_VOLTAGE if int(f.read().strip()) else 0
+            return -1
+        except Exception:
+            return -1
+
+    def get_raspberry_pi_cpu_frequency(self):
+        """Get the current frequency of CPU 0 in MHz, -1 on failure"""
+        try:
+            with open('/sys/devices/system/cpu/cpu0/cpufreq/scaling_cur_freq', 'r') as f:
+                return int(f.read().strip()) // 1000
+        except Exception:
+            return -1
+
     def set_cpu_thermal_control(self, mode=1):
         if mode == 0:
             os.system("sudo bash -c \'echo 'disabled' > /sys/class/thermal/thermal_zone0/mode\'")
@@ -198,7 +243,10 @@ if __name__ == "__main__":
             print("get_raspberry_pi_memory_usage:", system_information.get_raspberry_pi_memory_usage())
             print("get_raspberry_pi_disk_usage:", system_information.get_raspberry_pi_disk_usage())
             print("get_raspberry_pi_fan_duty:", system_information.get_raspberry_pi_fan_duty())
+            print("get_raspberry_pi_fan_rpm:", system_information.get_raspberry_pi_fan_rpm())
             print("get_raspberry_pi_cpu_temperature:", system_information.get_raspberry_pi_cpu_temperature())
+            print("get_raspberry_pi_throttled:", hex(system_information.get_raspberry_pi_throttled()))
+            print("get_raspberry_pi_cpu_frequency:", system_information.get_raspberry_pi_cpu_frequency())
             for i in range(256):
                 system_information.set_pi_pwm_duty(i)
                 time.sleep(0.01)
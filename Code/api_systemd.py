@@ -0,0 +1,130 @@
+# api_systemd.py
+import os
+import socket
+import time
+import ctypes
+
+MLOCKALL_ENV = 'FREENOVE_MLOCKALL'
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+STATE_DIRECTORY_NAME = 'freenove_computer_case'   # StateDirectory= of the units, see ServiceGenerator
+
+
+def get_state_directory():
+    """
+    Get the directory for files a task keeps across restarts (fan health baselines, sensor cache)
+
+    The units get /var/lib/freenove_computer_case from StateDirectory=, a task started by hand
+    uses $XDG_STATE_HOME/freenove_computer_case (~/.local/state by default), never the source tree.
+
+    Returns:
+        str: Existing directory path
+    """
+    directory = os.environ.get('STATE_DIRECTORY', '').split(':')[0]
+    if not directory:
+        base = os.environ.get('XDG_STATE_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'state')
+        directory = os.path.join(base, STATE_DIRECTORY_NAME)
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError as e:
+        print(f"Error creating state directory {directory}: {e}")
+    return directory
+
+
+def lock_memory_if_requested():
+    """
+    Lock all current and future pages of the process when the unit asks for it (FREENOVE_MLOCKALL=1)
+
+    Call it after the hardware is initialized, so the loaded modules and buffers are resident
+    and the control loops never wait for a page fault. The unit must raise LimitMEMLOCK.
+
+    Returns:
+        bool: True if the memory was locked
+    """
+    if os.environ.get(MLOCKALL_ENV) != '1':
+        return False
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.mlockall(MCL_CURRENT | MCL_FUTURE) != 0:
+        print(f"mlockall failed: {os.strerror(ctypes.get_errno())}")
+        return False
+    return True
+
+
+class SystemdNotifier:
+    def __init__(self):
+        """
+        Report readiness and liveness to systemd (sd_notify protocol)
+
+        Every method is a no-op when the process was not started by a Type=notify unit,
+        so the tasks can also be run by hand.
+        """
+        self.socket_path = os.environ.get('NOTIFY_SOCKET')
+        if self.socket_path and self.socket_path.startswith('@'):
+            self.socket_path = '\0' + self.socket_path[1:]  # Abstract namespace socket
+        self.sock = None
+        if self.socket_path:
+            try:
+                self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM | socket.SOCK_CLOEXEC)
+            except OSError as e:
+                print(f"Error creating systemd notify socket: {e}")
+
+        # WatchdogSec from the unit, only valid for this process (not for forked children)
+        self.watchdog_interval = None
+        try:
+            watchdog_pid = os.environ.get('WATCHDOG_PID')
+            if watchdog_pid is None or int(watchdog_pid) == os.getpid():
+                watchdog_usec = int(os.environ.get('WATCHDOG_USEC', '0'))
+                if watchdog_usec > 0:
+                    self.watchdog_interval = watchdog_usec / 1e6
+        except ValueError:
+            pass
+        self.last_ping = 0.0
+
+    def notify(self, state):
+        """
+        Send a raw state string such as "READY=1" or "STATUS=..."
+
+        Returns:
+            bool: True if the message was sent
+        """
+        if self.sock is None:
+            return False
+        try:
+            self.sock.sendto(state.encode('utf-8'), self.socket_path)
+            return True
+        except OSError as e:
+            print(f"Error sending systemd notification: {e}")
+            return False
+
+    def ready(self, status=None):
+        """Tell systemd the hardware is initialized and the service is running"""
+        return self.notify("READY=1" if status is None else f"READY=1\nSTATUS={status}")
+
+    def stopping(self):
+        """Tell systemd the service is shutting down"""
+        return self.notify("STOPPING=1")
+
+    def ping(self):
+        """
+        Keep the watchdog alive, call it after every completed loop iteration
+
+        Pings are rate-limited to a quarter of WatchdogSec, so fast loops do not send a datagram per iteration.
+        """
+        if self.watchdog_interval is None:
+            return False
+        now = time.monotonic()
+        if now - self.last_ping < self.watchdog_interval / 4:
+            return False
+        self.last_ping = now
+        return self.notify("WATCHDOG=1")
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+if __name__ == "__main__":
+    notifier = SystemdNotifier()
+    print(f"Notify socket: {notifier.socket_path!r}, watchdog interval: {notifier.watchdog_interval}")
+    print(f"READY sent: {notifier.ready('Test')}")
@@ -0,0 +1,152 @@
+# api_telemetry.py
+import os
+import json
+import time
+
+TELEMETRY_DIR = '/dev/shm/freenove_computer_case'
+
+
+class TelemetryWriter:
+    def __init__(self, name, min_interval=1.0, directory=TELEMETRY_DIR):
+        """
+        Publish the live state of a task as a small JSON file in shared memory
+
+        /dev/shm is a tmpfs, so publishing never touches the SD card. Readers (UI, other tasks)
+        use read_telemetry() and never block the task.
+
+        Args:
+            name: Telemetry name, the file is <directory>/<name>.json
+            min_interval: Minimum seconds between two writes, extra publish() calls are dropped
+            directory: Directory of the telemetry files
+        """
+        self.directory = directory
+        self.path = os.path.join(directory, f"{name}.json")
+        self.min_interval = min_interval
+        self.last_write = 0.0
+        self.error_reported = False
+
+    def publish(self, data, force=False):
+        """
+        Write the telemetry (atomic replace)
+
+        Args:
+            data (dict): JSON serializable values, 'updated' (wall clock time) is added
+            force (bool): Ignore min_interval
+
+        Returns:
+            bool: True if the file was written
+        """
+        now = time.monotonic()
+        if not force and now - self.last_write < self.min_interval:
+            return False
+        self.last_write = now
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temp_file = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_file, 'w') as f:
+                json.dump(dict(data, updated=time.time()), f)
+            os.replace(temp_file, self.path)
+            self.error_reported = False
+            return True
+        except (OSError, TypeError, ValueError) as e:
+            if not self.error_reported:
+                print(f"Error writing telemetry {self.path}: {e}")
+                self.error_reported = True
+            return False
+
+    def remove(self):
+        """Delete the telemetry file, e.g. when the task stops"""
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class Heartbeat:
+    def __init__(self, name, directory=TELEMETRY_DIR):
+        """
+        Liveness file of a task, separate from its telemetry
+
+        beat() only updates the modification time of <directory>/<name>.heartbeat, so it does not
+        depend on the telemetry values being serializable. A task must treat a failed beat() as
+        not alive: skip its systemd watchdog ping, so the supervision sees the same state.
+
+        Args:
+            name: Task name
+            directory: Directory of the heartbeat files
+        """
+        self.directory = directory
+        self.path = os.path.join(directory, f"{name}.heartbeat")
+        self.error_reported = False
+
+    def beat(self):
+        """
+        Mark the task alive now
+
+        Returns:
+            bool: True if the heartbeat was written
+        """
+        try:
+            try:
+                os.utime(self.path)
+            except FileNotFoundError:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(self.path, 'w'):
+                    pass
+            self.error_reported = False
+            return True
+        except OSError as e:
+            if not self.error_reported:
+                print(f"Error writing heartbeat {self.path}: {e}")
+                self.error_reported = True
+            return False
+
+    def remove(self):
+        """Delete the heartbeat file, e.g. when the task stops"""
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def read_heartbeat_age(name, directory=TELEMETRY_DIR):
+    """
+    Get the seconds since a task last called Heartbeat.beat()
+
+    Returns:
+        float: Age in seconds, None if the task never wrote a heartbeat
+    """
+    try:
+        return max(0.0, time.time() - os.stat(os.path.join(directory, f"{name}.heartbeat")).st_mtime)
+    except OSError:
+        return None
+
+
+def read_telemetry(name, max_age=None, directory=TELEMETRY_DIR):
+    """
+    Read the telemetry published by a task
+
+    Args:
+        name: Telemetry name
+        max_age: Ignore data older than this many seconds, None to accept any age
+
+    Returns:
+        dict: Published values, None if there is no (recent) telemetry
+    """
+    try:
+        with open(os.path.join(directory, f"{name}.json"), 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict):
+        return None
+    if max_age is not None and time.time() - data.get('updated', 0) > max_age:
+        return None
+    return data
+
+
+if __name__ == "__main__":
+    writer = TelemetryWriter('test')
+    print(f"Written: {writer.publish({'value': 42})}")
+    print(read_telemetry('test', max_age=5))
+    writer.remove()
@@ -3,34 +3,42 @@ import os
 import time
 
 lib_path = '/usr/local/lib/libfreenove_ws2812_lib.so'
-if not os.path.exists(lib_path):
-    raise FileNotFoundError(f"Library not found at {lib_path}")
+lib = None
 
-lib = ctypes.CDLL(lib_path)
+def _load_library():
+    """Load the WS2812 library on first use, so importing this module costs nothing"""
+    global lib
+    if lib is not None:
+        return lib
+    if not os.path.exists(lib_path):
+        raise FileNotFoundError(f"Library not found at {lib_path}")
+    library = ctypes.CDLL(lib_path)
+    library.begin.argtypes = [ctypes.c_int, ctypes.c_int]
+    library.begin.restype = ctypes.c_void_p
 
-class WS2812:
-    def __init__(self, led_count=6, led_pin=26, led_brightness=255, order="GRB"):
-        lib.begin.argtypes = [ctypes.c_int, ctypes.c_int]
-        lib.begin.restype = ctypes.c_void_p
-        
-        lib.setPixelColor.argtypes = [ctypes.c_void_p, ctypes.c_uint, ctypes.c_uint8, ctypes.c_uint8, ctypes.c_uint8]
-        lib.setPixelColor.restype = None
+    library.setPixelColor.argtypes = [ctypes.c_void_p, ctypes.c_uint, ctypes.c_uint8, ctypes.c_uint8, ctypes.c_uint8]
+    library.setPixelColor.restype = None
 
-        lib.show.argtypes = [ctypes.c_void_p]
-        lib.show.restype = None
-        
-        lib.stop.argtypes = [ctypes.c_void_p]
-        lib.stop.restype = None
-        
-        lib.setBrightness.argtypes = [ctypes.c_void_p, ctypes.c_uint8]
-        lib.setBrightness.restype = None
-        
-        lib.numPixels.argtypes = [ctypes.c_void_p]
-        lib.numPixels.restype = ctypes.c_int
+    library.show.argtypes = [ctypes.c_void_p]
+    library.show.restype = None
 
-        lib.wheel.argtypes = [ctypes.c_uint8]
-        lib.wheel.restype = ctypes.c_uint32
+    library.stop.argtypes = [ctypes.c_void_p]
+    library.stop.restype = None
 
+    library.setBrightness.argtypes = [ctypes.c_void_p, ctypes.c_uint8]
+    library.setBrightness.restype = None
+
+    library.numPixels.argtypes = [ctypes.c_void_p]
+    library.numPixels.restype = ctypes.c_int
+
+    library.wheel.argtypes = [ctypes.c_uint8]
+    library.wheel.restype = ctypes.c_uint32
+    lib = library
+    return lib
+
+class WS2812:
+    def __init__(self, led_count=6, led_pin=26, led_brightness=255, order="GRB"):
+        _load_library()
         self.instance = lib.begin(led_pin, led_count)
         if not self.instance:
             raise RuntimeError("Failed to initialize WS2812")
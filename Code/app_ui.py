@@ -1,19 +1,21 @@
 
 # app_ui.py
+from api_startup import startup_profiler             # First import, so every import after it is timed
 import os
 import sys
 
 from PyQt5.QtWidgets import QApplication, QMainWindow, QTabWidget
 from PyQt5.QtCore import Qt, QTimer
 
-from app_ui_monitor import MonitoringTab             # Import monitoring interface
 from app_ui_led import LedTab                        # Import LED interface
 from app_ui_fan import FanTab                        # Import fan control interface
-from app_ui_oled import OledTab                      # Import OLED interface
 
-from api_json import ConfigManager                   # Import configuration management module
+from api_json import get_config_manager             # Import configuration management module
 from api_systemInfo import SystemInformation         # Import system information module
 from api_service import ServiceGenerator             # Import background task generator module
+from api_config_schema import to_dict                # Convert typed configuration sections to dicts
+from api_telemetry import read_telemetry             # Live values published by the task services
+from api_sensors import UNDER_VOLTAGE, is_thermally_limited  # Firmware throttle bits
 
 class MainWindow(QMainWindow):
     def __init__(self, width=800, height=420):
@@ -21,8 +23,8 @@ class MainWindow(QMainWindow):
         self.ui_main_width = width
         self.ui_main_height = height
 
-        config_manager = ConfigManager()
-        self.kit_type = config_manager.get_kit_type()
+        self.config_manager = get_config_manager()                               # Shared configuration store
+        self.kit_type = self.config_manager.get_kit_type()
         if self.kit_type == 1:
             self.setWindowTitle("Freenove_Computer_Case_Kit_Mini_for_Raspberry_Pi")   # Set window title
         elif self.kit_type == 2:
@@ -46,6 +48,10 @@ class MainWindow(QMainWindow):
             filename="task_fan.py",
             service_name="task_fan.service"
         )
+        self.fan_watchdog_service_generator = ServiceGenerator(       # Restores the kernel fan control if the fan task dies
+            filename="task_fan_watchdog.py",
+            service_name="task_fan_watchdog.service"
+        )
         
         self.color_combinations = [
             ('#FF6B6B', '#FFD1D1'),  # Red
@@ -53,7 +59,7 @@ class MainWindow(QMainWindow):
             ('#45B7D1', '#D1EBF0'),  # Blue
             ('#DDA0DD', '#F0E0F0'),  # Plum
             ('#FFA500', '#FFE5B4'),  # Orange
-            ('#333333', '#333333'),  # Gray
+            ('#7B8CDE', '#DDE2F7'),  # Indigo
             ('#EAEA77', '#FFFFF0'),  # Yellow
             ('#4ECDC4', '#D1F0EE'),  # Blue-green
             ('#F7DC6F', '#FBF5D9')   # Gold
@@ -64,8 +70,9 @@ class MainWindow(QMainWindow):
             "Storage Usage", # Storage usage
             "CPU Temp",      # Raspberry Pi temperature
             "RPi PWM",       # Raspberry Pi fan PWM
-            ""               # None
+            "Fan Speed"      # Raspberry Pi fan tachometer
         ]
+        self.fan_rpm_max = 0                                         # Highest fan RPM seen, scales the Fan Speed circle
 
         self.led_tab = None                                          # Create LED interface object
         self.fan_tab = None                                          # Create fan control interface object
@@ -82,6 +89,8 @@ class MainWindow(QMainWindow):
         self.fan_manual_mode_duty = 255                              # Fan manual mode duty cycle values for 3 fan groups
         self.fan_temp_mode_threshold = [30, 50, 3]                   # Fan temperature mode threshold parameters
         self.fan_temp_mode_duty = [75, 125, 175]                     # Fan temperature mode duty cycle parameters
+        self.fan_temp_mode_curve = []                                # Fan temperature mode curve points, empty: use the thresholds
+        self.fan_pid_mode_config = {}                                # Fan PID mode parameters, only the setpoint is edited in the UI
 
         if self.oled_is_exists:
             self.oled_service_generator = ServiceGenerator(
@@ -108,6 +117,7 @@ class MainWindow(QMainWindow):
 
         if self.is_show_monitor_ui:
             # Create monitor tab
+            from app_ui_monitor import MonitoringTab         # Only loaded when the monitor tab is shown
             self.monitoring_tab = MonitoringTab(self.width(), self.height())
             self.monitoring_tab.setFocusPolicy(Qt.NoFocus)
             for i in range(len(self.metric_labels)):
@@ -150,6 +160,7 @@ class MainWindow(QMainWindow):
 
         if self.oled_is_exists:
             # Create OLED tab
+            from app_ui_oled import OledTab                  # Only loaded when an OLED is connected
             self.oled_tab = OledTab(self.width(), self.height())
             self.oled_tab.setFocusPolicy(Qt.NoFocus)
             self.tab_widget.addTab(self.oled_tab, "OLED")
@@ -179,26 +190,27 @@ class MainWindow(QMainWindow):
         self.fan_tab.resetUiSize(self.width(), self.height())
 
         # Load configuration
-        config_data = self.get_all_json_config()
-        led_config = config_data.get('LED')
-        fan_config = config_data.get('Fan')
+        led_config = self.config_manager.get_typed_section('LED')
+        fan_config = self.config_manager.get_typed_section('Fan')
 
         # Load LED configuration
-        self.led_mode = led_config.get('mode', 0)
-        self.led_slider_color[0] = led_config.get('red_value', 0)
-        self.led_slider_color[1] = led_config.get('green_value', 0)
-        self.led_slider_color[2] = led_config.get('blue_value', 255)
-        self.led_brightness = led_config.get('brightness', 255)
-
-        # Load Fan configuration - fix: Use correct section name 'Fan' instead of 'fan'
-        self.fan_mode = fan_config.get('mode', 2)
-        temp_config = fan_config.get('temp_mode_config', {})
-        self.fan_temp_mode_threshold[0] = temp_config.get('fan_temp_threshold_low', 45)
-        self.fan_temp_mode_threshold[1] = temp_config.get('fan_temp_threshold_high', 80)
-        self.fan_temp_mode_threshold[2] = temp_config.get('fan_temp_threshold_hyst', 3)
-        self.fan_temp_mode_duty[0] = temp_config.get('fan_temp_mode_duty_low', 50)
-        self.fan_temp_mode_duty[1] = temp_config.get('fan_temp_mode_duty_high', 200)
-        self.fan_manual_mode_duty = fan_config.get('manual_mode_duty', 255)
+        self.led_mode = led_config.mode
+        self.led_slider_color[0] = led_config.red_value
+        self.led_slider_color[1] = led_config.green_value
+        self.led_slider_color[2] = led_config.blue_value
+        self.led_brightness = led_config.brightness
+
+        # Load Fan configuration
+        self.fan_mode = fan_config.mode
+        temp_config = fan_config.temp_mode_config
+        self.fan_temp_mode_threshold[0] = temp_config.fan_temp_threshold_low
+        self.fan_temp_mode_threshold[1] = temp_config.fan_temp_threshold_high
+        self.fan_temp_mode_threshold[2] = temp_config.fan_temp_threshold_hyst
+        self.fan_temp_mode_duty[0] = temp_config.fan_temp_mode_duty_low
+        self.fan_temp_mode_duty[1] = temp_config.fan_temp_mode_duty_high
+        self.fan_temp_mode_curve = to_dict(temp_config)['fan_curve']
+        self.fan_manual_mode_duty = fan_config.manual_mode_duty
+        self.fan_pid_mode_config = to_dict(fan_config.pid_mode_config)
 
         # Load LED interface parameters
         self.led_tab.set_led_mode(self.led_mode)                               # Configure radio buttons based on mode
@@ -213,6 +225,8 @@ class MainWindow(QMainWindow):
         self.fan_tab.set_case_weight_temp(self.fan_temp_mode_threshold)
         self.fan_tab.set_case_weight_slider_value(self.fan_temp_mode_duty)
         self.fan_tab.set_manual_weight_slider_value(self.fan_manual_mode_duty)
+        self.fan_tab.set_fan_curve(self.fan_temp_mode_curve)
+        self.fan_tab.set_pid_setpoint(self.fan_pid_mode_config['setpoint'])
 
         self.led_tab.set_start_task_button_enabled(True)
         self.fan_tab.set_start_task_button_enabled(True)
@@ -228,20 +242,18 @@ class MainWindow(QMainWindow):
             self.fan_tab.set_stop_task_button_enabled(False)
         
         if self.oled_is_exists:
-            oled_config = config_data.get('OLED')
-            screen1_config = oled_config.get('screen1', {})
-            screen2_config = oled_config.get('screen2', {})
-            screen3_config = oled_config.get('screen3', {})
-            self.oled_screen_interchange[0] = screen1_config.get('data_format', 0)
-            self.oled_screen_interchange[1] = screen1_config.get('time_format', 0)
-            self.oled_screen_interchange[2] = screen2_config.get('interchange', 0)
-            self.oled_screen_interchange[3] = screen3_config.get('interchange', 0)
-            self.oled_screen_display_time[0] = screen1_config.get('display_time', 3.0)
-            self.oled_screen_display_time[1] = screen2_config.get('display_time', 3.0)
-            self.oled_screen_display_time[2] = screen3_config.get('display_time', 3.0)
-            self.oled_screen_is_run_on_oled[0] = screen1_config.get('is_run_on_oled', True)
-            self.oled_screen_is_run_on_oled[1] = screen2_config.get('is_run_on_oled', True)
-            self.oled_screen_is_run_on_oled[2] = screen3_config.get('is_run_on_oled', True)
+            oled_config = self.config_manager.get_typed_section('OLED')
+            screen1_config, screen2_config, screen3_config = oled_config.screen1, oled_config.screen2, oled_config.screen3
+            self.oled_screen_interchange[0] = screen1_config.data_format
+            self.oled_screen_interchange[1] = screen1_config.time_format
+            self.oled_screen_interchange[2] = screen2_config.interchange
+            self.oled_screen_interchange[3] = screen3_config.interchange
+            self.oled_screen_display_time[0] = screen1_config.display_time
+            self.oled_screen_display_time[1] = screen2_config.display_time
+            self.oled_screen_display_time[2] = screen3_config.display_time
+            self.oled_screen_is_run_on_oled[0] = screen1_config.is_run_on_oled
+            self.oled_screen_is_run_on_oled[1] = screen2_config.is_run_on_oled
+            self.oled_screen_is_run_on_oled[2] = screen3_config.is_run_on_oled
 
             self.oled_tab.screen1_data_format_combo.setCurrentIndex(self.oled_screen_interchange[0])
             self.oled_tab.screen1_time_format_combo.setCurrentIndex(self.oled_screen_interchange[1])
@@ -285,6 +297,9 @@ class MainWindow(QMainWindow):
         self.fan_tab.fan_case_low_speed_slider.sliderReleased.connect(self.fan_config_change_event)
         self.fan_tab.fan_case_high_speed_slider.sliderReleased.connect(self.fan_config_change_event)
         self.fan_tab.fan_manual_slider.sliderReleased.connect(self.fan_config_change_event)
+        self.fan_tab.fan_pid_setpoint_minus_btn.clicked.connect(self.fan_config_change_event)
+        self.fan_tab.fan_pid_setpoint_plus_btn.clicked.connect(self.fan_config_change_event)
+        self.fan_tab.fan_curve_button.clicked.connect(self.fan_curve_edit_event)
         self.fan_tab.start_task_button.clicked.connect(self.fan_start_task_event)
         self.fan_tab.stop_task_button.clicked.connect(self.fan_stop_task_event)
 
@@ -306,7 +321,7 @@ class MainWindow(QMainWindow):
         if self.is_show_monitor_ui and self.monitor_update_data_timer_is_running:  # If timer is running, stop timer and save config
             self.monitor_update_data_timer.stop()
             self.monitor_update_data_timer_is_running = False
-        os.system('sudo rm __pycache__ -rf')
+        self.config_manager.flush()                                  # Services read the config when they restart
         if self.led_service_generator.check_service_is_exist():
             self.led_service_generator.restart_service_on_rpi()
         if self.fan_service_generator.check_service_is_exist():
@@ -337,9 +352,12 @@ class MainWindow(QMainWindow):
             disk_info = self.system_info.get_raspberry_pi_disk_usage()      # Disk usage information
             disk_usage = disk_info[0] if isinstance(disk_info, list) else disk_info
             rpi_temp_fahrenheit = self.celsius_to_fahrenheit(rpi_temp)
+            rpi_throttled = self.system_info.get_raspberry_pi_throttled()  # Firmware throttle bits, -1 if unknown
             
             # Get fan PWM information
             rpi_fan_pwm = self.system_info.get_raspberry_pi_fan_duty()      # Raspberry Pi fan PWM
+            rpi_fan_rpm = self.system_info.get_raspberry_pi_fan_rpm()       # Raspberry Pi fan tachometer, -1 without one
+            fan_telemetry = read_telemetry('fan', max_age=10) or {}        # Learned RPM and health from the fan task
             
             # Update progress controls
             # CPU usage
@@ -351,8 +369,12 @@ class MainWindow(QMainWindow):
             # Storage usage
             self.monitoring_tab.setCircleProgressValue(2, disk_usage, self.metric_labels[2], f"{disk_usage:.1f}%")
 
-            # Raspberry Pi temperature 
-            if self.convert_to_fahrenheit == False:
+            # Raspberry Pi temperature, replaced by the firmware throttling or under-voltage warning
+            if rpi_throttled > 0 and is_thermally_limited(rpi_throttled):
+                self.monitoring_tab.setCircleProgressValue(3, min(100, rpi_temp/80*100), self.metric_labels[3], "THROTTLED")
+            elif rpi_throttled > 0 and rpi_throttled & UNDER_VOLTAGE:
+                self.monitoring_tab.setCircleProgressValue(3, min(100, rpi_temp/80*100), self.metric_labels[3], "LOW VOLT")
+            elif self.convert_to_fahrenheit == False:
                 self.monitoring_tab.setCircleProgressValue(3, min(100, rpi_temp/80*100), self.metric_labels[3], f"{rpi_temp:.1f}°C")
             else:
                 self.monitoring_tab.setCircleProgressValue(3, min(100, rpi_temp/80*100), self.metric_labels[3], f"{rpi_temp_fahrenheit:.1f}°F")
@@ -360,6 +382,16 @@ class MainWindow(QMainWindow):
             # Raspberry Pi fan PWM (0-255 range)
             rpi_fan_percent = (rpi_fan_pwm / 255) * 100 if rpi_fan_pwm >= 0 else 0
             self.monitoring_tab.setCircleProgressValue(4, rpi_fan_percent, self.metric_labels[4], f"{rpi_fan_percent:.1f}%")
+
+            # Raspberry Pi fan speed, relative to the highest learned (or seen) RPM
+            if rpi_fan_rpm < 0:
+                self.monitoring_tab.setCircleProgressValue(5, 0, self.metric_labels[5], "N/A")
+            else:
+                self.fan_rpm_max = max(self.fan_rpm_max, rpi_fan_rpm, fan_telemetry.get('rpm_max') or 0)
+                rpi_fan_rpm_percent = rpi_fan_rpm / self.fan_rpm_max * 100 if self.fan_rpm_max > 0 else 0
+                fan_health = fan_telemetry.get('fan_health')
+                display_text = fan_health.upper() if fan_health in ('stalled', 'degraded') else f"{rpi_fan_rpm} RPM"
+                self.monitoring_tab.setCircleProgressValue(5, rpi_fan_rpm_percent, self.metric_labels[5], display_text)
         
         except Exception as e:
             print(f"Error updating data: {e}")
@@ -371,7 +403,7 @@ class MainWindow(QMainWindow):
                 r, g, b = self.led_slider_color
                 hex_color = f"#{r:02X}{g:02X}{b:02X}"
                 if hasattr(self.monitoring_tab, 'setCircleProgressColor'):
-                    for i in range(5):  # Only 5 progress bars in this version
+                    for i in range(len(self.metric_labels)):
                         self.monitoring_tab.setCircleProgressColor(i, [hex_color, '#444444'])
         except Exception as e:
             print(f"Error updating LED colors: {e}")
@@ -415,6 +447,7 @@ class MainWindow(QMainWindow):
     def led_start_task_event(self):
         """Handle start task button click event"""
         try:
+            self.config_manager.flush()                              # Service reads the config at start
             self.led_tab.set_start_task_button_enabled(False)
             if self.led_service_generator.check_service_is_exist() == True:
                 restart_result = self.led_service_generator.restart_service_on_rpi()
@@ -474,13 +507,16 @@ class MainWindow(QMainWindow):
             'fan_temp_threshold_high': self.fan_temp_mode_threshold[1],
             'fan_temp_threshold_hyst': self.fan_temp_mode_threshold[2],
             'fan_temp_mode_duty_low': self.fan_temp_mode_duty[0],
-            'fan_temp_mode_duty_high': self.fan_temp_mode_duty[1]
+            'fan_temp_mode_duty_high': self.fan_temp_mode_duty[1],
+            'fan_curve': self.fan_temp_mode_curve
         }
         self.fan_manual_mode_duty = int(self.fan_tab.fan_manual_slider.value())
+        self.fan_pid_mode_config['setpoint'] = float(self.fan_tab.fan_pid_setpoint_input.text())
         fan_config = [
             ('Fan', 'mode', self.fan_mode),
             ('Fan', 'manual_mode_duty', self.fan_manual_mode_duty),
-            ('Fan', 'temp_mode_config', temp_mode_config)
+            ('Fan', 'temp_mode_config', temp_mode_config),
+            ('Fan', 'pid_mode_config', dict(self.fan_pid_mode_config))
         ]
         self.set_all_json_config(fan_config)
     def fan_config_change_event(self):
@@ -490,23 +526,40 @@ class MainWindow(QMainWindow):
         self.fan_temp_mode_duty[0] = int(self.fan_tab.fan_case_low_speed_slider.value())
         self.fan_temp_mode_duty[1] = int(self.fan_tab.fan_case_high_speed_slider.value())
         self.fan_manual_mode_duty = int(self.fan_tab.fan_manual_slider.value())
+        self.fan_pid_mode_config['setpoint'] = float(self.fan_tab.fan_pid_setpoint_input.text())
 
         temp_config = {
             'fan_temp_threshold_low': self.fan_temp_mode_threshold[0],
             'fan_temp_threshold_high': self.fan_temp_mode_threshold[1],
             'fan_temp_threshold_hyst': self.fan_temp_mode_threshold[2],
             'fan_temp_mode_duty_low': self.fan_temp_mode_duty[0],
-            'fan_temp_mode_duty_high': self.fan_temp_mode_duty[1]
+            'fan_temp_mode_duty_high': self.fan_temp_mode_duty[1],
+            'fan_curve': self.fan_temp_mode_curve
          }
         fan_config = [
             ('Fan', 'mode', self.fan_mode),
             ('Fan', 'manual_mode_duty', self.fan_manual_mode_duty),
-            ('Fan', 'temp_mode_config', temp_config)
+            ('Fan', 'temp_mode_config', temp_config),
+            ('Fan', 'pid_mode_config', dict(self.fan_pid_mode_config))
         ]
         self.set_all_json_config(fan_config)
+    def fan_curve_edit_event(self):
+        """Edit the temp mode fan curve, starting from the thresholds if no curve is set"""
+        points = self.fan_temp_mode_curve or [
+            [self.fan_temp_mode_threshold[0], self.fan_temp_mode_duty[0]],
+            [self.fan_temp_mode_threshold[1], self.fan_temp_mode_duty[1]],
+            [self.fan_temp_mode_threshold[1], 255]
+        ]
+        points = self.fan_tab.edit_fan_curve(points)
+        if points is None:
+            return
+        self.fan_temp_mode_curve = points
+        self.fan_tab.set_fan_curve(points)
+        self.fan_config_change_event()
     def fan_start_task_event(self):
         """Handle start task button click event"""
         try: 
+            self.config_manager.flush()                              # Service reads the config at start
             self.fan_tab.set_start_task_button_enabled(False)
             if self.fan_service_generator.check_service_is_exist() == True:
                 restart_result = self.fan_service_generator.restart_service_on_rpi()
@@ -523,6 +576,10 @@ class MainWindow(QMainWindow):
                     print("Fan service created successfully")
                 else:
                     print("Fan service creation failed")
+            if self.fan_watchdog_service_generator.check_service_is_exist() == False:
+                create_result = self.fan_watchdog_service_generator.create_service_on_rpi()
+                if not all(result.returncode == 0 for result in create_result.values() if hasattr(result, 'returncode')):
+                    print("Fan watchdog service creation failed")
             self.fan_tab.set_start_task_button_enabled(True)
             self.fan_tab.set_stop_task_button_enabled(True)
         except Exception as e:
@@ -543,6 +600,8 @@ class MainWindow(QMainWindow):
                         print("Fan service deleted successfully")
                     else:
                         print(f"Fan service deletion failed: {delete_result}")
+                    if self.fan_watchdog_service_generator.check_service_is_exist() == True:
+                        self.fan_watchdog_service_generator.delete_service_on_rpi()
                 else:
                     print(f"Fan service stop failed: {stop_result.stderr if stop_result else 'Unknown error'}")
             
@@ -552,195 +611,69 @@ class MainWindow(QMainWindow):
     # OLED interface signals and slot functions
     def oled_screen_display_time_minus_btn_event(self):
         """Handle OLED screen display time minus button event"""
-        checkboxes = [
-            self.oled_tab.screen1_checkbox,
-            self.oled_tab.screen2_checkbox,
-            self.oled_tab.screen3_checkbox,
-        ]
-
-        # Get complete configuration data
-        config_data = self.get_all_json_config()
-        oled_config = config_data.get('OLED', {})
-
-        # Iterate through checkboxes to find the selected screen
-        for i, checkbox in enumerate(checkboxes):
-            if checkbox.isChecked(): 
-                screen_num = i + 1
-                screen_key = f'screen{screen_num}'
-                
-                # Get configuration for the corresponding screen
-                screen_config = oled_config.get(screen_key, {})
-                
-                # Get current display time and adjust it
-                current_time = screen_config.get('display_time', 3.0)
-                new_time = current_time - 0.5
-                if new_time <= 0:
-                    new_time = 0.5
-                
-                # Update configuration
-                screen_config['display_time'] = round(new_time, 1)
-                oled_config[screen_key] = screen_config
-                
-                # Update local variables and interface display
-                self.oled_screen_display_time[i] = new_time
-                self.oled_tab.set_display_time_label(i, new_time)
-        
-        # Directly replace the entire OLED section using the set_section method to maintain nested structure
-        config_manager = ConfigManager()
-        config_manager.set_section('OLED', oled_config)
-        config_manager.save_config()
+        self.change_oled_screen_display_time(-0.5)
     def oled_screen_display_time_plus_btn_event(self):
         """Handle OLED screen display time plus button event"""
+        self.change_oled_screen_display_time(0.5)
+    def change_oled_screen_display_time(self, step):
+        """Change the display time of every selected screen by step seconds, 0.5 s at least"""
         checkboxes = [
             self.oled_tab.screen1_checkbox,
             self.oled_tab.screen2_checkbox,
             self.oled_tab.screen3_checkbox,
         ]
-        
-        # Get complete configuration data
-        config_data = self.get_all_json_config()
-        oled_config = config_data.get('OLED', {})
+        oled_config = self.get_all_json_config().get('OLED', {})
+        screen_updates = {}
 
-        # Iterate through checkboxes to find the selected screen
+        # Iterate through checkboxes to find the selected screens
         for i, checkbox in enumerate(checkboxes):
             if checkbox.isChecked(): 
-                screen_num = i + 1
-                screen_key = f'screen{screen_num}'
-                
-                # Get configuration for the corresponding screen
-                screen_config = oled_config.get(screen_key, {})
-                
-                # Get current display time and adjust it
-                current_time = screen_config.get('display_time', 3.0)
-                new_time = current_time + 0.5
-                screen_config['display_time'] = round(new_time, 1)
-                oled_config[screen_key] = screen_config
+                screen_key = f'screen{i + 1}'
+                current_time = oled_config.get(screen_key, {}).get('display_time', 3.0)
+                new_time = current_time + step
+                if new_time <= 0:
+                    new_time = 0.5
+                screen_updates[screen_key] = {'display_time': round(new_time, 1)}
                 
                 # Update local variables and interface display
                 self.oled_screen_display_time[i] = new_time
                 self.oled_tab.set_display_time_label(i, new_time)
-        
-        # Directly replace the entire OLED section using the set_section method to maintain nested structure
-        config_manager = ConfigManager()
-        config_manager.set_section('OLED', oled_config)
-        config_manager.save_config()
+        self.set_oled_screen_json_config(screen_updates)
+    def oled_screen_checkbox_event(self, i, checkbox):
+        """Enable or disable screen i+1 on the OLED"""
+        is_checked = checkbox.isChecked()
+        self.oled_screen_is_run_on_oled[i] = is_checked
+        self.oled_tab.set_display_time_is_enabled(i, is_checked)
+        self.set_oled_screen_json_config({f'screen{i + 1}': {'is_run_on_oled': is_checked}})
     def oled_screen1_checkbox_event(self):
         """Handle OLED screen1 checkbox event"""
-        config_data = self.get_all_json_config()
-        oled_config = config_data.get('OLED', {})
-        screen1_config = oled_config.get('screen1', {})
-
-        is_checked = self.oled_tab.screen1_checkbox.isChecked()
-        self.oled_screen_is_run_on_oled[0] = is_checked
-        self.oled_tab.set_display_time_is_enabled(0, is_checked)
-        screen1_config['is_run_on_oled'] = is_checked
-        
-        # Update OLED configuration
-        oled_config['screen1'] = screen1_config
-
-        # Directly replace the entire OLED section using the set_section method to maintain nested structure
-        config_manager = ConfigManager()
-        config_manager.set_section('OLED', oled_config)
-        config_manager.save_config()
+        self.oled_screen_checkbox_event(0, self.oled_tab.screen1_checkbox)
     def oled_screen2_checkbox_event(self):
         """Handle OLED screen2 checkbox event"""
-        config_data = self.get_all_json_config()
-        oled_config = config_data.get('OLED', {})
-        screen2_config = oled_config.get('screen2', {})
-
-        is_checked = self.oled_tab.screen2_checkbox.isChecked()
-        self.oled_screen_is_run_on_oled[1] = is_checked
-        self.oled_tab.set_display_time_is_enabled(1, is_checked)
-        screen2_config['is_run_on_oled'] = is_checked
-        
-        # Update OLED configuration
-        oled_config['screen2'] = screen2_config
-
-        # Directly replace the entire OLED section using the set_section method to maintain nested structure
-        config_manager = ConfigManager()
-        config_manager.set_section('OLED', oled_config)
-        config_manager.save_config()
+        self.oled_screen_checkbox_event(1, self.oled_tab.screen2_checkbox)
     def oled_screen3_checkbox_event(self):
         """Handle OLED screen3 checkbox event"""
-        config_data = self.get_all_json_config()
-        oled_config = config_data.get('OLED', {})
-        screen3_config = oled_config.get('screen3', {})
-
-        is_checked = self.oled_tab.screen3_checkbox.isChecked()
-        self.oled_screen_is_run_on_oled[2] = is_checked
-        self.oled_tab.set_display_time_is_enabled(2, is_checked)
-        screen3_config['is_run_on_oled'] = is_checked
-        
-        # Update OLED configuration
-        oled_config['screen3'] = screen3_config
-
-        # Directly replace the entire OLED section using the set_section method to maintain nested structure
-        config_manager = ConfigManager()
-        config_manager.set_section('OLED', oled_config)
-        config_manager.save_config()
+        self.oled_screen_checkbox_event(2, self.oled_tab.screen3_checkbox)
     def oled_screen1_data_format_combo_event(self, index):
         """Handle OLED screen1 data format combo box event"""
-        config_data = self.get_all_json_config()
-        oled_config = config_data.get('OLED', {})
-        screen1_config = oled_config.get('screen1', {})
         self.oled_screen_interchange[0] = index
-        screen1_config['data_format'] = index
-        
-        # Update OLED configuration
-        oled_config['screen1'] = screen1_config
-
-        # Directly replace the entire OLED section using the set_section method to maintain nested structure
-        config_manager = ConfigManager()
-        config_manager.set_section('OLED', oled_config)
-        config_manager.save_config()
+        self.set_oled_screen_json_config({'screen1': {'data_format': index}})
     def oled_screen1_time_format_combo_event(self, index):
         """Handle OLED screen1 time format combo box event"""
-        config_data = self.get_all_json_config()
-        oled_config = config_data.get('OLED', {})
-        screen1_config = oled_config.get('screen1', {})
         self.oled_screen_interchange[1] = index
-        screen1_config['time_format'] = index
-        
-        # Update OLED configuration
-        oled_config['screen1'] = screen1_config
-
-        # Directly replace the entire OLED section using the set_section method to maintain nested structure
-        config_manager = ConfigManager()
-        config_manager.set_section('OLED', oled_config)
-        config_manager.save_config()
+        self.set_oled_screen_json_config({'screen1': {'time_format': index}})
     def oled_screen2_interchange_combo_event(self, index):
         """Handle OLED screen2 interchange combo box event"""
-        config_data = self.get_all_json_config()
-        oled_config = config_data.get('OLED', {})
-        screen2_config = oled_config.get('screen2', {})
         self.oled_screen_interchange[2] = index
-        screen2_config['interchange'] = index
-        
-        # Update OLED configuration
-        oled_config['screen2'] = screen2_config
-
-        # Directly replace the entire OLED section using the set_section method to maintain nested structure
-        config_manager = ConfigManager()
-        config_manager.set_section('OLED', oled_config)
-        config_manager.save_config()
+        self.set_oled_screen_json_config({'screen2': {'interchange': index}})
     def oled_screen3_interchange_combo_event(self, index):
         """Handle OLED screen3 interchange combo box event"""
-        config_data = self.get_all_json_config()
-        oled_config = config_data.get('OLED', {})
-        screen3_config = oled_config.get('screen3', {})
         self.oled_screen_interchange[3] = index
-        screen3_config['interchange'] = index
-        
-        # Update OLED configuration
-        oled_config['screen3'] = screen3_config
-
-        # Directly replace the entire OLED section using the set_section method to maintain nested structure
-        config_manager = ConfigManager()
-        config_manager.set_section('OLED', oled_config)
-        config_manager.save_config()
+        self.set_oled_screen_json_config({'screen3': {'interchange': index}})
     def oled_start_task_event(self):
         """Handle start task button click event"""
         try:
+            self.config_manager.flush()                              # Service reads the config at start
             self.oled_tab.set_start_task_button_enabled(False)
             if self.oled_service_generator.check_service_is_exist() == True:
                 restart_result = self.oled_service_generator.restart_service_on_rpi()
@@ -783,13 +716,17 @@ class MainWindow(QMainWindow):
 
     # JSON Configuration
     def get_all_json_config(self):
-        config_manager = ConfigManager()
-        return config_manager.get_all_config()
+        return self.config_manager.get_all_config()
     def set_all_json_config(self, config_data):
-        config_manager = ConfigManager()
-        for section, key, value in config_data:
-            config_manager.set_value(section, key, value)
-        config_manager.save_config()
+        # One transaction per event: daemons never see a half-applied color, and writes are coalesced
+        with self.config_manager.transaction() as transaction:
+            for section, key, value in config_data:
+                transaction.set_value(section, key, value)
+    def set_oled_screen_json_config(self, screen_updates):
+        # Screens are nested dicts: stage changed copies, the transaction compares them with the stored ones
+        oled_config = self.get_all_json_config().get('OLED', {})
+        self.set_all_json_config([('OLED', screen_key, dict(oled_config.get(screen_key, {}), **updates))
+                                  for screen_key, updates in screen_updates.items()])
         
 if __name__ == "__main__":
     os.system('sudo chmod 700 /run/user/1000')
@@ -804,4 +741,6 @@ if __name__ == "__main__":
     window.show()
     if dsi_screen:
         window.move(dsi_screen.geometry().topLeft()) 
+    startup_profiler.mark('window_shown')
+    startup_profiler.report()
     sys.exit(app.exec_())
\ No newline at end of file
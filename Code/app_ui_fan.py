@@ -1,13 +1,176 @@
 # app_ui_fan.py
 import sys
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QApplication, QHBoxLayout, QSlider, QLabel, QPushButton, QRadioButton, QLineEdit
-from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QApplication, QHBoxLayout, QSlider, QLabel, QPushButton, QRadioButton, QLineEdit,
+                             QDialog, QTableWidget, QTableWidgetItem, QHeaderView)
+from PyQt5.QtCore import Qt, QPointF
+from PyQt5.QtGui import QPainter, QPen, QColor
+
+
+class FanCurvePreview(QWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.points = []
+        self.setMinimumHeight(120)
+
+    def set_points(self, points):
+        self.points = points
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.fillRect(self.rect(), QColor('#222222'))
+        margin = 10
+        width = self.width() - 2 * margin
+        height = self.height() - 2 * margin
+
+        def to_pos(temp, duty):
+            # 20-100 °C on the x axis, duty 0-255 on the y axis
+            return QPointF(margin + (min(max(temp, 20), 100) - 20) / 80 * width,
+                           margin + height - duty / 255 * height)
+
+        painter.setPen(QPen(QColor('#555555'), 1))
+        for temp in range(20, 101, 10):
+            painter.drawLine(to_pos(temp, 0), to_pos(temp, 255))
+        if len(self.points) < 2:
+            return
+        # Fan is off below the first point and keeps the last duty above the last point
+        line = [to_pos(20, 0), to_pos(self.points[0][0], 0)]
+        line += [to_pos(temp, duty) for temp, duty in self.points]
+        line.append(to_pos(100, self.points[-1][1]))
+        painter.setPen(QPen(QColor('#45B7D1'), 2))
+        for start, end in zip(line, line[1:]):
+            painter.drawLine(start, end)
+        painter.setBrush(QColor('#FF6347'))
+        for temp, duty in self.points:
+            painter.drawEllipse(to_pos(temp, duty), 4, 4)
+
+
+class FanCurveDialog(QDialog):
+    def __init__(self, points, style, parent=None):
+        """
+        Edit the (temperature, duty) points of the temperature mode fan curve
+
+        Args:
+            points: Current points, [[°C, duty], ...]
+            style: Style sheet of the buttons and labels
+        """
+        super().__init__(parent)
+        self.setWindowTitle("Fan Curve")
+        self.setStyleSheet("background-color: #333333; color: white;")
+        self.resize(420, 420)
+        self.points = []
+
+        self.table = QTableWidget(0, 2)
+        self.table.setHorizontalHeaderLabels(["Temp (°C)", "Duty (0-255)"])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.setStyleSheet("QTableWidget { background-color: #444444; color: white; } "
+                                 "QHeaderView::section { background-color: #555555; color: white; }")
+        for temp, duty in points:
+            self.add_row(temp, duty)
+        self.table.itemChanged.connect(self.update_preview)
+
+        self.preview = FanCurvePreview()
+        self.message_label = QLabel("")
+        self.message_label.setStyleSheet("color: #FF6347;")
+
+        self.add_button = QPushButton("Add Point")
+        self.remove_button = QPushButton("Remove Point")
+        self.thresholds_button = QPushButton("Use Thresholds")
+        self.ok_button = QPushButton("OK")
+        self.cancel_button = QPushButton("Cancel")
+        for button in (self.add_button, self.remove_button, self.thresholds_button, self.ok_button, self.cancel_button):
+            button.setStyleSheet(style)
+            button.setMinimumHeight(30)
+        self.add_button.clicked.connect(self.add_point)
+        self.remove_button.clicked.connect(self.remove_point)
+        self.thresholds_button.clicked.connect(self.use_thresholds)
+        self.ok_button.clicked.connect(self.accept_points)
+        self.cancel_button.clicked.connect(self.reject)
+
+        edit_layout = QHBoxLayout()
+        edit_layout.addWidget(self.add_button)
+        edit_layout.addWidget(self.remove_button)
+        edit_layout.addWidget(self.thresholds_button)
+        button_layout = QHBoxLayout()
+        button_layout.addWidget(self.ok_button)
+        button_layout.addWidget(self.cancel_button)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.table)
+        layout.addLayout(edit_layout)
+        layout.addWidget(self.preview)
+        layout.addWidget(self.message_label)
+        layout.addLayout(button_layout)
+        self.setLayout(layout)
+        self.update_preview()
+
+    def add_row(self, temp, duty):
+        row = self.table.rowCount()
+        self.table.insertRow(row)
+        self.table.setItem(row, 0, QTableWidgetItem(f"{temp:g}"))
+        self.table.setItem(row, 1, QTableWidgetItem(str(int(duty))))
+
+    def add_point(self):
+        points = self.read_points()
+        if points:
+            temp, duty = points[-1]
+            self.add_row(min(temp + 5, 100), min(duty + 25, 255))
+        else:
+            self.add_row(50, 100)
+
+    def remove_point(self):
+        row = self.table.currentRow()
+        self.table.removeRow(row if row >= 0 else self.table.rowCount() - 1)
+        self.update_preview()
+
+    def read_points(self):
+        """
+        Parse the table, sorted by temperature
+
+        Returns:
+            list: [[°C, duty], ...], None if a cell is not a valid number
+        """
+        points = []
+        for row in range(self.table.rowCount()):
+            try:
+                temp = float(self.table.item(row, 0).text())
+                duty = int(self.table.item(row, 1).text())
+            except (AttributeError, ValueError):
+                return None
+            if not 0 <= temp <= 120 or not 0 <= duty <= 255:
+                return None
+            points.append([temp, duty])
+        return sorted(points, key=lambda point: point[0])
+
+    def update_preview(self):
+        points = self.read_points()
+        self.preview.set_points(points or [])
+        if points is None:
+            self.message_label.setText("Temperatures 0-120 °C, duties 0-255")
+        elif len(points) < 2:
+            self.message_label.setText("A curve needs at least 2 points")
+        else:
+            self.message_label.setText("")
+
+    def use_thresholds(self):
+        """Drop the curve, temp mode goes back to the low/high threshold controls"""
+        self.points = []
+        self.accept()
+
+    def accept_points(self):
+        points = self.read_points()
+        if points is None or len(points) < 2:
+            self.update_preview()
+            return
+        self.points = points
+        self.accept()
 
 class FanTab(QWidget):
     def __init__(self, width=700, height=400):
         super().__init__()
         
-        self.fan_mode_radio_buttons_names = ["Temp Mode", "Manual Mode", "Default Mode"]
+        self.fan_mode_radio_buttons_names = ["Temp Mode", "Manual Mode", "Default Mode", "PID Mode"]
         self.fan_mode_radio_buttons = []
         
         self.window_width = width
@@ -16,6 +179,7 @@ class FanTab(QWidget):
         self.fan_temp_mode_threshold_low = [0, 50]
         self.fan_temp_mode_threshold_high = [50, 100]
         self.fan_temp_threshold_hyst = [1, 5]
+        self.fan_pid_setpoint_range = [30, 85]
         
         self.radio_button_style = """
             QRadioButton {
@@ -151,7 +315,7 @@ class FanTab(QWidget):
         self.setMinimumSize(round(self.window_width*self.scale_factor), round(self.window_height*self.scale_factor))
 
         self.fan_mode_hbox_layout = QHBoxLayout()
-        for i in range(3):
+        for i in range(len(self.fan_mode_radio_buttons_names)):
             radio_button = QRadioButton(self.fan_mode_radio_buttons_names[i])
             radio_button.setStyleSheet(self.radio_button_style)
             radio_button.toggled.connect(lambda checked, idx=i: self.set_fan_mode(idx) if checked else None)
@@ -163,6 +327,7 @@ class FanTab(QWidget):
         self.fan_mode_hbox_layout.setStretch(0,1)
         self.fan_mode_hbox_layout.setStretch(1,1)
         self.fan_mode_hbox_layout.setStretch(2,1)
+        self.fan_mode_hbox_layout.setStretch(3,1)
 
         temp_layout = self.create_temperature_controls(self.line_edit_style, self.button_style)
 
@@ -171,16 +336,20 @@ class FanTab(QWidget):
 
         fan_manual_layout = self.create_fan_control_slider("Fan Duty:", 0, 255, 0, "#45B7D1")
 
+        pid_layout = self.create_pid_controls(self.line_edit_style, self.button_style)
+
         self.slider_area_layout = QVBoxLayout()
         self.slider_area_layout.setSpacing(10)
         self.slider_area_layout.addLayout(temp_layout)
         self.slider_area_layout.addLayout(low_speed_layout)
         self.slider_area_layout.addLayout(high_speed_layout)
         self.slider_area_layout.addLayout(fan_manual_layout)
+        self.slider_area_layout.addLayout(pid_layout)
         self.slider_area_layout.setStretch(0, 1)
         self.slider_area_layout.setStretch(1, 1)
         self.slider_area_layout.setStretch(2, 1)
         self.slider_area_layout.setStretch(3, 1)
+        self.slider_area_layout.setStretch(4, 1)
 
         # Create start task button
         self.start_task_button = QPushButton("Start Task")
@@ -190,8 +359,13 @@ class FanTab(QWidget):
         self.stop_task_button = QPushButton("Stop Task")
         self.stop_task_button.setStyleSheet(self.button_style)
 
+        # Create fan curve button, the curve replaces the low/high thresholds of temp mode
+        self.fan_curve_button = QPushButton("Edit Curve")
+        self.fan_curve_button.setStyleSheet(self.button_style)
+
         # Create layout for the buttons that matches other controls
         self.button_layout = QHBoxLayout()
+        self.button_layout.addWidget(self.fan_curve_button)
         self.button_layout.addWidget(self.start_task_button)
         self.button_layout.addWidget(self.stop_task_button)
 
@@ -394,6 +568,56 @@ class FanTab(QWidget):
         
         return layout
 
+    def create_pid_controls(self, line_edit_style, button_style):
+        self.fan_pid_setpoint_label = QLabel("Target Temp:")
+        self.fan_pid_setpoint_label.setStyleSheet(self.slider_label_style)
+        self.fan_pid_setpoint_label.setFixedWidth(120)
+
+        self.fan_pid_setpoint_input = QLineEdit()
+        self.fan_pid_setpoint_input.setStyleSheet(line_edit_style)
+        self.fan_pid_setpoint_input.setText(str(55))
+        self.fan_pid_setpoint_input.setAlignment(Qt.AlignCenter)
+        self.fan_pid_setpoint_input.setEnabled(False)
+        self.fan_pid_setpoint_input.setReadOnly(True)
+
+        self.fan_pid_setpoint_minus_btn = QPushButton("-")
+        self.fan_pid_setpoint_minus_btn.setStyleSheet(button_style)
+        self.fan_pid_setpoint_plus_btn = QPushButton("+")
+        self.fan_pid_setpoint_plus_btn.setStyleSheet(button_style)
+        self.fan_pid_setpoint_minus_btn.setAutoRepeat(True)
+        self.fan_pid_setpoint_plus_btn.setAutoRepeat(True)
+        self.fan_pid_setpoint_minus_btn.setAutoRepeatDelay(500)
+        self.fan_pid_setpoint_minus_btn.setAutoRepeatInterval(100)
+        self.fan_pid_setpoint_plus_btn.setAutoRepeatDelay(500)
+        self.fan_pid_setpoint_plus_btn.setAutoRepeatInterval(100)
+        self.fan_pid_setpoint_minus_btn.clicked.connect(self.decrease_pid_setpoint)
+        self.fan_pid_setpoint_plus_btn.clicked.connect(self.increase_pid_setpoint)
+
+        layout = QHBoxLayout()
+        layout.addWidget(self.fan_pid_setpoint_label)
+        layout.addWidget(self.fan_pid_setpoint_minus_btn)
+        layout.addWidget(self.fan_pid_setpoint_input)
+        layout.addWidget(self.fan_pid_setpoint_plus_btn)
+        layout.setStretch(1, 1)
+        layout.setStretch(2, 1)
+        layout.setStretch(3, 1)
+        layout.setSpacing(10)
+        return layout
+
+    def decrease_pid_setpoint(self):
+        try:
+            value = int(self.fan_pid_setpoint_input.text()) - 1
+            self.fan_pid_setpoint_input.setText(str(max(self.fan_pid_setpoint_range[0], value)))
+        except ValueError:
+            self.fan_pid_setpoint_input.setText(str(55))
+
+    def increase_pid_setpoint(self):
+        try:
+            value = int(self.fan_pid_setpoint_input.text()) + 1
+            self.fan_pid_setpoint_input.setText(str(min(self.fan_pid_setpoint_range[1], value)))
+        except ValueError:
+            self.fan_pid_setpoint_input.setText(str(55))
+
     def decrease_low_temp(self):
         try:
             value = int(self.fan_case_low_temp_input.text())
@@ -501,6 +725,9 @@ class FanTab(QWidget):
             self.fan_case_high_speed_slider,
             self.fan_manual_slider_label, self.fan_manual_slider_value,
             self.fan_manual_slider,
+            self.fan_pid_setpoint_label, self.fan_pid_setpoint_input,
+            self.fan_pid_setpoint_minus_btn, self.fan_pid_setpoint_plus_btn,
+            self.fan_curve_button,
             self.start_task_button,
             self.stop_task_button
         ]
@@ -533,6 +760,28 @@ class FanTab(QWidget):
         self.fan_manual_slider.setValue(speed)
         self.fan_manual_slider_value.setText(str(speed))
 
+    def set_fan_curve(self, points):
+        """Show whether a multi-point curve or the low/high thresholds drive temp mode"""
+        self.fan_curve_button.setText(f"Curve: {len(points)} Points" if points else "Edit Curve")
+
+    def edit_fan_curve(self, points):
+        """
+        Open the curve editor
+
+        Args:
+            points: Points to start with, [[°C, duty], ...]
+
+        Returns:
+            list: Edited points (empty to use the thresholds), None if the dialog was cancelled
+        """
+        dialog = FanCurveDialog(points, self.button_style, self)
+        if dialog.exec_() == QDialog.Accepted:
+            return dialog.points
+        return None
+
+    def set_pid_setpoint(self, setpoint):
+        self.fan_pid_setpoint_input.setText(str(int(round(setpoint))))
+
     def enable_widget_with_style(self, widget, enabled_style, disabled_style, enabled):
         if widget is None:
             return
@@ -547,6 +796,7 @@ class FanTab(QWidget):
         temp_mode_enabled = (mode == 0)
         manual_mode_enabled = (mode == 1)
         default_mode_enabled = (mode == 2)
+        pid_mode_enabled = (mode == 3)
         
         for i in range(len(self.fan_mode_radio_buttons)):
             self.fan_mode_radio_buttons[i].setChecked(True if i == mode else False)
@@ -570,11 +820,17 @@ class FanTab(QWidget):
         self.enable_widget_with_style(self.fan_case_high_speed_slider_label, self.slider_label_style, self.slider_label_disabled_style, temp_mode_enabled)
         self.enable_widget_with_style(self.fan_case_high_speed_slider, self.blue_slider_style, self.gray_slider_style, temp_mode_enabled)
         self.enable_widget_with_style(self.fan_case_high_speed_slider_value, self.slider_label_style, self.slider_label_disabled_style, temp_mode_enabled)
+        self.enable_widget_with_style(self.fan_curve_button, self.button_style, self.button_disabled_style, temp_mode_enabled)
         
         self.enable_widget_with_style(self.fan_manual_slider_label, self.slider_label_style, self.slider_label_disabled_style, manual_mode_enabled)
         self.enable_widget_with_style(self.fan_manual_slider, self.yellow_slider_style, self.gray_slider_style, manual_mode_enabled)
         self.enable_widget_with_style(self.fan_manual_slider_value, self.slider_label_style, self.slider_label_disabled_style, manual_mode_enabled)
 
+        self.enable_widget_with_style(self.fan_pid_setpoint_label, self.slider_label_style, self.slider_label_disabled_style, pid_mode_enabled)
+        self.enable_widget_with_style(self.fan_pid_setpoint_input, self.line_edit_style, self.line_edit_disabled_style, pid_mode_enabled)
+        self.enable_widget_with_style(self.fan_pid_setpoint_minus_btn, self.button_style, self.button_disabled_style, pid_mode_enabled)
+        self.enable_widget_with_style(self.fan_pid_setpoint_plus_btn, self.button_style, self.button_disabled_style, pid_mode_enabled)
+
     
     def on_temp_mode_low_speed_changed(self, value):
         self.fan_case_low_speed_slider_value.setText(str(value))
@@ -0,0 +1,163 @@
+# check_latency.py
+import os
+import sys
+import time
+import ctypes
+import shutil
+import argparse
+import subprocess
+import multiprocessing
+
+from api_json import get_config_manager
+
+_POLICIES = {
+    'other': os.SCHED_OTHER,
+    'batch': os.SCHED_BATCH,
+    'idle': os.SCHED_IDLE,
+    'fifo': os.SCHED_FIFO,
+    'rr': os.SCHED_RR,
+}
+
+# Probe name -> (unit whose profile is applied, loop period in seconds as used by the task)
+PROBES = {
+    'led': ('task_led.service', 0.1),
+    'fan': ('task_fan.service', 1.0),
+}
+
+
+def parse_cpu_list(text):
+    """Parse a CPUAffinity value such as "1", "0-1" or "0 2" into a set of CPU numbers"""
+    cpus = set()
+    for part in text.replace(',', ' ').split():
+        if '-' in part:
+            first, last = part.split('-')
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+def apply_profile(profile):
+    """
+    Apply a scheduling profile to the calling process, the way systemd applies it to the unit
+
+    Returns:
+        list: Settings that could not be applied (usually missing root rights)
+    """
+    failed = []
+    if profile.cpu_affinity:
+        try:
+            os.sched_setaffinity(0, parse_cpu_list(profile.cpu_affinity))
+        except OSError as e:
+            failed.append(f"CPUAffinity={profile.cpu_affinity}: {e}")
+    try:
+        os.setpriority(os.PRIO_PROCESS, 0, profile.nice)
+    except OSError as e:
+        failed.append(f"Nice={profile.nice}: {e}")
+    try:
+        os.sched_setscheduler(0, _POLICIES[profile.policy], os.sched_param(profile.priority))
+    except OSError as e:
+        failed.append(f"CPUSchedulingPolicy={profile.policy}: {e}")
+    if profile.mlockall:
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.mlockall(3) != 0:  # MCL_CURRENT | MCL_FUTURE
+            failed.append(f"mlockall: {os.strerror(ctypes.get_errno())}")
+    return failed
+
+def measure_period(period, duration):
+    """
+    Run a periodic loop on absolute deadlines and record how late every wakeup was
+
+    Returns:
+        list: Lateness of each wakeup in seconds
+    """
+    lateness = []
+    deadline = time.monotonic()
+    end = deadline + duration
+    while deadline < end:
+        deadline += period
+        remaining = deadline - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        lateness.append(time.monotonic() - deadline)
+    return lateness
+
+def _run_probe(profile, period, duration, queue):
+    failed = apply_profile(profile)
+    queue.put((failed, measure_period(period, duration)))
+
+def run_probes(names, duration, config_file='app_config.json'):
+    """
+    Measure the loop timing of several tasks at the same time, like the real tasks run,
+    each in a child process with the task's scheduling profile
+
+    Returns:
+        list: One dict per probe with the unapplied settings, sample count and p50/p99/max lateness in milliseconds
+    """
+    scheduling = get_config_manager(config_file).get_typed_section('Scheduling')
+    jobs = []
+    for name in names:
+        service_name, period = PROBES[name]
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_run_probe, args=(scheduling.get_profile(service_name), period, duration, queue))
+        process.start()
+        jobs.append((name, process, queue))
+
+    results = []
+    for name, process, queue in jobs:
+        failed, lateness = queue.get()
+        process.join()
+        lateness.sort()
+        results.append({
+            'name': name,
+            'failed': failed,
+            'samples': len(lateness),
+            'p50_ms': lateness[len(lateness) // 2] * 1000,
+            'p99_ms': lateness[min(len(lateness) - 1, int(len(lateness) * 0.99))] * 1000,
+            'max_ms': lateness[-1] * 1000,
+        })
+    return results
+
+def start_stress(duration):
+    """Start stress-ng with CPU, I/O and memory load on all CPUs, None if it is not installed"""
+    if shutil.which('stress-ng') is None:
+        return None
+    return subprocess.Popen(
+        ['stress-ng', '--cpu', '0', '--io', '2', '--vm', '1', '--vm-bytes', '25%', '--timeout', f'{int(duration) + 5}s'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check LED frame jitter and fan loop period under background load')
+    parser.add_argument('--duration', type=float, default=60.0, help='Seconds to measure')
+    parser.add_argument('--led-bound-ms', type=float, default=2.0, help='Maximum p99 lateness of an LED frame')
+    parser.add_argument('--fan-bound-ms', type=float, default=10.0, help='Maximum p99 lateness of a fan loop iteration')
+    parser.add_argument('--no-stress', action='store_true', help='Measure without stress-ng load')
+    parser.add_argument('--config-file', default='app_config.json', help='Path to config file')
+    args = parser.parse_args()
+
+    stress = None
+    if not args.no_stress:
+        stress = start_stress(args.duration)
+        if stress is None:
+            print("Error: stress-ng is not installed (sudo apt install stress-ng), or use --no-stress")
+            sys.exit(2)
+        time.sleep(1.0)  # Let the load ramp up
+
+    bounds = {'led': args.led_bound_ms, 'fan': args.fan_bound_ms}
+    passed = True
+    try:
+        results = run_probes(list(PROBES), args.duration, args.config_file)
+    finally:
+        if stress is not None:
+            stress.terminate()
+            stress.wait()
+
+    for result in results:
+        ok = result['p99_ms'] <= bounds[result['name']]
+        passed = passed and ok
+        print(f"{result['name']:>4}: {result['samples']} wakeups, lateness p50 {result['p50_ms']:.3f} ms, "
+              f"p99 {result['p99_ms']:.3f} ms, max {result['max_ms']:.3f} ms "
+              f"(bound {bounds[result['name']]:.1f} ms) {'OK' if ok else 'FAIL'}")
+        for failure in result['failed']:
+            print(f"      not applied (run as root on the Pi for real numbers): {failure}")
+    sys.exit(0 if passed else 1)
@@ -9,4 +9,5 @@ if [ ! -f "app_ui.py" ]; then
     exit 1
 fi
 
-sudo python app_ui.py
\ No newline at end of file
+# Keep bytecode in the shared root-owned cache instead of root-owned __pycache__ folders in the source tree
+sudo PYTHONPYCACHEPREFIX=/var/cache/freenove_computer_case/pycache python app_ui.py
\ No newline at end of file
@@ -1,26 +1,146 @@
+from api_startup import startup_profiler   # First import, so every import after it is timed
+import os
 import time
 import sys
 import signal
+import threading
+from abc import ABC, abstractmethod
+from api_systemd import SystemdNotifier, get_state_directory
+from api_config_schema import FanConfig, from_dict
+from api_fan_control import SensorPolicy, FanOutput, FanHealthMonitor, PIDController, CpuLoadSampler, TickHistogram, create_temperature_filter, create_slope_predictor
+from api_telemetry import TelemetryWriter, Heartbeat
+from api_sensors import SensorRegistry, ThrottleMonitor, CPU_SENSOR
+
+class FanStrategy(ABC):
+    """Control strategy of one fan mode, run by the FAN_TASK scheduler"""
+    period = 1.0    # Seconds between two ticks
+
+    def __init__(self, task):
+        self.task = task
+
+    def enter(self):
+        """Called when the mode becomes active"""
+
+    @abstractmethod
+    def tick(self):
+        """Evaluate the strategy once, exceptions skip the watchdog ping of this tick"""
+
+    def get_stats(self):
+        """Values of the strategy published with the fan telemetry"""
+        return {}
+
+
+class TempModeStrategy(FanStrategy):
+    def enter(self):
+        self.prediction_config = None
+        self.projected_temperature = None
+
+    def project(self, temperatures):
+        """Project every sensor ahead by its slope, so the fan spins up before the curve is reached"""
+        config = self.task.pi_fan_prediction_config
+        if config is not self.prediction_config:
+            self.prediction_config = config
+            self.predictors = {}
+        if config.horizon <= 0:
+            return temperatures
+        projected = {}
+        for sensor_id, temp in temperatures.items():
+            if sensor_id not in self.predictors:
+                self.predictors[sensor_id] = create_slope_predictor(config)
+            projected[sensor_id] = self.predictors[sensor_id].update(temp)
+        return projected
+
+    def tick(self):
+        task = self.task
+        policy = task.get_sensor_policy()
+        task.take_pwm_control()
+        temperatures = self.project(task.read_temperatures(policy))
+        self.projected_temperature = policy.temperature(temperatures)
+        current_duty = task.pi_fan_requested_duty if task.fan_output.duty is not None else None
+        if current_duty is None:
+            current_duty = task.system_information.get_raspberry_pi_fan_duty()
+
+        # Follow the curves up at once, come down only when the curves are hysteresis °C lower
+        duty = policy.get_duty(temperatures, current_duty, task.pi_fan_temp_mode_config.fan_temp_threshold_hyst)
+        task.apply_duty(task.boost_duty(duty))
+
+    def get_stats(self):
+        return {'temperature_projected': self.projected_temperature}
+
+
+class ManualModeStrategy(FanStrategy):
+    period = 2.0
+
+    def tick(self):
+        self.task.take_pwm_control()
+        self.task.apply_duty(self.task.pi_fan_manual_mode_duty, exact=True)
+
+
+class KernelModeStrategy(FanStrategy):
+    def tick(self):
+        task = self.task
+        if task.system_information.get_cpu_thermal_control() == 0:
+            task.system_information.set_cpu_thermal_control(1)
+            task.system_information.set_pi_pwm_enable(1)
+            task.fan_output.reset()  # The kernel writes the PWM now
+        task.fan_health.update(task.system_information.get_raspberry_pi_fan_duty(),
+                               task.system_information.get_raspberry_pi_fan_rpm())
+
+
+class PidModeStrategy(FanStrategy):
+    def enter(self):
+        self.pid_config = self.task.pi_fan_pid_mode_config
+        self.controller = PIDController.from_config(self.pid_config)
+        self.cpu_load = CpuLoadSampler()
+        self.cpu_load.sample()
+
+    def tick(self):
+        task = self.task
+        if task.pi_fan_pid_mode_config is not self.pid_config:
+            # New parameters from the UI, keep the integral so the fan does not jump
+            self.pid_config = task.pi_fan_pid_mode_config
+            self.controller.configure(self.pid_config)
+        policy = task.get_sensor_policy()
+        task.take_pwm_control()
+        current_temp = policy.temperature(task.read_temperatures(policy))
+
+        # Feed-forward: CPU load raises the duty before the die has heated up
+        load = self.cpu_load.sample()
+        feed_forward = self.pid_config.feed_forward_gain * load if load is not None else 0.0
+        task.apply_duty(task.boost_duty(self.controller.update(current_temp, feed_forward)))
+
 
 class FAN_TASK:
+    HEARTBEAT_FAILURE_LIMIT = 5.0   # Seconds, well below the task_fan_watchdog timeout
+
     def __init__(self, config):
         signal.signal(signal.SIGTERM, self.signal_handler)
         signal.signal(signal.SIGINT, self.signal_handler)
+        self.notifier = SystemdNotifier()
     
-        self.pi_fan_mode = config.get('mode', 1)  # 0: manual, 1: temp, 2: code
-        self.pi_fan_manual_mode_duty = config.get('manual_mode_duty', 255)  # 0-255
-        self.pi_fan_temp_mode_threshold = config.get('temp_mode_config', {
-            "fan_temp_threshold_low": 45,
-            "fan_temp_threshold_high": 80,
-            "fan_temp_threshold_hyst": 3,
-            "fan_temp_mode_duty_low": 50,
-            "fan_temp_mode_duty_high": 200
-        })
-        # Speed array for each effect, index corresponds to mode number
-        speed = [1.0, 2.0, 1.0]  # Manual, Temp, Code mode sleep times
-        while len(speed) < 3:
-            speed.append(0.1)
-        self.pi_fan_speed = speed
+        # config is a validated FanConfig, see api_config_schema
+        self.pi_fan_mode = config.mode  # 0: temp, 1: manual, 2: kernel, 3: PID
+        self.pi_fan_manual_mode_duty = config.manual_mode_duty  # 0-255
+        self.pi_fan_temp_mode_config = config.temp_mode_config
+        self.pi_fan_pid_mode_config = config.pid_mode_config
+        self.pi_fan_filter_config = config.filter_config
+        self.pi_fan_prediction_config = config.prediction_config
+        self.pi_fan_sensor_config = config.sensor_config
+        state_directory = get_state_directory()
+        self.sensor_registry = SensorRegistry(cache_file=os.path.join(state_directory, 'sensors.json'))
+        self.sensor_policy = None
+        self.temperature_filters = {}  # Sensor id -> filter, created on the first read
+        self.last_temperature = (None, None)  # Aggregated (raw, filtered) °C
+        self.last_sensor_temperatures = {}  # Sensor id -> filtered °C
+        self.pi_fan_throttle_config = config.throttle_config
+        self.throttle_monitor = ThrottleMonitor()
+        self.telemetry = TelemetryWriter('fan')
+        self.heartbeat = Heartbeat('fan')   # Liveness seen by task_fan_watchdog
+        self.heartbeat_failed_since = None  # Monotonic time of the first failed heartbeat in a row
+        self.fan_health = FanHealthMonitor(config.health_config, state_file=os.path.join(state_directory, 'fan_health.json'))
+        self.pi_fan_requested_duty = None  # Duty of the control loop, before the RPM compensation
+        self.mode_changed = threading.Event()  # Wakes the scheduler when the mode changes
+        self.tick_histogram = TickHistogram()
         
         try:
             from api_systemInfo import SystemInformation
@@ -28,122 +148,229 @@ class FAN_TASK:
             if self.system_information.get_cpu_thermal_control() == 1:
                 self.system_information.set_cpu_thermal_control(0)
             self.system_information.set_pi_pwm_enable(1)
-            self.system_information.set_pi_pwm_duty(0)   
+            output_config = config.output_config
+            self.fan_output = FanOutput(self.system_information, config.filter_config.duty_deadband,
+                                        output_config.slew_rate, output_config.kick_duty, output_config.kick_time)
+            self.fan_output.write(0)
+            startup_profiler.mark('first_pwm_write')
+            startup_profiler.report()
         except Exception as e:
             print(f"Fan initialization failed: {e}")
             sys.exit(1)
+        self.notifier.ready()
     def signal_handler(self, signum, frame):
         self.stop()
-        
-    def _calculate_linear_duty(self, current_temp, low_threshold, high_threshold, min_duty, max_duty):
-        temp_range = high_threshold - low_threshold
-        duty_range = max_duty - min_duty
-        temp_position = current_temp - low_threshold
-        duty = int((temp_position / temp_range) * duty_range + min_duty)
-        return max(min_duty, min(max_duty, duty))
-    
-    def fan_run_temp_mode(self):
-        try:
-            while True:
-                if self.pi_fan_mode != 0:
-                    return  # Exit if mode changed
-                    
-                if self.system_information.get_cpu_thermal_control() == 1:
-                    self.system_information.set_cpu_thermal_control(0)
-                    self.system_information.set_pi_pwm_enable(1)
-                current_temp = round(self.system_information.get_raspberry_pi_cpu_temperature(), 2)
-
-                low_temp = self.pi_fan_temp_mode_threshold["fan_temp_threshold_low"]      # 45°C
-                high_temp = self.pi_fan_temp_mode_threshold["fan_temp_threshold_high"]    # 80°C
-                hysteresis = self.pi_fan_temp_mode_threshold["fan_temp_threshold_hyst"]  # 3°C
-                low_temp_duty = self.pi_fan_temp_mode_threshold["fan_temp_mode_duty_low"]     # 50
-                high_temp_duty = self.pi_fan_temp_mode_threshold["fan_temp_mode_duty_high"]   # 200
-                
-                # Calculate hysteresis thresholds
-                low_temp_off = low_temp - hysteresis    # 45 - 3 = 42°C (fan off temperature)
-                high_temp_off = high_temp - hysteresis  # 80 - 3 = 77°C (temperature to return to linear control from full speed)
-                
-                current_duty = self.system_information.get_raspberry_pi_fan_duty()
-                
-                # Determine duty based on temperature and current state
-                if current_duty == 0 and current_temp >= low_temp:
-                    # Turn on fan and enter linear control range
-                    duty = self._calculate_linear_duty(current_temp, low_temp, high_temp, low_temp_duty, high_temp_duty)
-                    self.system_information.set_pi_pwm_duty(duty)
-                elif current_temp >= high_temp:
-                    # Keep fan at maximum speed 255
-                    self.system_information.set_pi_pwm_duty(255)
-                elif current_duty == 255 and current_temp <= high_temp_off:
-                    # Enter linear control range from full speed
-                    duty = self._calculate_linear_duty(current_temp, low_temp, high_temp, low_temp_duty, high_temp_duty)
-                    self.system_information.set_pi_pwm_duty(duty)
-                elif current_duty > 0 and current_temp <= low_temp_off:
-                    # Turn off fan
-                    self.system_information.set_pi_pwm_duty(0)
-                elif low_temp < current_temp < high_temp:
-                    # Linear control range: adjust speed proportionally
-                    duty = self._calculate_linear_duty(current_temp, low_temp, high_temp, low_temp_duty, high_temp_duty)
-                    self.system_information.set_pi_pwm_duty(duty)
-                elif low_temp_off < current_temp < low_temp and current_duty > 0:
-                    # Keep minimum speed when between thresholds
-                    self.system_information.set_pi_pwm_duty(low_temp_duty)
-                
-                # Sleep based on configured speed
-                time.sleep(self.pi_fan_speed[0])
-        except Exception as e:
-            print(f"Error in temp mode: {e}")
-    
-    def fan_run_manual_mode(self):
-        try:
-            # Continuous loop until mode changes
-            while True:
-                if self.pi_fan_mode != 1:
-                    return  # Exit if mode changed
-                if self.system_information.get_cpu_thermal_control() == 1:
-                    self.system_information.set_cpu_thermal_control(0)
-                    self.system_information.set_pi_pwm_enable(1)
-                self.system_information.set_pi_pwm_duty(self.pi_fan_manual_mode_duty)
-                time.sleep(self.pi_fan_speed[1])  # Sleep based on configured speed
-        except Exception as e:
-            print(f"Error in manual mode: {e}")
-    
-    def fan_run_original_mode(self):
+
+    def apply_config_changes(self, changes):
+        """
+        Apply fan configuration changes published by ConfigManager
+        Args:
+            changes: List of (section, key, old_value, new_value)
+        """
+        updates = {key: new_value for section, key, old_value, new_value in changes}
         try:
-            while True:
-                if self.pi_fan_mode != 2:
-                    return  # Exit if mode changed
-                if self.system_information.get_cpu_thermal_control() == 0:
-                    self.system_information.set_cpu_thermal_control(1)
-                    self.system_information.set_pi_pwm_enable(1)
-                time.sleep(self.pi_fan_speed[2])
-        except Exception as e:
-            print(f"Error in original mode: {e}")
+            config = from_dict(FanConfig, updates)
+        except ValueError as e:
+            print(f"Ignoring invalid fan configuration change: {e}")
+            return
+        if 'mode' in updates:
+            self.pi_fan_mode = config.mode
+            self.mode_changed.set()
+        if 'manual_mode_duty' in updates:
+            self.pi_fan_manual_mode_duty = config.manual_mode_duty
+        if 'temp_mode_config' in updates:
+            self.pi_fan_temp_mode_config = config.temp_mode_config
+        if 'pid_mode_config' in updates:
+            self.pi_fan_pid_mode_config = config.pid_mode_config
+        if 'filter_config' in updates:
+            self.pi_fan_filter_config = config.filter_config
+            self.temperature_filters = {}
+            self.fan_output.deadband = config.filter_config.duty_deadband
+        if 'output_config' in updates:
+            self.fan_output.slew_rate = config.output_config.slew_rate
+            self.fan_output.kick_duty = config.output_config.kick_duty
+            self.fan_output.kick_time = config.output_config.kick_time
+        if 'prediction_config' in updates:
+            self.pi_fan_prediction_config = config.prediction_config
+        if 'health_config' in updates:
+            self.fan_health.config = config.health_config
+        if 'sensor_config' in updates:
+            self.pi_fan_sensor_config = config.sensor_config
+        if 'throttle_config' in updates:
+            self.pi_fan_throttle_config = config.throttle_config
+
+    def get_sensor_policy(self):
+        """SensorPolicy of the current sensor and temperature mode configuration, rebuilt when either changes"""
+        sensor_config, temp_config = self.pi_fan_sensor_config, self.pi_fan_temp_mode_config
+        if self.sensor_policy is None or self.sensor_policy_configs != (sensor_config, temp_config):
+            # Compile the curves once per configuration, a tick is then a table lookup per sensor
+            self.sensor_policy_configs = (sensor_config, temp_config)
+            self.sensor_policy = SensorPolicy(sensor_config, temp_config.curve_points)
+            missing = [sensor_id for sensor_id in self.sensor_policy.sensor_ids or () if sensor_id not in self.sensor_registry.sensors]
+            if missing:
+                # A drive or HAT added since the sensors were cached
+                self.sensor_registry.rediscover()
+                missing = [sensor_id for sensor_id in missing if sensor_id not in self.sensor_registry.sensors]
+                if missing:
+                    print(f"Fan sensors not found: {', '.join(missing)}")
+        return self.sensor_policy
+
+    def read_temperatures(self, policy):
+        """
+        Read the sensors of a policy, each through its own instance of the configured filter
+
+        Args:
+            policy: SensorPolicy
+
+        Returns:
+            dict: Sensor id -> filtered °C, the CPU temperature if no sensor could be read
+        """
+        raw = self.sensor_registry.read_all(policy.sensor_ids)
+        if not raw:
+            raw = {CPU_SENSOR: self.system_information.get_raspberry_pi_cpu_temperature()}
+        temperatures = {}
+        for sensor_id, raw_temp in raw.items():
+            if sensor_id not in self.temperature_filters:
+                self.temperature_filters[sensor_id] = create_temperature_filter(self.pi_fan_filter_config)
+            temperature_filter = self.temperature_filters[sensor_id]
+            temperatures[sensor_id] = raw_temp if temperature_filter is None else temperature_filter.update(raw_temp)
+        self.last_temperature = (policy.temperature(raw), policy.temperature(temperatures))
+        self.last_sensor_temperatures = temperatures
+        return temperatures
+
+    def boost_duty(self, duty, now=None):
+        """
+        Raise the duty of temperature and PID mode while the firmware limits the CPU for temperature
+
+        The temperature the fan follows can still be below the curve when the firmware already
+        caps the clock, so the boost starts at the onset and is held boost_time after it ended.
+
+        Args:
+            duty: Duty of the control loop
+
+        Returns:
+            int: duty, or boost_duty if that is higher and the boost is active
+        """
+        now = time.monotonic() if now is None else now
+        limited_at = self.throttle_monitor.limited_at
+        config = self.pi_fan_throttle_config
+        if limited_at is not None and now - limited_at <= config.boost_time:
+            return max(duty, config.boost_duty)
+        return duty
+
+    def apply_duty(self, duty, exact=False):
+        """
+        Write the duty of a control loop, raised by the fan health monitor if the fan turns too slowly
+
+        Args:
+            duty: Requested duty, 0-255
+            exact: Write any change regardless of the deadband
+        """
+        self.fan_health.update(self.fan_output.duty, self.system_information.get_raspberry_pi_fan_rpm())
+        self.pi_fan_requested_duty = duty
+        return self.fan_output.write(self.fan_health.adjust_duty(duty), exact)
+
+    def publish_telemetry(self, strategy_stats=None):
+        """Publish temperature, duty, RPM, fan health and PWM write counters to /dev/shm, see api_telemetry"""
+        raw_temp, temp = self.last_temperature
+        self.telemetry.publish({
+            'mode': self.pi_fan_mode,
+            **(strategy_stats or {}),
+            'temperature_raw': raw_temp,
+            'temperature': temp,
+            'sensors': {sensor_id: round(value, 1) for sensor_id, value in self.last_sensor_temperatures.items()},
+            **self.fan_output.get_stats(),
+            **self.fan_health.get_stats(),
+            **self.throttle_monitor.get_stats(),
+            **self.tick_histogram.get_stats(),
+        })
+        
+    def beat(self, now):
+        """
+        Report a completed tick to task_fan_watchdog and to the systemd watchdog
+
+        Both see the same liveness: without a heartbeat file the systemd watchdog is not pinged
+        either. If the heartbeat cannot be written for HEARTBEAT_FAILURE_LIMIT seconds the task
+        stops and hands the fan back to the kernel, rather than being restored under its feet.
+        """
+        if self.heartbeat.beat():
+            self.heartbeat_failed_since = None
+            self.notifier.ping()
+            return
+        if self.heartbeat_failed_since is None:
+            self.heartbeat_failed_since = now
+        elif now - self.heartbeat_failed_since >= self.HEARTBEAT_FAILURE_LIMIT:
+            print(f"No heartbeat written for {self.HEARTBEAT_FAILURE_LIMIT:.0f} s, stopping the fan task")
+            self.stop()
+
+    def take_pwm_control(self):
+        """Switch the kernel thermal control off so the PWM duty written by this task applies"""
+        if self.system_information.get_cpu_thermal_control() == 1:
+            self.system_information.set_cpu_thermal_control(0)
+            self.system_information.set_pi_pwm_enable(1)
+            self.fan_output.reset()
 
     def run_fan_loop(self):
-        # Create mode function mapping
-        mode_functions = {
-            0: self.fan_run_temp_mode,      # Temperature
-            1: self.fan_run_manual_mode,    # Manual
-            2: self.fan_run_original_mode   # Code
+        """
+        Single fan scheduler: evaluate the strategy of the active mode once per period
+
+        A mode change wakes the loop, the new strategy is entered and ticked right away.
+        Between the ticks the loop only wakes for the kick-start and slew steps of the output.
+        """
+        strategies = {
+            0: TempModeStrategy(self),      # Temperature curve
+            1: ManualModeStrategy(self),    # Manual duty
+            2: KernelModeStrategy(self),    # Kernel thermal control
+            3: PidModeStrategy(self)        # PID
         }
-        
-        last_check_time = time.time()
-        check_interval = 2.0
+        mode = None
+        strategy = None
+        next_tick = time.monotonic()
 
         while True:
-            current_time = time.time()
-            if current_time - last_check_time >= check_interval:
-                # Get corresponding function and execute
-                mode_func = mode_functions.get(self.pi_fan_mode, self.fan_run_original_mode)
-                if mode_func:
-                    try:
-                        # Execute mode function
-                        mode_func()
-                    except Exception as e:
-                        print(f"Error in fan mode function: {e}")
-            time.sleep(0.3)
+            self.mode_changed.clear()
+            if self.pi_fan_mode != mode:
+                mode = self.pi_fan_mode
+                strategy = strategies.get(mode, strategies[2])
+                strategy.enter()
+
+            tick_start = time.monotonic()
+            try:
+                if self.throttle_monitor.update(tick_start):
+                    print(f"CPU throttled by the firmware (state {self.throttle_monitor.state:#x}, "
+                          f"{self.throttle_monitor.freq_mhz} MHz), event {self.throttle_monitor.throttle_events}")
+                strategy.tick()
+                self.beat(tick_start)  # Only completed ticks keep the watchdogs alive
+            except Exception as e:
+                print(f"Error in fan mode {mode}: {e}")
+            self.publish_telemetry(strategy.get_stats())
+            tick_end = time.monotonic()
+            self.tick_histogram.record(tick_end - tick_start, tick_start - next_tick)
+
+            # Next wakeup on the period grid, skip missed ticks instead of running them in a burst
+            next_tick += strategy.period
+            if next_tick < tick_end:
+                next_tick = tick_end
+            while True:
+                wakeup = next_tick
+                output_time = self.fan_output.next_update_time()
+                if output_time is not None and output_time < next_tick:
+                    wakeup = output_time
+                if self.mode_changed.wait(max(0.0, wakeup - time.monotonic())):
+                    next_tick = time.monotonic()
+                    break
+                if wakeup == next_tick:
+                    break
+                self.fan_output.update()
     
     def stop(self):
+        self.notifier.stopping()
+        print(self.tick_histogram.format())
+        self.telemetry.remove()
+        self.heartbeat.remove()
+        self.sensor_registry.close()
+        self.throttle_monitor.close()
+        self.fan_health.save()
         self.system_information.set_pi_pwm_duty(0)
         self.system_information.set_pi_pwm_enable(1)
         self.system_information.set_cpu_thermal_control(1)
@@ -152,25 +379,33 @@ class FAN_TASK:
 
 if __name__ == "__main__":
     import argparse
-    from api_json import ConfigManager
+    from api_systemd import lock_memory_if_requested
+    import dataclasses
+    from api_json import get_config_manager
     
     parser = argparse.ArgumentParser(description='Fan Task Controller')
-    parser.add_argument('mode', nargs='?', type=int, help='Fan mode (0-2)')
+    parser.add_argument('mode', nargs='?', type=int, help='Fan mode (0-3)')
     parser.add_argument('--config-file', default='app_config.json', help='Path to config file')
+    parser.add_argument('--profile-startup', action='store_true', help='Print import times and time to first PWM write')
     args = parser.parse_args()
     
-    config_manager = ConfigManager(args.config_file)
-    fan_config = config_manager.get_section('Fan')
+    config_manager = get_config_manager(args.config_file)
+    fan_config = config_manager.get_typed_section('Fan')
     
     if args.mode is not None:
-        if 0 <= args.mode <= 2:
-            fan_config['mode'] = args.mode
+        if 0 <= args.mode <= 3:
+            fan_config = dataclasses.replace(fan_config, mode=args.mode)
             print(f"Setting Fan mode to: {args.mode}")
         else:
-            print("Error: Mode must be between 0 and 2")
+            print("Error: Mode must be between 0 and 3")
             sys.exit(1)
     
     fan_task = FAN_TASK(fan_config)
+    lock_memory_if_requested()
+    if args.mode is None:
+        # Follow changes made in the UI without restarting the service
+        config_manager.subscribe(fan_task.apply_config_changes, sections=('Fan',))
+        config_manager.watch()
 
     try:
         fan_task.run_fan_loop()
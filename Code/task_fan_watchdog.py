@@ -0,0 +1,132 @@
+import time
+import sys
+import signal
+import subprocess
+from api_systemd import SystemdNotifier
+from api_systemInfo import SystemInformation
+from api_telemetry import read_heartbeat_age
+
+
+def is_unit_active(service_name):
+    """
+    Check whether systemd runs a unit
+
+    Returns:
+        bool: True if the unit is active (or still being started or reloaded)
+    """
+    try:
+        result = subprocess.run(['systemctl', 'is-active', service_name],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, timeout=5)
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    return result.stdout.strip() in ('active', 'activating', 'reloading')
+
+
+def restore_kernel_fan_control(system_information):
+    """
+    Hand the fan back to the kernel thermal governor, as FAN_TASK.stop() does
+
+    The last duty is left as it is, the governor sets its own as soon as thermal_zone0 is enabled.
+
+    Returns:
+        bool: True if the kernel control was off and has been restored
+    """
+    if system_information.get_cpu_thermal_control() == 1:
+        return False
+    system_information.set_pi_pwm_enable(1)
+    system_information.set_cpu_thermal_control(1)
+    return True
+
+
+class FAN_WATCHDOG_TASK:
+    FAN_SERVICE = 'task_fan.service'
+
+    def __init__(self, timeout=15.0, period=1.0):
+        """
+        Restore the kernel fan control when the fan task is no longer alive
+
+        The fan task touches a heartbeat file after every completed tick, see FAN_TASK.beat().
+        While task_fan.service is active, its own WatchdogSec and ExecStopPost hook handle a hung
+        task, so only a fan task outside the unit (started by hand, or left behind) is judged by
+        its heartbeat: kernel thermal control that is off without one for timeout seconds means
+        that task was killed or hangs.
+
+        Args:
+            timeout: Seconds without a heartbeat before the kernel control is restored
+            period: Seconds between two checks
+        """
+        signal.signal(signal.SIGTERM, self.signal_handler)
+        signal.signal(signal.SIGINT, self.signal_handler)
+        self.notifier = SystemdNotifier()
+        self.system_information = SystemInformation()
+        self.timeout = timeout
+        self.period = period
+        self.stale_since = None     # Monotonic time the kernel control was first seen off without a heartbeat
+        self.restores = 0
+        self.notifier.ready()
+
+    def signal_handler(self, signum, frame):
+        self.stop()
+
+    def check(self, now=None):
+        """
+        Check the heartbeat once
+
+        Returns:
+            bool: True if the kernel control was restored
+        """
+        now = time.monotonic() if now is None else now
+        if self.system_information.get_cpu_thermal_control() != 0:
+            self.stale_since = None
+            return False
+        age = read_heartbeat_age('fan')
+        if age is not None and age <= self.timeout:
+            self.stale_since = None
+            return False
+        if is_unit_active(self.FAN_SERVICE):
+            self.stale_since = None   # systemd supervises it, see FAN_TASK.beat()
+            return False
+        # The task switches the kernel control off before its first tick, give it the timeout to publish
+        if self.stale_since is None:
+            self.stale_since = now
+            return False
+        if now - self.stale_since < self.timeout:
+            return False
+        self.stale_since = None
+        if restore_kernel_fan_control(self.system_information):
+            self.restores += 1
+            print(f"No fan task heartbeat for {self.timeout:.0f} s, kernel thermal control restored")
+            return True
+        return False
+
+    def run_watchdog_loop(self):
+        while True:
+            self.check()
+            self.notifier.ping()
+            time.sleep(self.period)
+
+    def stop(self):
+        self.notifier.stopping()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Fan Safety Watchdog')
+    parser.add_argument('--restore', action='store_true', help='Restore the kernel fan control once and exit (ExecStopPost of task_fan.service)')
+    parser.add_argument('--timeout', type=float, default=15.0, help='Seconds without a fan task heartbeat before the kernel control is restored')
+    args = parser.parse_args()
+
+    if args.restore:
+        if restore_kernel_fan_control(SystemInformation()):
+            print("Fan task stopped, kernel thermal control restored")
+        sys.exit(0)
+
+    watchdog_task = FAN_WATCHDOG_TASK(args.timeout)
+    try:
+        watchdog_task.run_watchdog_loop()
+    except KeyboardInterrupt:
+        print("Fan watchdog stopped")
+    finally:
+        watchdog_task.stop()
@@ -1,19 +1,22 @@
+from api_startup import startup_profiler   # First import, so every import after it is timed
 import time
 import sys
 import signal
+from api_systemd import SystemdNotifier
+from api_config_schema import LedConfig, from_dict
 
 class LED_TASK:
     def __init__(self, config):
         signal.signal(signal.SIGTERM, self.signal_handler)
         signal.signal(signal.SIGINT, self.signal_handler)
+        self.notifier = SystemdNotifier()
+        self.first_show_pending = True
 
-        self.pi_led_mode = config.get('mode', 6)
-        self.pi_led_brightness = config.get('brightness', 255)
-        self.pi_led_color = (
-            config.get('red_value', 0),
-            config.get('green_value', 0),
-            config.get('blue_value', 255)
-        )
+        # config is a validated LedConfig, see api_config_schema
+        self.pi_led_mode = config.mode
+        self.pi_led_brightness = config.brightness
+        self.pi_led_brightness_changed = False  # Set by the config watcher, applied by the LED loop in show_frame()
+        self.pi_led_color = config.color
 
         speed = [0.1, 0.1, 0.1, 0.3, 0.1, 0.1, 0.1, 0.3, 1.0]
         while len(speed) < 9:
@@ -25,9 +28,9 @@ class LED_TASK:
         self.breathing_mode_step_length = 6
         
         try:
-            from api_json import ConfigManager
+            from api_json import get_config_manager
             from api_ws2812 import WS2812
-            config_manager = ConfigManager()
+            config_manager = get_config_manager()
             if config_manager.get_kit_type() == 1:
                 self.led_strip = WS2812(led_pin=26, led_count=6)
             elif config_manager.get_kit_type() == 2:
@@ -38,9 +41,46 @@ class LED_TASK:
         except Exception as e:
             print(f"LED initialization failed: {e}")
             sys.exit(1)
+        self.notifier.ready()
     def signal_handler(self, signum, frame):
         self.stop()
 
+    def show_frame(self):
+        """Send the pixel buffer to the strip; a returned show() also counts as a completed loop iteration"""
+        if self.pi_led_brightness_changed:
+            # The strip is only touched from the LED loop, never while the watcher thread runs
+            self.pi_led_brightness_changed = False
+            self.led_strip.setBrightness(self.pi_led_brightness)
+        self.led_strip.show()
+        self.notifier.ping()
+        if self.first_show_pending:
+            self.first_show_pending = False
+            startup_profiler.mark('first_led_show')
+            startup_profiler.report()
+
+    def apply_config_changes(self, changes):
+        """
+        Apply LED configuration changes published by ConfigManager
+        Args:
+            changes: List of (section, key, old_value, new_value)
+        """
+        updates = {key: new_value for section, key, old_value, new_value in changes}
+        try:
+            config = from_dict(LedConfig, updates)
+        except ValueError as e:
+            print(f"Ignoring invalid LED configuration change: {e}")
+            return
+        if 'mode' in updates:
+            self.pi_led_mode = config.mode
+        if 'brightness' in updates:
+            self.pi_led_brightness = config.brightness
+            self.pi_led_brightness_changed = True
+        color = list(self.pi_led_color)
+        for i, key in enumerate(('red_value', 'green_value', 'blue_value')):
+            if key in updates:
+                color[i] = getattr(config, key)
+        self.pi_led_color = tuple(color)
+
     def led_run_rainbow_mode(self):
         step = 0
         led_count = self.led_strip.numPixels()
@@ -54,7 +94,7 @@ class LED_TASK:
             
             for i, color in enumerate(colors):
                 self.led_strip.setPixelColor(i, color)
-            self.led_strip.show()
+            self.show_frame()
             step = (step + self.rainbow_mode_step_length) % 256
             time.sleep(self.pi_led_speed[0])
 
@@ -66,7 +106,7 @@ class LED_TASK:
             for i in range(self.led_strip.numPixels()):
                 color = self.led_strip.wheel((i + step) % 255)
                 self.led_strip.setPixelColor(i, color)
-            self.led_strip.show()
+            self.show_frame()
             step = (step + self.gradual_mode_step_length) % 256
             time.sleep(self.pi_led_speed[1])
     
@@ -78,8 +118,9 @@ class LED_TASK:
                 return  # Exit if mode changed
             for i in range(self.led_strip.numPixels()):
                 self.led_strip.setPixelColor(i, self.pi_led_color)
+            self.pi_led_brightness_changed = False  # Scaled from pi_led_brightness on every frame
             self.led_strip.setBrightness(int(self.pi_led_brightness * (step / 150)))
-            self.led_strip.show()
+            self.show_frame()
             if direction == 1:
                 if step < 150:
                     step = step + self.breathing_mode_step_length
@@ -103,7 +144,7 @@ class LED_TASK:
                     self.led_strip.setPixelColor(i, self.pi_led_color)
                 else:
                     self.led_strip.setPixelColor(i, (0, 0, 0))
-            self.led_strip.show()
+            self.show_frame()
             state = 1 - state 
             time.sleep(self.pi_led_speed[3])
     
@@ -118,7 +159,7 @@ class LED_TASK:
                 self.led_strip.setPixelColor(i, (0, 0, 0))
             idx1 = step % ledNum
             self.led_strip.setPixelColor(idx1, self.pi_led_color)
-            self.led_strip.show()
+            self.show_frame()
             step += 1
             time.sleep(self.pi_led_speed[4])
 
@@ -134,7 +175,7 @@ class LED_TASK:
             for j in range(4):
                 idx = (step + j * (ledNum // 4)) % ledNum
                 self.led_strip.setPixelColor(idx, self.pi_led_color)
-            self.led_strip.show()
+            self.show_frame()
             step += 1
             time.sleep(self.pi_led_speed[5])
 
@@ -145,7 +186,7 @@ class LED_TASK:
             ledNum = self.led_strip.numPixels()
             for i in range(ledNum):
                 self.led_strip.setPixelColor(i, self.pi_led_color)
-            self.led_strip.show()
+            self.show_frame()
             time.sleep(self.pi_led_speed[6])
 
     def led_run_code_mode(self):
@@ -158,7 +199,7 @@ class LED_TASK:
                     return  # Exit if mode changed
                 for i in range(self.led_strip.numPixels()):
                     self.led_strip.setPixelColor(i, color)
-                self.led_strip.show()
+                self.show_frame()
                 time.sleep(self.pi_led_speed[7])
 
     def led_run_close_mode(self):
@@ -166,6 +207,7 @@ class LED_TASK:
             if self.pi_led_mode != 8:
                 return  # Exit if mode changed
             self.led_strip.clear()
+            self.notifier.ping()
             time.sleep(self.pi_led_speed[8])
 
     def run_led_loop(self):
@@ -187,6 +229,7 @@ class LED_TASK:
                 mode_func()
 
     def stop(self):
+        self.notifier.stopping()
         self.led_strip.clear()
         time.sleep(0.1)
         self.led_strip.deinit()
@@ -196,25 +239,33 @@ class LED_TASK:
 
 if __name__ == "__main__":
     import argparse
-    from api_json import ConfigManager
+    from api_systemd import lock_memory_if_requested
+    import dataclasses
+    from api_json import get_config_manager
     
     parser = argparse.ArgumentParser(description='LED Task Controller')
     parser.add_argument('mode', nargs='?', type=int, help='LED mode (0-9)')
     parser.add_argument('--config-file', default='app_config.json', help='Path to config file')
+    parser.add_argument('--profile-startup', action='store_true', help='Print import times and time to first LED update')
     args = parser.parse_args()
     
-    config_manager = ConfigManager(args.config_file)
-    led_config = config_manager.get_section('LED')
+    config_manager = get_config_manager(args.config_file)
+    led_config = config_manager.get_typed_section('LED')
 
     if args.mode is not None:
         if 0 <= args.mode <= 9:
-            led_config['mode'] = args.mode
+            led_config = dataclasses.replace(led_config, mode=args.mode)
             print(f"Setting LED mode to: {args.mode}")
         else:
             print("Error: Mode must be between 0 and 9")
             sys.exit(1)
     
     led_task = LED_TASK(led_config)
+    lock_memory_if_requested()
+    if args.mode is None:
+        # Follow changes made in the UI without restarting the service
+        config_manager.subscribe(led_task.apply_config_changes, sections=('LED',))
+        config_manager.watch()
     
     try:
         led_task.run_led_loop()
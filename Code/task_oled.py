@@ -1,10 +1,55 @@
+from api_startup import startup_profiler   # First import, so every import after it is timed
 from api_oled import OLED
 from api_systemInfo import SystemInformation
-from api_json import ConfigManager
+from api_json import get_config_manager
+from api_systemd import SystemdNotifier
+from api_telemetry import read_telemetry
+from api_sensors import UNDER_VOLTAGE, is_thermally_limited
 import signal
 import time
+import math
 import sys
 import argparse
+import ctypes
+import errno
+
+CLOCK_MONOTONIC = 1
+TIMER_ABSTIME = 1
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+def _load_clock_nanosleep():
+    """Load clock_nanosleep from libc, None if it is not available"""
+    try:
+        # The interpreter is already linked against libc; find_library('c') would spawn ldconfig
+        libc = ctypes.CDLL(None, use_errno=True)
+        clock_nanosleep = libc.clock_nanosleep
+        clock_nanosleep.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.POINTER(_Timespec), ctypes.POINTER(_Timespec)]
+        clock_nanosleep.restype = ctypes.c_int
+        return clock_nanosleep
+    except (OSError, AttributeError, TypeError):
+        return None
+
+_clock_nanosleep = _load_clock_nanosleep()
+
+def sleep_until(deadline):
+    """
+    Sleep until an absolute monotonic time, unaffected by wall-clock steps (NTP, RTC sync)
+    Args:
+        deadline: CLOCK_MONOTONIC deadline in seconds (same base as time.monotonic())
+    """
+    if _clock_nanosleep is not None:
+        seconds = math.floor(deadline)
+        request = _Timespec(int(seconds), int((deadline - seconds) * 1e9))
+        # clock_nanosleep returns the error number directly, retry when interrupted
+        while _clock_nanosleep(CLOCK_MONOTONIC, TIMER_ABSTIME, ctypes.byref(request), None) == errno.EINTR:
+            pass
+    else:
+        remaining = deadline - time.monotonic()
+        while remaining > 0:
+            time.sleep(remaining)
+            remaining = deadline - time.monotonic()
 
 class OLED_TASK:
     def __init__(self, config):
@@ -15,35 +60,35 @@ class OLED_TASK:
         self.oled = None
         self.font_size = 12
         self.cleanup_done = False
+        self.notifier = SystemdNotifier()
         
-        # Store config values passed from outside
-        screen1_config = config.get('screen1', {})
-        screen2_config = config.get('screen2', {})
-        screen3_config = config.get('screen3', {})
-        screen4_config = config.get('screen4', {})
-        
-        self.screen1_data_format = screen1_config.get('data_format', 0)
-        self.screen1_time_format = screen1_config.get('time_format', 0)
-        self.screen2_interchange = screen2_config.get('interchange', 0)
-        self.screen3_interchange = screen3_config.get('interchange', 0)
-        self.screen4_interchange = screen4_config.get('interchange', 0)
+        # Store config values passed from outside (a validated OledConfig, see api_config_schema)
+        self.screen1_data_format = config.screen1.data_format
+        self.screen1_time_format = config.screen1.time_format
+        self.screen2_interchange = config.screen2.interchange
+        self.screen3_interchange = config.screen3.interchange
         
         # Store display timing configs
-        self.screen1_duration = screen1_config.get('display_time', 3.0)
-        self.screen2_duration = screen2_config.get('display_time', 3.0)
-        self.screen3_duration = screen3_config.get('display_time', 3.0)
-        self.screen4_duration = screen4_config.get('display_time', 3.0)
+        self.screen1_duration = config.screen1.display_time
+        self.screen2_duration = config.screen2.display_time
+        self.screen3_duration = config.screen3.display_time
         
-        self.screen1_is_run_on_oled = screen1_config.get('is_run_on_oled', True)
-        self.screen2_is_run_on_oled = screen2_config.get('is_run_on_oled', True)
-        self.screen3_is_run_on_oled = screen3_config.get('is_run_on_oled', True)
-        self.screen4_is_run_on_oled = screen4_config.get('is_run_on_oled', True)
+        self.screen1_is_run_on_oled = config.screen1.is_run_on_oled
+        self.screen2_is_run_on_oled = config.screen2.is_run_on_oled
+        self.screen3_is_run_on_oled = config.screen3.is_run_on_oled
 
         # Cache hwmon path lookup for performance
         self._fan_pwm_path = None
 
+        # Sampling interval for screens without a time-relevant event
+        self.sample_interval = 0.3
+
+        # The systemd watchdog is only fed while I2C transfers complete within this time
+        self.max_display_busy_time = 2.0
+
         try:
-            self.oled = OLED(rotate_angle=180)
+            # Frames are sent from a writer thread so I2C stalls never delay the render loop
+            self.oled = OLED(rotate_angle=180, async_display=True)
         except Exception as e:
             print(f"OLED initialization failed: {e}")
             sys.exit(1)
@@ -53,6 +98,7 @@ class OLED_TASK:
         except Exception as e:
             print(f"System information initialization failed: {e}")
             sys.exit(1)
+        self.notifier.ready()
 
     def signal_handler(self, signum, frame):
         self.stop()
@@ -185,8 +231,26 @@ class OLED_TASK:
         self.oled.draw_circle_with_percentage(disk_circle_pos, 16, disk_usage, outline="white", fill="white")
         self.oled.show()
     
-    def oled_ui_3_show(self, pi_temperature, pi_duty):
+    def format_fan(self, pi_duty, pi_rpm, fan_health):
+        """Text below the fan dial: tachometer RPM if the fan has one, the duty otherwise"""
+        if fan_health == 'stalled':
+            return "STALL"
+        if pi_rpm >= 0:
+            return "{}rpm".format(pi_rpm)
+        return "{}%".format(int(pi_duty*100/255))
+
+    def format_temp_title(self, throttle_state):
+        """Title above the temperature dial: firmware throttling and under-voltage replace "Temp" """
+        if is_thermally_limited(throttle_state):
+            return "THROT"
+        if throttle_state & UNDER_VOLTAGE:
+            return "LowV"
+        return "Temp"
+
+    def oled_ui_3_show(self, pi_temperature, pi_duty, pi_rpm=-1, fan_health=None, throttle_state=0):
         self.oled.clear()
+        fan_text = self.format_fan(pi_duty, pi_rpm, fan_health)
+        temp_title = self.format_temp_title(throttle_state)
 
         # Draw basic interface outline
         self.oled.draw_rectangle((0, 0, self.oled.width-1, self.oled.height-1), outline="white")
@@ -198,97 +262,139 @@ class OLED_TASK:
         if self.screen3_interchange == 1:
             # First row first column shows Duty, first row second column shows Temp
             self.oled.draw_text("Duty", position=((0,0),(64,16)), directory="center", offset=(0, 0), font_size=self.font_size)
-            self.oled.draw_text("Temp", position=((65,0),(128,16)), directory="center", offset=(0, 0), font_size=self.font_size)
+            self.oled.draw_text(temp_title, position=((65,0),(128,16)), directory="center", offset=(0, 0), font_size=self.font_size)
             # Draw a dial in the center of each column of the second row
             self.oled.draw_dial(center_xy=(32,34), radius=16, angle=(225, 315), directory="CW", tick_count=10, percentage=pi_duty, start_value=0, end_value=100)
             self.oled.draw_dial(center_xy=(96,34), radius=16, angle=(225, 315), directory="CW", tick_count=10, percentage=pi_temperature, start_value=0, end_value=100)
             # First row first column shows Duty, first row second column shows Temp
-            self.oled.draw_text("{}%".format(int(pi_duty*100/255)), position=((0,48),(64,64)), directory="center", offset=(0, 0), font_size=self.font_size)
+            self.oled.draw_text(fan_text, position=((0,48),(64,64)), directory="center", offset=(0, 0), font_size=self.font_size)
             self.oled.draw_text("{}℃".format(round(pi_temperature)), position=((65,48),(128,64)), directory="center", offset=(0, 0), font_size=self.font_size)
         else:
             # First row first column shows Temp, first row second column shows Duty
-            self.oled.draw_text("Temp", position=((0,0),(64,16)), directory="center", offset=(0, 0), font_size=self.font_size)
+            self.oled.draw_text(temp_title, position=((0,0),(64,16)), directory="center", offset=(0, 0), font_size=self.font_size)
             self.oled.draw_text("Duty", position=((65,0),(128,16)), directory="center", offset=(0, 0), font_size=self.font_size)
             # Draw a dial in the center of each column of the second row
             self.oled.draw_dial(center_xy=(32,34), radius=16, angle=(225, 315), directory="CW", tick_count=10, percentage=pi_temperature, start_value=0, end_value=100)
             self.oled.draw_dial(center_xy=(96,34), radius=16, angle=(225, 315), directory="CW", tick_count=10, percentage=pi_duty, start_value=0, end_value=100)
             # First row first column shows Temp, first row second column shows Duty
             self.oled.draw_text("{}℃".format(round(pi_temperature)), position=((0,48),(64,64)), directory="center", offset=(0, 0), font_size=self.font_size)
-            self.oled.draw_text("{}%".format(int(pi_duty*100/255)), position=((65,48),(128,64)), directory="center", offset=(0, 0), font_size=self.font_size)
+            self.oled.draw_text(fan_text, position=((65,48),(128,64)), directory="center", offset=(0, 0), font_size=self.font_size)
         self.oled.show()
 
-    def run_oled_loop(self):
-        """Main monitoring loop - single-threaded infinite loop for both OLED display and fan control"""
-        screen_start_time = time.time()  # Record the start time of current screen
-        current_screen = 0  # Current screen index
-        
-        while True:
-            # Update data every 0.3 seconds
-            current_date = self.system_information.get_raspberry_pi_date()
-            current_weekday = self.system_information.get_raspberry_pi_weekday()
-            current_time = self.system_information.get_raspberry_pi_time()
-
-            ip_address = self.system_information.get_raspberry_pi_ip_address()
-            cpu_usage = self.system_information.get_raspberry_pi_cpu_usage()
+    def sample_screen(self, screen_index, now=None):
+        """
+        Collect the values shown on a screen
+        Args:
+            screen_index: Screen index (0: time, 1: usage, 2: temperature)
+            now: Wall-clock time the clock screen is rendered for, None for the current time
+        Returns:
+            tuple: Render key, the screen index followed by the values exactly as they are drawn
+        """
+        if screen_index == 0:
+            return (0,
+                    self.system_information.get_raspberry_pi_date(now),
+                    self.system_information.get_raspberry_pi_weekday(now),
+                    self.system_information.get_raspberry_pi_time(now))
+        elif screen_index == 1:
             memory_usage = self.system_information.get_raspberry_pi_memory_usage()
             disk_usage = self.system_information.get_raspberry_pi_disk_usage()
+            memory_percent = memory_usage[0] if isinstance(memory_usage, list) else memory_usage
+            disk_percent = disk_usage[0] if isinstance(disk_usage, list) else disk_usage
+            return (1,
+                    self.system_information.get_raspberry_pi_ip_address(),
+                    int(self.system_information.get_raspberry_pi_cpu_usage()),
+                    int(memory_percent),
+                    int(disk_percent))
+        else:
+            rpm = self.system_information.get_raspberry_pi_fan_rpm()
+            throttled = self.system_information.get_raspberry_pi_throttled()
+            fan_telemetry = read_telemetry('fan', max_age=10) or {}
+            return (2,
+                    round(self.system_information.get_raspberry_pi_cpu_temperature()),
+                    self.system_information.get_raspberry_pi_fan_duty(),
+                    round(rpm, -1) if rpm > 0 else rpm,   # Tens of RPM, so tachometer jitter does not redraw
+                    fan_telemetry.get('fan_health'),
+                    throttled & 0xF if throttled > 0 else 0)  # Only the "now" bits, -1 is unknown
+
+    def next_event_time(self, screen_index, now, wall_now):
+        """
+        Get the next time the displayed values of a screen can change
+        Args:
+            screen_index: Screen index (0: time, 1: usage, 2: temperature)
+            now: Current monotonic time in seconds
+            wall_now: Current wall-clock time in seconds
+        Returns:
+            float: Monotonic time
+        """
+        if screen_index == 0:
+            # Only the clock is aligned to the wall clock: it changes on the next second boundary
+            return now + math.floor(wall_now) + 1.0 - wall_now
+        return now + self.sample_interval
+
+    def run_oled_loop(self):
+        """Main display loop - redraws the active screen only when its displayed values change"""
+        screen_functions = [self.oled_ui_1_show, self.oled_ui_2_show, self.oled_ui_3_show]
+        screen_enabled = [self.screen1_is_run_on_oled, self.screen2_is_run_on_oled, self.screen3_is_run_on_oled]
+        screen_durations = [self.screen1_duration, self.screen2_duration, self.screen3_duration]
+        active_screens = [i for i in range(len(screen_functions)) if screen_enabled[i]]
+
+        screen_start_time = time.monotonic()  # Record the start time of current screen
+        current_screen = 0  # Position in active_screens
+        last_render_key = None
+        wakeup_time = 0.0
 
-            cpu_temperature = self.system_information.get_raspberry_pi_cpu_temperature()
-            current_pi_duty = self.system_information.get_raspberry_pi_fan_duty()
-            
-            # Determine which screens need to be displayed according to stored configuration
-            active_screens = []
-            screen_durations = []
-            screen_functions = []
-            
-            if self.screen1_is_run_on_oled:
-                active_screens.append(0)
-                screen_durations.append(self.screen1_duration)
-                screen_functions.append(lambda: self.oled_ui_1_show(current_date, current_weekday, current_time))
-            
-            if self.screen2_is_run_on_oled:
-                active_screens.append(1)
-                screen_durations.append(self.screen2_duration)
-                screen_functions.append(lambda: self.oled_ui_2_show(ip_address, cpu_usage, memory_usage[0], disk_usage[0]))
-            
-            if self.screen3_is_run_on_oled:
-                active_screens.append(2)
-                screen_durations.append(self.screen3_duration)
-                # Call modified oled_ui_3_show, passing temperature and PI fan duty
-                screen_functions.append(lambda: self.oled_ui_3_show(cpu_temperature, current_pi_duty))
-            
+        while True:
             # Skip if no active screens
             if not active_screens:
-                time.sleep(0.3)
+                self.notifier.ping()
+                time.sleep(self.sample_interval)
                 continue
-            
-            # Get the current active screen index
-            current_active_index = current_screen % len(active_screens)
-            
+
             # Check if screen needs to be switched (based on time instead of counter)
-            elapsed_time = time.time() - screen_start_time
-            if elapsed_time >= screen_durations[current_active_index]:
+            now = time.monotonic()
+            wall_now = time.time()
+            if 0 < wakeup_time - now < 0.01:
+                # Woken marginally early, render for the deadline so a second boundary is never missed
+                wall_now += wakeup_time - now
+                now = wakeup_time
+            screen_index = active_screens[current_screen]
+            if now - screen_start_time >= screen_durations[screen_index]:
                 current_screen = (current_screen + 1) % len(active_screens)
-                current_active_index = current_screen % len(active_screens)
-                screen_start_time = time.time()
-            
-            # Update OLED every 0.3 seconds
+                screen_index = active_screens[current_screen]
+                screen_start_time = now
+
             try:
-                # Use the function of current active screen
-                screen_functions[current_active_index]()
+                render_key = self.sample_screen(screen_index, wall_now)
+                # Skip both rendering and the I2C transfer when nothing visible changed
+                if render_key != last_render_key:
+                    screen_functions[screen_index](*render_key[1:])
+                    if last_render_key is None:
+                        startup_profiler.mark('first_frame')
+                        startup_profiler.report()
+                    last_render_key = render_key
+                # Completed iteration: feed the watchdog unless a frame transfer is stuck on the bus
+                if self.oled.get_display_busy_time() < self.max_display_busy_time:
+                    self.notifier.ping()
             except Exception as e:
                 print(f"Display error: {e}")
-            
-            time.sleep(0.3)  # Base interval of 0.3 second
+
+            # Wake up for the next screen switch or the next change of the displayed values
+            switch_time = screen_start_time + screen_durations[screen_index]
+            wakeup_time = min(switch_time, self.next_event_time(screen_index, now, wall_now))
+            sleep_until(wakeup_time)
 
     def stop(self):
         # Perform cleanup operations
         if self.cleanup_done:
             return
         self.cleanup_done = True
+        self.notifier.stopping()
         try:
             if self.oled:
+                stats = self.oled.get_display_stats()
                 self.oled.close()
+                if stats:
+                    print(f"OLED display stats: {stats}")
         except Exception as e:
             print(e)
         time.sleep(0.1)
@@ -296,14 +402,17 @@ class OLED_TASK:
 
 
 if __name__ == "__main__":
+    from api_systemd import lock_memory_if_requested
     parser = argparse.ArgumentParser(description='OLED Task Controller')
     parser.add_argument('--config-file', default='app_config.json', help='Path to config file')
+    parser.add_argument('--profile-startup', action='store_true', help='Print import times and time to first frame')
     args = parser.parse_args()
     
-    config_manager = ConfigManager(args.config_file)
-    oled_config = config_manager.get_section('OLED') or {}
+    config_manager = get_config_manager(args.config_file)
+    oled_config = config_manager.get_typed_section('OLED')
 
     oled_task = OLED_TASK(oled_config)
+    lock_memory_if_requested()
     
     try:
         oled_task.run_oled_loop()
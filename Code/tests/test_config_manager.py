@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+from api_config_schema import SCHEMA_VERSION
+from api_json import ConfigManager
+
+
+@pytest.fixture
+def config_file(tmp_path, monkeypatch):
+    monkeypatch.setenv('FREENOVE_KIT_TYPE', '1')
+    return str(tmp_path / 'app_config.json')
+
+
+def read_file(config_file):
+    with open(config_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_new_file_has_defaults_and_kit_type(config_file):
+    manager = ConfigManager(config_file)
+    data = read_file(config_file)
+    assert data['General']['kit_type'] == 1
+    assert data['General']['schema_version'] == SCHEMA_VERSION
+    assert manager.get_typed_section('Fan').mode == data['Fan']['mode']
+
+
+def test_transaction_publishes_one_change_list(config_file):
+    manager = ConfigManager(config_file)
+    received = []
+    manager.subscribe(received.append, sections=['LED'])
+    generation = manager.get_generation()
+    with manager.transaction() as staged:
+        staged.set_value('LED', 'mode', 3)
+        staged.set_value('LED', 'brightness', 100)
+        staged.set_value('Fan', 'mode', 1)
+    assert manager.get_generation() == generation + 1
+    assert len(received) == 1
+    assert sorted((section, key, new) for section, key, old, new in received[0]) == [('LED', 'brightness', 100), ('LED', 'mode', 3)]
+    manager.flush()
+    data = read_file(config_file)
+    assert data['LED']['mode'] == 3
+    assert data['Fan']['mode'] == 1
+
+
+def test_transaction_without_changes_is_not_counted(config_file):
+    manager = ConfigManager(config_file)
+    received = []
+    manager.subscribe(received.append)
+    generation = manager.get_generation()
+    with manager.transaction() as staged:
+        staged.set_value('LED', 'mode', manager.get_value('LED', 'mode'))
+    assert manager.get_generation() == generation
+    assert received == []
+
+
+def test_failed_transaction_applies_nothing(config_file):
+    manager = ConfigManager(config_file)
+    mode = manager.get_value('LED', 'mode')
+    with pytest.raises(RuntimeError):
+        with manager.transaction() as staged:
+            staged.set_value('LED', 'mode', mode + 1)
+            raise RuntimeError
+    assert manager.get_value('LED', 'mode') == mode
+
+
+def test_save_keeps_keys_written_by_another_process(config_file):
+    first = ConfigManager(config_file)
+    second = ConfigManager(config_file)
+    with first.transaction() as staged:
+        staged.set_value('LED', 'mode', 4)
+    with second.transaction() as staged:
+        staged.set_value('Fan', 'manual_mode_duty', 99)
+    first.flush()
+    second.flush()
+    data = read_file(config_file)
+    assert data['LED']['mode'] == 4
+    assert data['Fan']['manual_mode_duty'] == 99
+    assert data['General']['config_generation'] == 2
+    assert second.get_value('LED', 'mode') == 4
+
+
+def test_external_change_reaches_subscribers(config_file):
+    manager = ConfigManager(config_file)
+    received = []
+    manager.subscribe(received.append, sections=['Fan'])
+    other = ConfigManager(config_file)
+    with other.transaction() as staged:
+        staged.set_value('Fan', 'mode', 0)
+    other.flush()
+    assert manager.revalidate()
+    assert [(section, key, new) for section, key, old, new in received[0]] == [('Fan', 'mode', 0)]
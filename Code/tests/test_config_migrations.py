@@ -0,0 +1,65 @@
+import copy
+
+from api_config_schema import (MIGRATIONS, SCHEMA_VERSION, GeneralConfig, compile_section,
+                               default_config_dict, migrate_config)
+
+
+def test_every_version_has_a_migration():
+    assert len(MIGRATIONS) == SCHEMA_VERSION
+
+
+def test_unversioned_file_is_completed():
+    data = {
+        'General': {'kit_type': 2},
+        'Fan': {'mode': 1, 'manual_mode_duty': 120},
+        'OLED': {'screen4': {'is_run_on_oled': True}},
+    }
+    assert migrate_config(data)
+    defaults = default_config_dict()
+    assert data['General']['schema_version'] == SCHEMA_VERSION
+    assert data['General']['kit_type'] == 2
+    assert data['Fan']['mode'] == 1
+    assert data['Fan']['manual_mode_duty'] == 120
+    assert 'screen4' not in data['OLED']
+    assert set(data) == set(defaults)
+    assert set(data['Fan']) == set(defaults['Fan'])
+
+
+def test_v1_file_gets_every_later_fan_setting():
+    data = default_config_dict()
+    data['General']['schema_version'] = 1
+    for key in ('pid_mode_config', 'filter_config', 'health_config', 'sensor_config',
+                'throttle_config', 'prediction_config', 'output_config'):
+        del data['Fan'][key]
+    del data['Fan']['temp_mode_config']['fan_curve']
+    del data['Scheduling']
+    data['Fan']['temp_mode_config']['fan_temp_threshold_low'] = 50
+    assert migrate_config(data)
+    assert data == dict(default_config_dict(), Fan=dict(
+        default_config_dict()['Fan'],
+        temp_mode_config=dict(default_config_dict()['Fan']['temp_mode_config'], fan_temp_threshold_low=50)))
+
+
+def test_migrated_file_compiles():
+    data = {'Fan': {'mode': 0}}
+    migrate_config(data)
+    for section in data:
+        compile_section(section, data[section])
+
+
+def test_current_file_is_not_rewritten():
+    data = default_config_dict()
+    assert not migrate_config(data)
+
+
+def test_newer_file_is_kept():
+    data = default_config_dict()
+    data['General'].update(schema_version=SCHEMA_VERSION + 1, kit_type=2)
+    data['Fan']['future_setting'] = 1
+    original = copy.deepcopy(data)
+    assert not migrate_config(data)
+    assert data == original
+    general = compile_section('General', data['General'])
+    assert general.schema_version == SCHEMA_VERSION + 1
+    assert general.kit_type == 2
+    assert GeneralConfig(schema_version=SCHEMA_VERSION + 5).schema_version == SCHEMA_VERSION + 5
@@ -0,0 +1,30 @@
+from api_config_schema import FanConfig, compile_section
+
+
+def test_nested_error_keeps_the_fan_mode():
+    fan = compile_section('Fan', {
+        'mode': 1,
+        'manual_mode_duty': 120,
+        'pid_mode_config': {'kp': 'fast'},
+        'temp_mode_config': {'fan_temp_threshold_low': 85, 'fan_temp_threshold_high': 90, 'fan_temp_mode_duty_low': 999},
+    })
+    assert fan.mode == 1
+    assert fan.manual_mode_duty == 120
+    assert fan.pid_mode_config.kp == FanConfig().pid_mode_config.kp
+    assert fan.temp_mode_config.fan_temp_threshold_low == 85
+    assert fan.temp_mode_config.fan_temp_threshold_high == 90
+    assert fan.temp_mode_config.fan_temp_mode_duty_low == FanConfig().temp_mode_config.fan_temp_mode_duty_low
+
+
+def test_invalid_field_is_replaced_and_logged(capsys):
+    fan = compile_section('Fan', {'mode': 9, 'manual_mode_duty': 40, 'filter_config': 3})
+    assert fan.mode == FanConfig().mode
+    assert fan.manual_mode_duty == 40
+    assert fan.filter_config == FanConfig().filter_config
+    output = capsys.readouterr().out
+    assert 'Fan.mode' in output
+    assert 'Fan.filter_config' in output
+
+
+def test_missing_section_takes_defaults():
+    assert compile_section('LED', None) == compile_section('LED', {})
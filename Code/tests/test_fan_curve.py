@@ -0,0 +1,27 @@
+from api_fan_control import FanCurve
+
+
+def test_lookup_interpolates_between_points():
+    curve = FanCurve(((40, 50), (60, 150), (80, 255)))
+    assert curve.lookup(39.9) == 0
+    assert curve.lookup(40) == 50
+    assert curve.lookup(50) == 100
+    assert curve.lookup(60) == 150
+    assert curve.lookup(70) == 202
+    assert curve.lookup(80) == 255
+    assert curve.lookup(95) == 255
+
+
+def test_equal_temperatures_make_a_step():
+    curve = FanCurve(((50, 0), (50, 120), (60, 200)))
+    assert curve.lookup(49.9) == 0
+    assert curve.lookup(50) == 120
+    assert curve.lookup(55) == 160
+
+
+def test_hysteresis_only_delays_ramping_down():
+    curve = FanCurve(((40, 50), (60, 150)))
+    assert curve.get_duty(55, 50, 3) == 125
+    assert curve.get_duty(53, 125, 3) == 125
+    assert curve.get_duty(50, 125, 3) == 115
+    assert curve.get_duty(30, 115, 3) == 0
@@ -0,0 +1,66 @@
+from api_fan_control import FanOutput
+
+
+class PwmRecorder:
+    def __init__(self):
+        self.duties = []
+
+    def set_pi_pwm_duty(self, duty):
+        self.duties.append(duty)
+
+
+def create_output(**kwargs):
+    pwm = PwmRecorder()
+    return FanOutput(pwm, **kwargs), pwm
+
+
+def test_deadband_skips_small_changes():
+    output, pwm = create_output(deadband=10)
+    assert output.write(100, now=0) == 100
+    assert output.write(105, now=1) == 100
+    assert output.writes_skipped == 1
+    assert output.write(105, exact=True, now=2) == 105
+    assert output.write(0, now=3) == 0
+    assert pwm.duties == [100, 105, 0]
+
+
+def test_slew_rate_limits_each_step():
+    output, pwm = create_output(slew_rate=20)
+    output.write(100, now=0)
+    assert output.write(200, now=1) == 110
+    assert output.update(now=1.2) == 110
+    assert output.next_update_time() == 1.5
+    assert output.update(now=1.5) == 120
+    assert output.write(0, now=1.6) == 0
+    assert output.next_update_time() is None
+    assert pwm.duties == [100, 110, 120, 0]
+
+
+def test_kick_start_then_slew_down():
+    output, pwm = create_output(slew_rate=100, kick_duty=180, kick_time=1.0)
+    output.write(0, now=0)
+    assert output.write(50, now=100) == 180
+    assert output.kicks == 1
+    assert output.next_update_time() == 101.0
+    assert output.update(now=100.5) == 180
+    assert output.update(now=101.0) == 130
+    assert output.update(now=101.5) == 80
+    assert output.update(now=102.0) == 50
+    assert output.next_update_time() is None
+
+
+def test_target_equal_to_kick_duty_ends_the_kick():
+    output, _ = create_output(kick_duty=180, kick_time=1.0)
+    output.write(0, now=0)
+    output.write(50, now=100)
+    assert output.write(180, now=100.5) == 180
+    assert output.update(now=200) == 180
+    assert output.kick_until is None
+    assert output.next_update_time() is None
+
+
+def test_no_kick_when_running():
+    output, _ = create_output(kick_duty=180, kick_time=1.0)
+    output.write(100, now=0)
+    assert output.write(50, now=1) == 50
+    assert output.kicks == 0
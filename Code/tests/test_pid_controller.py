@@ -0,0 +1,44 @@
+from api_config_schema import FanPidModeConfig
+from api_fan_control import PIDController
+
+
+def test_proportional_output_is_limited():
+    controller = PIDController(50, kp=10, ki=0, kd=0)
+    assert controller.update(55, now=0) == 50
+    assert controller.update(45, now=1) == 0
+    assert controller.update(90, now=2) == 255
+
+
+def test_integral_does_not_wind_up_while_saturated():
+    controller = PIDController(50, kp=0, ki=10, kd=0, output_max=100)
+    for second in range(60):
+        controller.update(70, now=second)
+    assert controller.output == 100
+    assert controller.integral <= 100
+    # Back below the setpoint the output comes down right away instead of unwinding minutes of integral
+    controller.update(40, now=61)
+    assert controller.output < 100
+
+
+def test_derivative_acts_on_the_measurement():
+    controller = PIDController(50, kp=0, ki=0, kd=20)
+    controller.update(50, now=0)
+    assert controller.update(52, now=1) == 40
+    controller.setpoint = 40
+    assert controller.update(52, now=2) == 0
+
+
+def test_feed_forward_is_added():
+    controller = PIDController(50, kp=10, ki=0, kd=0)
+    assert controller.update(55, feed_forward=30, now=0) == 80
+
+
+def test_configure_keeps_the_integral_within_the_new_limits():
+    controller = PIDController(50, kp=0, ki=1, kd=0)
+    controller.update(60, now=0)
+    controller.update(60, now=10)
+    assert controller.integral == 100
+    config = FanPidModeConfig(min_duty=0, max_duty=80)
+    controller.configure(config)
+    assert controller.integral == 80
+    assert controller.setpoint == config.setpoint
@@ -0,0 +1,24 @@
+from api_telemetry import Heartbeat, TelemetryWriter, read_heartbeat_age, read_telemetry
+
+
+def test_heartbeat_age(tmp_path):
+    directory = str(tmp_path / 'telemetry')
+    assert read_heartbeat_age('fan', directory=directory) is None
+    heartbeat = Heartbeat('fan', directory=directory)
+    assert heartbeat.beat()
+    assert heartbeat.beat()
+    assert read_heartbeat_age('fan', directory=directory) < 5
+    heartbeat.remove()
+    assert read_heartbeat_age('fan', directory=directory) is None
+
+
+def test_failed_heartbeat_is_reported(tmp_path):
+    blocker = tmp_path / 'file'
+    blocker.write_text('')
+    assert not Heartbeat('fan', directory=str(blocker)).beat()
+
+
+def test_telemetry_round_trip(tmp_path):
+    directory = str(tmp_path)
+    assert TelemetryWriter('fan', directory=directory).publish({'duty': 120})
+    assert read_telemetry('fan', max_age=5, directory=directory)['duty'] == 120